@@ -0,0 +1,276 @@
+import asyncio
+import io
+import re
+import shutil
+import subprocess
+import threading
+import time
+import wave
+
+import numpy as np
+
+SAMPLE_RATE = 16000  # what Whisper resamples everything to anyway
+
+
+class AudioDecodeError(Exception):
+    pass
+
+
+class PartialTranscriptError(Exception):
+    """
+    Some chunks failed; text holds the stitched transcript of the ones that did not.
+    """
+
+    def __init__(self, text, failed, total, error):
+        super().__init__(f"{failed} of {total} chunks failed: {error}")
+        self.text = text
+        self.failed = failed
+        self.total = total
+
+
+def _read_wav(data):
+    with wave.open(io.BytesIO(data)) as wav:
+        channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width in (2, 4):
+        dtype = np.int16 if width == 2 else np.int32
+        samples = np.frombuffer(frames, dtype=dtype).astype(np.float32) / np.iinfo(dtype).max
+    else:
+        raise AudioDecodeError(f"Unsupported WAV sample width: {width * 8} bits")
+    return samples.reshape(-1, channels), rate
+
+
+def resample(samples, rate, target=SAMPLE_RATE):
+    """
+    Linear-interpolation resample of a mono signal; plenty for speech going to Whisper.
+    """
+    if rate == target or not len(samples):
+        return samples.astype(np.float32)
+    duration = len(samples) / rate
+    positions = np.arange(round(duration * target)) * (rate / target)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def _ffmpeg(args, data):
+    if shutil.which("ffmpeg") is None:
+        raise AudioDecodeError("ffmpeg is not installed")
+    result = subprocess.run(["ffmpeg", "-nostdin", "-loglevel", "error", *args], input=data, capture_output=True)
+    if result.returncode != 0:
+        raise AudioDecodeError(result.stderr.decode(errors="replace").strip() or "ffmpeg failed")
+    return result.stdout
+
+
+def decode_audio(data, sample_rate=SAMPLE_RATE):
+    """
+    Decodes an upload to float32 mono at sample_rate. WAV is read with the standard library;
+    everything else (mp3, m4a, ogg) goes through the ffmpeg binary.
+    """
+    if data[:4] == b"RIFF":
+        try:
+            samples, rate = _read_wav(data)
+            return resample(samples.mean(axis=1), rate, sample_rate)
+        except (wave.Error, EOFError):
+            pass  # e.g. compressed WAV: let ffmpeg try
+    pcm = _ffmpeg(["-i", "pipe:0", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "pipe:1"], data)
+    return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768
+
+
+def encode_chunk(samples, sample_rate=SAMPLE_RATE):
+    """
+    (bytes, mime_type) for one chunk: FLAC when ffmpeg is available (about half the size of
+    PCM), else 16-bit PCM WAV.
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes((np.clip(samples, -1, 1) * 32767).astype(np.int16).tobytes())
+    if shutil.which("ffmpeg") is None:
+        return buffer.getvalue(), "audio/wav"
+    try:
+        return _ffmpeg(["-f", "wav", "-i", "pipe:0", "-f", "flac", "pipe:1"], buffer.getvalue()), "audio/flac"
+    except AudioDecodeError:
+        return buffer.getvalue(), "audio/wav"
+
+
+def trim_silence(samples, sample_rate=SAMPLE_RATE, threshold_db=-40.0, frame_ms=30, min_silence_ms=600,
+                 keep_ms=200):
+    """
+    Energy-based VAD: frames whose RMS is more than |threshold_db| below the loudest frame are
+    silence. Silent stretches longer than min_silence_ms shrink to keep_ms on each side; leading
+    and trailing silence is dropped the same way.
+    """
+    frame = max(1, sample_rate * frame_ms // 1000)
+    count = -(-len(samples) // frame)
+    if count == 0:
+        return samples
+    padded = np.pad(samples, (0, count * frame - len(samples)))
+    rms = np.sqrt(np.mean(padded.reshape(count, frame) ** 2, axis=1))
+    peak = rms.max()
+    if peak == 0:
+        return samples[:0]
+    voiced = rms >= peak * 10 ** (threshold_db / 20)
+
+    keep = np.ones(len(voiced), dtype=bool)
+    min_frames, pad = max(1, min_silence_ms // frame_ms), keep_ms // frame_ms
+    start = None
+    for i, is_voiced in enumerate(np.append(voiced, True)):
+        if not is_voiced and start is None:
+            start = i
+        elif is_voiced and start is not None:
+            if start == 0 or i == len(voiced) or i - start >= min_frames:
+                low = start if start == 0 else start + pad
+                high = i if i == len(voiced) else i - pad
+                keep[low:max(low, high)] = False
+            start = None
+    mask = np.repeat(keep, frame)[: len(samples)]
+    return samples[mask]
+
+
+def split_chunks(samples, sample_rate=SAMPLE_RATE, chunk_seconds=30.0, overlap_seconds=2.0):
+    """
+    Overlapping windows of at most chunk_seconds; a short remainder is folded into the last one.
+    """
+    size = int(chunk_seconds * sample_rate)
+    step = size - int(overlap_seconds * sample_rate)
+    if step <= 0:
+        raise ValueError("Chunk overlap must be shorter than the chunk")
+    if len(samples) <= size:
+        return [samples] if len(samples) else []
+    chunks = []
+    start = 0
+    while start + size < len(samples):
+        chunks.append(samples[start:start + size])
+        start += step
+    tail = samples[start:]
+    if len(tail) < size // 4:
+        chunks[-1] = samples[start - step:]
+    else:
+        chunks.append(tail)
+    return chunks
+
+
+def _words(text):
+    return [re.sub(r"[^\w']", "", word).lower() for word in text.split()]
+
+
+def stitch(texts, max_overlap_words=12):
+    """
+    Joins chunk transcripts in order, dropping the words the overlap made both chunks hear:
+    the longest run at the start of a chunk that repeats the end of the previous one.
+    """
+    merged = []
+    for text in texts:
+        words = text.split()
+        if merged and words:
+            previous, current = _words(" ".join(merged[-max_overlap_words:])), _words(text)
+            for size in range(min(len(previous), len(current), max_overlap_words), 0, -1):
+                if previous[-size:] == current[:size]:
+                    words = words[size:]
+                    break
+        merged.extend(words)
+    return " ".join(merged)
+
+
+class AudioStats:
+    """
+    Running totals for transcription throughput: audio seconds in, speech seconds sent,
+    and wall-clock time spent.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.files = 0
+        self.chunks = 0
+        self.audio_seconds = 0.0
+        self.speech_seconds = 0.0
+        self.wall_seconds = 0.0
+
+    def record(self, audio_seconds, speech_seconds, chunks, wall_seconds):
+        with self._lock:
+            self.files += 1
+            self.chunks += chunks
+            self.audio_seconds += audio_seconds
+            self.speech_seconds += speech_seconds
+            self.wall_seconds += wall_seconds
+
+    def snapshot(self):
+        return {
+            "files": self.files,
+            "chunks": self.chunks,
+            "audio_seconds": round(self.audio_seconds, 1),
+            "speech_seconds": round(self.speech_seconds, 1),
+            "wall_seconds": round(self.wall_seconds, 2),
+            "audio_seconds_per_second": round(self.audio_seconds / self.wall_seconds, 2) if self.wall_seconds else None,
+        }
+
+
+async def stub_transcribe(audio_bytes, mime_type="audio/wav"):
+    """
+    Offline stand-in for a speech-to-text provider: describes the chunk instead of reading it.
+    """
+    duration = len(decode_audio(audio_bytes)) / SAMPLE_RATE
+    return f"[speech {duration:.1f}s]"
+
+
+class ChunkedTranscriber:
+    """
+    Decode -> 16 kHz mono -> VAD trim -> overlapping chunks, transcribed concurrently by
+    transcribe_chunk(bytes, mime_type) and stitched back in order. CPU steps run through
+    run_cpu when given (e.g. executors.run_cpu).
+    """
+
+    def __init__(self, transcribe_chunk, chunk_seconds=30.0, overlap_seconds=2.0, concurrency=4,
+                 threshold_db=-40.0, min_silence_ms=600, run_cpu=None):
+        self.transcribe_chunk = transcribe_chunk
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
+        self.threshold_db = threshold_db
+        self.min_silence_ms = min_silence_ms
+        self.run_cpu = run_cpu
+        self.slots = asyncio.Semaphore(concurrency)
+        self.stats = AudioStats()
+
+    @property
+    def version(self):
+        """
+        Tag of the settings that change the transcript, stored with cached transcripts.
+        """
+        return f"chunk{self.chunk_seconds:g}o{self.overlap_seconds:g}-vad{self.threshold_db:g}/{self.min_silence_ms}"
+
+    def prepare(self, data):
+        """
+        (audio seconds, speech seconds, [(chunk bytes, mime_type)]) of one upload.
+        """
+        samples = decode_audio(data)
+        speech = trim_silence(samples, threshold_db=self.threshold_db, min_silence_ms=self.min_silence_ms)
+        chunks = split_chunks(speech, chunk_seconds=self.chunk_seconds, overlap_seconds=self.overlap_seconds)
+        return len(samples) / SAMPLE_RATE, len(speech) / SAMPLE_RATE, [encode_chunk(chunk) for chunk in chunks]
+
+    async def _one(self, chunk, mime_type):
+        async with self.slots:
+            return await self.transcribe_chunk(chunk, mime_type)
+
+    async def transcribe(self, data):
+        """
+        Transcript of one upload. Raises AudioDecodeError when it cannot be decoded locally,
+        and PartialTranscriptError when some chunks failed (the error of the first one when
+        all did).
+        """
+        started = time.perf_counter()
+        if self.run_cpu is not None:
+            audio_seconds, speech_seconds, chunks = await self.run_cpu(self.prepare, data)
+        else:
+            audio_seconds, speech_seconds, chunks = self.prepare(data)
+        results = await asyncio.gather(*(self._one(chunk, mime) for chunk, mime in chunks), return_exceptions=True)
+        self.stats.record(audio_seconds, speech_seconds, len(chunks), time.perf_counter() - started)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        text = stitch([result for result in results if not isinstance(result, BaseException)])
+        if errors and len(errors) == len(results):
+            raise errors[0]
+        if errors:
+            raise PartialTranscriptError(text, len(errors), len(results), errors[0])
+        return text
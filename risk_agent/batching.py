@@ -0,0 +1,119 @@
+import asyncio
+from collections import Counter
+import time
+
+from loguru import logger
+
+from risk_agent.metrics import LatencyWindow
+
+
+class MicroBatcher:
+    """
+    Gathers single-item encode calls from concurrent requests into one batched forward pass.
+
+    A batch is flushed when it reaches max_batch_size or when the oldest queued item has
+    waited max_wait_ms, whichever comes first. While one batch is running the next one keeps
+    filling up, so batch size grows with load and stays at one when the server is idle.
+    """
+
+    def __init__(self, name, encode_batch, max_batch_size=32, max_wait_ms=5.0, executor=None):
+        self.name = name
+        self.encode_batch = encode_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.executor = executor
+
+        self._queue = None
+        self._worker = None
+        self._loop = None
+
+        self.batch_sizes = Counter()
+        self.items_processed = 0
+        self.queue_wait = LatencyWindow()
+        self.encode_time = LatencyWindow()
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, item):
+        """
+        Queues one item and waits for its row of the batched result.
+        """
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((item, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        flush_at = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Take whatever is already queued without waiting
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = flush_at - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Callers that gave up (deadline, disconnect) do not need a slot in the forward pass
+            batch = [entry for entry in batch if not entry[1].done()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for _, _, enqueued_at in batch:
+                self.queue_wait.record(started - enqueued_at)
+            self.batch_sizes[len(batch)] += 1
+            self.items_processed += len(batch)
+
+            try:
+                results = await self._loop.run_in_executor(
+                    self.executor, self.encode_batch, [item for item, _, _ in batch]
+                )
+            except Exception as e:
+                logger.error(f"Batch encode failed ({self.name}, size {len(batch)}): {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.encode_time.record(time.perf_counter() - started)
+
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self):
+        batches = sum(self.batch_sizes.values())
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": batches,
+            "items": self.items_processed,
+            "mean_batch_size": round(self.items_processed / batches, 2) if batches else None,
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+            "queue_wait": self.queue_wait.snapshot(),
+            "encode_time": self.encode_time.snapshot(),
+        }
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
@@ -0,0 +1,283 @@
+from collections import Counter, OrderedDict
+import hashlib
+import json
+from pathlib import Path
+import sqlite3
+import threading
+import time
+
+from loguru import logger
+import numpy as np
+
+
+def content_digest(content: bytes) -> str:
+    """
+    SHA-256 of the raw upload bytes, used as the content address of every artifact.
+    """
+    return hashlib.sha256(content).hexdigest()
+
+
+class ArtifactCache:
+    """
+    Content-addressed cache for per-file artifacts (OCR text, CLIP vectors, transcripts).
+
+    Keys are (kind, model version, sha256 of the upload). A bounded in-memory LRU sits in
+    front of an optional SQLite file, which survives restarts and is shared by every
+    uvicorn worker pointing at the same path.
+
+    The file is pruned on open and every prune_every writes: rows older than max_age_seconds
+    go first, then the oldest rows until the stored values fit in max_disk_bytes (None or 0
+    means no limit).
+    """
+
+    def __init__(self, max_entries=1024, path=None, max_disk_bytes=None, max_age_seconds=None,
+                 prune_every=256):
+        self.max_entries = max_entries
+        self.path = Path(path) if path else None
+        self.max_disk_bytes = max_disk_bytes or None
+        self.max_age_seconds = max_age_seconds or None
+        self.prune_every = prune_every
+        self._writes = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = Counter()
+        self._db = None
+
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.path), timeout=5, check_same_thread=False)
+            # WAL lets several worker processes read while one writes
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts ("
+                "key TEXT PRIMARY KEY, encoding TEXT NOT NULL, value BLOB NOT NULL, "
+                "dtype TEXT, created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS artifacts_created_at ON artifacts (created_at)")
+            self._db.commit()
+            logger.info(f"Artifact cache disk tier: {self.path}")
+            with self._lock:
+                self._prune()
+
+    @staticmethod
+    def _key(kind, digest, version):
+        return f"{kind}:{version}:{digest}"
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, kind, digest, version):
+        """
+        Returns the cached artifact or None.
+        """
+        key = self._key(kind, digest, version)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.counters[f"{kind}.memory_hits"] += 1
+                return self._memory[key]
+
+            if self._db is not None:
+                # Expired rows count as misses even before the next prune removes them
+                row = self._db.execute(
+                    "SELECT encoding, value, dtype FROM artifacts WHERE key = ? AND created_at >= ?",
+                    (key, self._oldest_allowed()),
+                ).fetchone()
+                if row is not None:
+                    value = self._decode(*row)
+                    self._remember(key, value)
+                    self.counters[f"{kind}.disk_hits"] += 1
+                    return value
+
+            self.counters[f"{kind}.misses"] += 1
+            return None
+
+    def put(self, kind, digest, version, value):
+        key = self._key(kind, digest, version)
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO artifacts (key, encoding, value, dtype, created_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (key, *self._encode(value), time.time()),
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Artifact cache write failed for {kind}: {e}")
+                    return
+                self._writes += 1
+                if self._writes % self.prune_every == 0:
+                    self._prune()
+
+    def _oldest_allowed(self):
+        return time.time() - self.max_age_seconds if self.max_age_seconds else 0.0
+
+    def _prune(self):
+        """
+        Drops expired rows, then the oldest ones beyond max_disk_bytes. Caller holds the lock.
+        """
+        if self.max_age_seconds is None and self.max_disk_bytes is None:
+            return
+        try:
+            removed = self._db.execute(
+                "DELETE FROM artifacts WHERE created_at < ?", (self._oldest_allowed(),)
+            ).rowcount
+            if self.max_disk_bytes is not None:
+                removed += self._db.execute(
+                    "DELETE FROM artifacts WHERE key IN ("
+                    "SELECT key FROM (SELECT key, SUM(LENGTH(value)) OVER "
+                    "(ORDER BY created_at DESC, key) AS running FROM artifacts) WHERE running > ?)",
+                    (self.max_disk_bytes,),
+                ).rowcount
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Artifact cache prune failed: {e}")
+            return
+        if removed:
+            self.counters["disk.pruned"] += removed
+            logger.info(f"Pruned {removed} artifacts from {self.path}")
+
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, np.ndarray):
+            return "ndarray", value.tobytes(), value.dtype.str
+        return "json", json.dumps(value).encode("utf-8"), None
+
+    @staticmethod
+    def _decode(encoding, value, dtype):
+        if encoding == "ndarray":
+            return np.frombuffer(value, dtype=np.dtype(dtype)).copy()
+        return json.loads(value.decode("utf-8"))
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            entries = len(self._memory)
+
+        pruned = counters.pop("disk.pruned", 0)
+        by_kind = {}
+        for name, count in counters.items():
+            kind, counter = name.split(".", 1)
+            by_kind.setdefault(kind, {"memory_hits": 0, "disk_hits": 0, "misses": 0})[counter] = count
+        for kind_stats in by_kind.values():
+            lookups = sum(kind_stats.values())
+            hits = kind_stats["memory_hits"] + kind_stats["disk_hits"]
+            kind_stats["hit_rate"] = round(hits / lookups, 3) if lookups else None
+
+        return {
+            "memory_entries": entries,
+            "max_entries": self.max_entries,
+            "disk_path": str(self.path) if self.path else None,
+            "disk_max_bytes": self.max_disk_bytes,
+            "disk_max_age_seconds": self.max_age_seconds,
+            "disk_pruned": pruned,
+            "kinds": by_kind,
+        }
+
+
+class VerdictCache:
+    """
+    Two-level cache for LLM risk verdicts.
+
+    1. Exact: normalized evidence text + IDs of the retrieved Scam Genome cases.
+    2. Semantic (optional): the most similar recent query embedding, if its cosine
+       similarity is at least similarity_threshold. The query embedding only covers the
+       text, so this tier only matches entries for the same images (by content hash).
+
+    Entries expire after ttl_seconds and the oldest are dropped past max_entries.
+    """
+
+    def __init__(self, max_entries=512, ttl_seconds=900, similarity_threshold=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = Counter()
+
+    @staticmethod
+    def exact_key(content, case_ids):
+        normalized = " ".join(content.lower().split())
+        ids = ",".join(sorted(str(i) for i in case_ids))
+        return hashlib.sha256(f"{normalized}|{ids}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _unit(vector):
+        if vector is None:
+            return None
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _expire(self, now):
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry["stored_at"] <= self.ttl_seconds:
+                break
+            del self._entries[key]
+
+    def get(self, content, case_ids, query_vector=None, image_digests=()):
+        """
+        Returns (verdict, level) with level "exact" or "semantic", or (None, None) on a miss.
+        """
+        key = self.exact_key(content, case_ids)
+        images = tuple(sorted(image_digests))
+        with self._lock:
+            self._expire(time.time())
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.counters["exact_hits"] += 1
+                return dict(entry["verdict"]), "exact"
+
+            unit = self._unit(query_vector)
+            if self.similarity_threshold and unit is not None:
+                candidates = [
+                    e for e in self._entries.values() if e["vector"] is not None and e["images"] == images
+                ]
+                if candidates:
+                    matrix = np.stack([e["vector"] for e in candidates])
+                    scores = matrix @ unit
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity_threshold:
+                        self.counters["semantic_hits"] += 1
+                        return dict(candidates[best]["verdict"]), "semantic"
+
+            self.counters["misses"] += 1
+            return None, None
+
+    def put(self, content, case_ids, query_vector, verdict, image_digests=()):
+        key = self.exact_key(content, case_ids)
+        with self._lock:
+            # Re-inserting moves the key to the end, so expiry order stays insertion order
+            self._entries.pop(key, None)
+            self._entries[key] = {
+                "stored_at": time.time(),
+                "vector": self._unit(query_vector),
+                "images": tuple(sorted(image_digests)),
+                "verdict": dict(verdict),
+            }
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            entries = len(self._entries)
+        lookups = sum(counters.values())
+        hits = counters.get("exact_hits", 0) + counters.get("semantic_hits", 0)
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "similarity_threshold": self.similarity_threshold,
+            "exact_hits": counters.get("exact_hits", 0),
+            "semantic_hits": counters.get("semantic_hits", 0),
+            "misses": counters.get("misses", 0),
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+        }
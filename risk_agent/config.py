@@ -1,15 +1,21 @@
-from pathlib import Path
 import os
+from pathlib import Path
+
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient
-import openai
+
+from risk_agent.resources import register
 
 # Paths
 PROJ_ROOT = Path(__file__).resolve().parents[1]
 DATA_DIR = PROJ_ROOT / "data"
 RAW_DATA_DIR = DATA_DIR / "raw"
+INTERIM_DATA_DIR = DATA_DIR / "interim"
 PROCESSED_DATA_DIR = DATA_DIR / "processed"
 
+# Embedding models (loaded once per process through risk_agent.model_registry)
+TEXT_EMBEDDING_MODEL = "BAAI/bge-base-en-v1.5"
+IMAGE_EMBEDDING_MODEL = "clip-ViT-B-32"
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -24,24 +30,18 @@ class Settings:
         self.USE_CLOUD = os.getenv("USE_CLOUD", "True").lower() == "true"
         
         # 2. Qdrant Setup
+        # The client is created on first use (see get_qdrant_client), so importing a module
+        # that only needs a setting does not open a connection or the local database.
+        # It is registered as the "qdrant" resource, preloaded by the API warmup.
+        self._qdrant = register("qdrant", self._create_qdrant_client)
         if self.USE_CLOUD:
             print("🔧 Configuration: Using Qdrant CLOUD Mode")
             self.QDRANT_URL = os.getenv("QDRANT_CLOUD_URL")
             self.QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-            
-            if not self.QDRANT_URL or not self.QDRANT_API_KEY:
-                raise ValueError("❌ Error: QDRANT_CLOUD_URL and QDRANT_API_KEY must be set in .env when USE_CLOUD=True")
-                
-            self.qdrant_client = QdrantClient(
-                url=self.QDRANT_URL,
-                api_key=self.QDRANT_API_KEY,
-                timeout=40,
-            )
         else:
             print("🔧 Configuration: Using Qdrant LOCAL Mode")
             # Ensure the local directory exists or will be created by QdrantClient
-            local_path = "./local_qdrant_db"
-            self.qdrant_client = QdrantClient(path=local_path)
+            self.QDRANT_PATH = "./local_qdrant_db"
 
         # 3. OpenAI Setup
         self.OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -49,6 +49,7 @@ class Settings:
              # Warning only, as some parts might work without it (e.g. pure vector retrieval if embeddings are pre-calculated, though unlikely)
              print("⚠️ Warning: OPENAI_API_KEY not found in .env")
         else:
+            import openai  # only paid for when a key is configured
             openai.api_key = self.OPENAI_API_KEY
 
         # 4. Google Gemini Setup
@@ -63,19 +64,172 @@ class Settings:
 
         # 6. LLM Provider Selection (default to gemini)
         self.LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").lower()
+        # Fail over to the other provider when the configured one keeps erroring
+        self.LLM_FAILOVER = os.getenv("LLM_FAILOVER", "True").lower() == "true"
+        self.LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+        self.LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+        self.LLM_BACKOFF_SECONDS = float(os.getenv("LLM_BACKOFF_SECONDS", "0.5"))
+        # Fire a duplicate request once a call is slower than this latency percentile (0 disables)
+        self.LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+        self.LLM_POOL_CONNECTIONS = int(os.getenv("LLM_POOL_CONNECTIONS", "20"))
+
+        # 7. Worker Pools
+        # CPU pool runs model inference (CLIP, BGE, EasyOCR); torch releases the GIL so threads overlap.
+        # IO pool runs blocking network calls (Qdrant, Gemini, Groq).
+        self.CPU_POOL_SIZE = int(os.getenv("CPU_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+        self.IO_POOL_SIZE = int(os.getenv("IO_POOL_SIZE", "16"))
+
+        # 8. Request Scheduling
+        # Files of one request are processed concurrently, bounded per modality.
+        self.VISION_CONCURRENCY = int(os.getenv("VISION_CONCURRENCY", "4"))
+        self.OCR_CONCURRENCY = int(os.getenv("OCR_CONCURRENCY", "2"))
+        self.AUDIO_CONCURRENCY = int(os.getenv("AUDIO_CONCURRENCY", "4"))
+        # Past this many seconds the endpoint returns whatever evidence is ready
+        self.REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "60"))
+
+        # 9. Cross-request Micro-batching (CLIP and BGE encoders)
+        # Larger waits give bigger batches (throughput) at the cost of per-request latency.
+        self.BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "32"))
+        self.BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+
+        # 10. Artifact Cache (OCR text, CLIP vectors, transcripts keyed by upload SHA-256)
+        # Leave ARTIFACT_CACHE_PATH unset for memory-only; point workers at one file to share it.
+        self.ARTIFACT_CACHE_SIZE = int(os.getenv("ARTIFACT_CACHE_SIZE", "1024"))
+        self.ARTIFACT_CACHE_PATH = os.getenv("ARTIFACT_CACHE_PATH") or None
+        # The disk tier is pruned to this size and age (0 = no limit)
+        self.ARTIFACT_CACHE_MAX_MB = float(os.getenv("ARTIFACT_CACHE_MAX_MB", "512"))
+        self.ARTIFACT_CACHE_MAX_AGE_DAYS = float(os.getenv("ARTIFACT_CACHE_MAX_AGE_DAYS", "30"))
+
+        # 11. Verdict Cache (skips the LLM for repeated or near-identical evidence)
+        # VERDICT_CACHE_SIMILARITY is the cosine threshold for near-duplicate text (with the same images); 0 disables.
+        self.VERDICT_CACHE_SIZE = int(os.getenv("VERDICT_CACHE_SIZE", "512"))
+        self.VERDICT_CACHE_TTL_SECONDS = float(os.getenv("VERDICT_CACHE_TTL_SECONDS", "900"))
+        self.VERDICT_CACHE_SIMILARITY = float(os.getenv("VERDICT_CACHE_SIMILARITY", "0.97"))
+
+        # 12. Qdrant Index Tuning (HNSW, quantization, on-disk storage, payload indexes)
+        # e.g. GENOME_HNSW_M=32, GENOME_QUANTIZATION=scalar, HISTORY_ON_DISK=True
+        self.GENOME_INDEX = self._index_settings("GENOME", "risk_label,category,type")
+        self.HISTORY_INDEX = self._index_settings("HISTORY")
+
+        # 13. Retrieval Backend: "qdrant" (default) or "snapshot" (in-process, memory-mapped)
+        # Export/refresh with `python -m risk_agent.snapshot [--watch]` (the single writer); API
+        # workers only reload it. user_history always stays in Qdrant.
+        self.RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "qdrant").lower()
+        self.SNAPSHOT_PATH = Path(os.getenv("SNAPSHOT_PATH", str(PROCESSED_DATA_DIR / "genome_snapshot")))
+        self.SNAPSHOT_DTYPE = os.getenv("SNAPSHOT_DTYPE", "float16")  # float16 | int8
+        self.SNAPSHOT_REFRESH_SECONDS = float(os.getenv("SNAPSHOT_REFRESH_SECONDS", "3600"))  # --watch interval
+        self.SNAPSHOT_RELOAD_SECONDS = float(os.getenv("SNAPSHOT_RELOAD_SECONDS", "30"))  # 0 = load once
+        self.SNAPSHOT_ANN = os.getenv("SNAPSHOT_ANN", "False").lower() == "true"  # needs hnswlib
 
+        # 14. Perceptual-hash Fast Path (near-duplicates of ingested screenshots skip CLIP and Qdrant)
+        # Written by `python -m risk_agent.ingest_images`; PHASH_MAX_DISTANCE is in bits of 64 (0 disables).
+        self.PHASH_INDEX_PATH = Path(os.getenv("PHASH_INDEX_PATH", str(PROCESSED_DATA_DIR / "phash_index.json")))
+        self.PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "6"))
+
+        # 15. Startup
+        # Models, the OCR reader and the Qdrant client load lazily; the API preloads them in
+        # the background at startup (GET /ready reports progress) unless this is False.
+        self.WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "True").lower() == "true"
+
+        # 16. Image Preprocessing (each upload is decoded once for both CLIP and OCR)
+        # OCR reads a copy with its long side capped at OCR_MAX_SIDE, optionally grayscale and
+        # contrast-stretched (OCR_CONTRAST_CUTOFF = percent of darkest/brightest pixels ignored).
+        self.OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "2048"))
+        self.OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "True").lower() == "true"
+        self.OCR_AUTOCONTRAST = os.getenv("OCR_AUTOCONTRAST", "True").lower() == "true"
+        self.OCR_CONTRAST_CUTOFF = float(os.getenv("OCR_CONTRAST_CUTOFF", "1.0"))
+
+        # 17. OCR Engine
+        # A pool of EasyOCR readers (one per concurrent OCR call). OCR_MODE: standard | fast
+        # (half-resolution detection, input capped at 1280 px) | accurate (unquantized weights).
+        # Images whose edge density is below OCR_MIN_EDGE_DENSITY skip recognition (0 disables);
+        # tall screenshots are cut into tiles of width * OCR_TILE_ASPECT px recognized as one batch.
+        self.OCR_POOL_SIZE = int(os.getenv("OCR_POOL_SIZE", str(self.OCR_CONCURRENCY)))
+        self.OCR_MODE = os.getenv("OCR_MODE", "standard").lower()
+        self.OCR_MIN_EDGE_DENSITY = float(os.getenv("OCR_MIN_EDGE_DENSITY", "0.002"))
+        self.OCR_TILE_ASPECT = float(os.getenv("OCR_TILE_ASPECT", "1.0"))
+        self.OCR_TILE_OVERLAP = int(os.getenv("OCR_TILE_OVERLAP", "48"))
+        self.OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", "8"))
+
+        # 18. Audio Transcription
+        # Uploads are decoded locally to 16 kHz mono (WAV natively, other formats need the ffmpeg
+        # binary), silences longer than AUDIO_MIN_SILENCE_MS (frames AUDIO_VAD_THRESHOLD_DB below
+        # the loudest) are cut, and the rest goes out as overlapping chunks, AUDIO_CHUNK_CONCURRENCY
+        # at a time. Audio that cannot be decoded locally is uploaded whole.
+        # TRANSCRIPTION_BACKEND: groq | stub (offline placeholder transcripts, no network).
+        self.TRANSCRIPTION_BACKEND = os.getenv("TRANSCRIPTION_BACKEND", "groq").lower()
+        self.AUDIO_CHUNK_SECONDS = float(os.getenv("AUDIO_CHUNK_SECONDS", "30"))
+        self.AUDIO_CHUNK_OVERLAP_SECONDS = float(os.getenv("AUDIO_CHUNK_OVERLAP_SECONDS", "2"))
+        self.AUDIO_CHUNK_CONCURRENCY = int(os.getenv("AUDIO_CHUNK_CONCURRENCY", "4"))
+        self.AUDIO_VAD_THRESHOLD_DB = float(os.getenv("AUDIO_VAD_THRESHOLD_DB", "-40"))
+        self.AUDIO_MIN_SILENCE_MS = int(os.getenv("AUDIO_MIN_SILENCE_MS", "600"))
+
+        # 19. Lexicon Fast Path (unmistakable scam-script phrases skip retrieval and the LLM)
+        # Curated phrases plus those mined by `python -m risk_agent.lexicon`; evidence whose
+        # summed phrase weights reach LEXICON_THRESHOLD gets a High verdict (0 disables).
+        self.LEXICON_PATH = Path(os.getenv("LEXICON_PATH", str(PROCESSED_DATA_DIR / "lexicon.json")))
+        self.LEXICON_THRESHOLD = float(os.getenv("LEXICON_THRESHOLD", "6.0"))
+
+        # 20. Tiered Routing (retrieval-only verdicts for decisive evidence)
+        # The kNN label vote of the Scam Genome neighbours and the screenshot matches give a
+        # P(scam) score; at or above ROUTING_SCAM_THRESHOLD (or at or below ROUTING_LEGIT_THRESHOLD)
+        # "on" answers without the LLM, "shadow" still asks it and logs agreement, "off" skips scoring.
+        # Matches at ROUTING_MIN_SIMILARITY or below carry no weight.
+        self.ROUTING_MODE = os.getenv("ROUTING_MODE", "shadow").lower()
+        self.ROUTING_SCAM_THRESHOLD = float(os.getenv("ROUTING_SCAM_THRESHOLD", "0.9"))
+        self.ROUTING_LEGIT_THRESHOLD = float(os.getenv("ROUTING_LEGIT_THRESHOLD", "0.1"))
+        self.ROUTING_MIN_SIMILARITY = float(os.getenv("ROUTING_MIN_SIMILARITY", "0.5"))
+
+        # 21. Classifier Heads
+        # Calibrated scam classifiers over the text/image embeddings, written by
+        # `python -m risk_agent.heads` as <space>.npz; missing heads are simply not scored.
+        self.HEADS_DIR = Path(os.getenv("HEADS_DIR", str(PROCESSED_DATA_DIR / "heads")))
+
+
+    @staticmethod
+    def _index_settings(prefix, default_payload_indexes=""):
+        """
+        Per-collection Qdrant index options, read from <PREFIX>_* environment variables.
+        """
+        def optional_int(name):
+            value = os.getenv(f"{prefix}_{name}")
+            return int(value) if value else None
+
+        indexes = os.getenv(f"{prefix}_PAYLOAD_INDEXES", default_payload_indexes)
+        return {
+            "hnsw_m": optional_int("HNSW_M"),
+            "hnsw_ef_construct": optional_int("HNSW_EF_CONSTRUCT"),
+            "hnsw_ef": optional_int("HNSW_EF"),
+            # none | scalar | binary
+            "quantization": os.getenv(f"{prefix}_QUANTIZATION", "none").lower(),
+            "on_disk": os.getenv(f"{prefix}_ON_DISK", "False").lower() == "true",
+            "on_disk_payload": os.getenv(f"{prefix}_ON_DISK_PAYLOAD", "False").lower() == "true",
+            "payload_indexes": [f.strip() for f in indexes.split(",") if f.strip()],
+        }
 
     def get_qdrant_client(self):
-        return self.qdrant_client
+        return self._qdrant.get()
+
+    def _create_qdrant_client(self):
+        from qdrant_client import QdrantClient
+
+        if not self.USE_CLOUD:
+            return QdrantClient(path=self.QDRANT_PATH)
+        if not self.QDRANT_URL or not self.QDRANT_API_KEY:
+            raise ValueError("❌ Error: QDRANT_CLOUD_URL and QDRANT_API_KEY must be set in .env when USE_CLOUD=True")
+        return QdrantClient(
+            url=self.QDRANT_URL,
+            api_key=self.QDRANT_API_KEY,
+            timeout=40,
+        )
 
 # Instantiate a global settings object
 try:
     settings = Settings()
-    qdrant_client = settings.get_qdrant_client()
 except Exception as e:
     print(f"Failed to initialize configuration: {e}")
     raise
 
 def get_client():
-    """Returns the initialized QdrantClient instance."""
-    return qdrant_client
+    """Returns the shared QdrantClient instance (created on first call)."""
+    return settings.get_qdrant_client()
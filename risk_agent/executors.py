@@ -0,0 +1,40 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+
+from loguru import logger
+
+from risk_agent.config import settings
+
+# Bounded pools so the event loop never runs model inference or blocking network calls itself.
+cpu_executor = ThreadPoolExecutor(max_workers=settings.CPU_POOL_SIZE, thread_name_prefix="risk-cpu")
+io_executor = ThreadPoolExecutor(max_workers=settings.IO_POOL_SIZE, thread_name_prefix="risk-io")
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """
+    Runs a CPU-bound call (model encode, OCR) on the CPU pool and awaits its result.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_io(fn, *args, **kwargs):
+    """
+    Runs a blocking I/O call (Qdrant, LLM HTTP) on the I/O pool and awaits its result.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor, functools.partial(fn, *args, **kwargs))
+
+
+def get_pool_stats():
+    return {
+        "cpu_pool_size": settings.CPU_POOL_SIZE,
+        "io_pool_size": settings.IO_POOL_SIZE,
+    }
+
+
+def shutdown_executors():
+    logger.info("Shutting down worker pools...")
+    cpu_executor.shutdown(wait=False, cancel_futures=True)
+    io_executor.shutdown(wait=False, cancel_futures=True)
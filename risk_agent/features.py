@@ -1,88 +1,110 @@
+from contextlib import nullcontext
+import os
+from pathlib import Path
 import re
 import sys
-from pathlib import Path
+import time
+from typing import Optional
+
 from loguru import logger
+from qdrant_client import models
 from tqdm import tqdm
 import typer
-# import pandas as pd # Not strictly needed if we just use lists
-from sentence_transformers import SentenceTransformer
-from qdrant_client import models
-from datasets import load_dataset
 
 # Ensure project root is in path for imports
 PROJ_ROOT = Path(__file__).resolve().parents[1]
 sys.path.append(str(PROJ_ROOT))
 
-from risk_agent.config import PROCESSED_DATA_DIR, RAW_DATA_DIR, settings
+from risk_agent.config import (
+    INTERIM_DATA_DIR,
+    PROCESSED_DATA_DIR,
+    RAW_DATA_DIR,
+    TEXT_EMBEDDING_MODEL,
+    settings,
+)
+from risk_agent.ingestion import (
+    IngestCheckpoint,
+    ParallelUploader,
+    ShardWriter,
+    chunked,
+    content_point_id,
+    iter_shard_parts,
+    pending_items,
+    reset_checkpoints,
+    shard_of,
+)
+from risk_agent.model_registry import get_model, multi_process_pool
+from risk_agent.schema import (
+    SCAM_GENOME_COLLECTION,
+    TEXT_VECTOR,
+    create_collection,
+    ensure_payload_indexes,
+    genome_vectors_config,
+    has_named_vectors,
+    override_tuning,
+)
 
 app = typer.Typer()
 
-def load_raw_data():
-    data = []
-    
-    # Process Non-Scam (Label: legit) -> Safe Example
-    non_scam_path = RAW_DATA_DIR / "English_NonScam.txt"
-    if non_scam_path.exists():
-        text = non_scam_path.read_text(encoding="utf-8", errors="replace")
-        chunks = text.split("\n\n")
-        for chunk in chunks:
-            chunk = chunk.strip()
-            if not chunk: continue
-            # Remove leading numbering like "1. ", "309. "
-            cleaned = re.sub(r'^\d+\.\s*', '', chunk)
-            if cleaned:
-                # Prepend metadata to the text being embedded for consistency
-                # Since these are local files, we assign default "type" and "personality"
-                scam_type = "legit_banking"
-                personality = "unknown"
-                
-                embedded_text = f"Type: {scam_type}\nPersonality: {personality}\nDialogue:\n{cleaned}"
+# Records embedded (and checkpointed) per step: batch_size * CHUNK_BATCHES
+CHUNK_BATCHES = 32
 
-                data.append({
-                    "text": embedded_text, # Embed the structured text
-                    "original_text": cleaned,
-                    "category": "ground_truth",
-                    "risk_label": "legit",
-                    "scam_type": scam_type,
-                    "personality": personality,
-                    "description": "Safe conversations (Normal banking)"
-                })
-    else:
-        logger.warning(f"File not found: {non_scam_path}")
-
-    # Process Scam (Label: scam) -> Scam Pattern
-    scam_path = RAW_DATA_DIR / "English_Scam.txt"
-    if scam_path.exists():
-        text = scam_path.read_text(encoding="utf-8", errors="replace")
-        chunks = text.split("\n\n")
-        for chunk in chunks:
-            chunk = chunk.strip()
-            if not chunk: continue
-            cleaned = re.sub(r'^\d+\.\s*', '', chunk)
-            if cleaned:
-                # Known scam scripts
-                scam_type = "scam_scripts"
-                personality = "unknown"
-                
-                embedded_text = f"Type: {scam_type}\nPersonality: {personality}\nDialogue:\n{cleaned}"
-                
-                data.append({
-                    "text": embedded_text,
-                    "original_text": cleaned,
-                    "category": "ground_truth",
-                    "risk_label": "scam", 
-                    "scam_type": scam_type,
-                    "personality": personality,
-                    "description": "The pre-loaded data (Pig Butchering scripts, etc.)"
-                })
-    else:
-        logger.warning(f"File not found: {scam_path}")
+# Local corpus files: (file under data/raw, scam_type, risk_label, description)
+RAW_TEXT_FILES = (
+    ("English_NonScam.txt", "legit_banking", "legit", "Safe conversations (Normal banking)"),
+    ("English_Scam.txt", "scam_scripts", "scam", "The pre-loaded data (Pig Butchering scripts, etc.)"),
+)
+HF_DATASET = "BothBosu/multi-agent-scam-conversation"
 
+def _iter_chunks(path):
+    """
+    Yields the blank-line separated chunks of a text file without reading it whole.
+    """
+    lines = []
+    with path.open(encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if line.rstrip("\r\n"):
+                lines.append(line)
+            elif lines:
+                yield "".join(lines).strip()
+                lines = []
+    if lines:
+        yield "".join(lines).strip()
+
+def _iter_text_file(path, scam_type, risk_label, description):
+    if not path.exists():
+        logger.warning(f"File not found: {path}")
+        return
+    for chunk in _iter_chunks(path):
+        if not chunk:
+            continue
+        # Remove leading numbering like "1. ", "309. "
+        cleaned = re.sub(r'^\d+\.\s*', '', chunk)
+        if cleaned:
+            # Prepend metadata to the text being embedded for consistency
+            # Since these are local files, we assign default "type" and "personality"
+            personality = "unknown"
+
+            embedded_text = f"Type: {scam_type}\nPersonality: {personality}\nDialogue:\n{cleaned}"
+
+            yield {
+                "text": embedded_text, # Embed the structured text
+                "original_text": cleaned,
+                "category": "ground_truth",
+                "risk_label": risk_label,
+                "scam_type": scam_type,
+                "personality": personality,
+                "description": description
+            }
+
+def _iter_hf_dataset(errors=None, revision=None):
     # Process Hugging Face Dataset: BothBosu/multi-agent-scam-conversation
     try:
-        logger.info("Loading Hugging Face dataset: BothBosu/multi-agent-scam-conversation")
-        # Load the dataset (assuming 'train' split if not specified, but explicit is better)
-        hf_dataset = load_dataset("BothBosu/multi-agent-scam-conversation", split="train")
+        logger.info(f"Streaming Hugging Face dataset: {HF_DATASET} (revision {revision or 'latest'})")
+        from datasets import load_dataset  # slow import, only needed for ingestion
+
+        # streaming=True yields rows as they download instead of materializing the split
+        hf_dataset = load_dataset(HF_DATASET, split="train", streaming=True, revision=revision)
         
         for item in hf_dataset:
             # item keys based on image: 'dialogue', 'type', 'labels', 'personality'
@@ -102,7 +124,7 @@ def load_raw_data():
                 # Construct text for embedding utilizing metadata
                 embedded_text = f"Type: {scam_type}\nPersonality: {personality}\nDialogue:\n{raw_text}"
                 
-                data.append({
+                record = {
                     "text": embedded_text,
                     "original_text": raw_text,
                     "category": "hf_dataset",
@@ -110,102 +132,283 @@ def load_raw_data():
                     "scam_type": scam_type,
                     "personality": personality,
                     "description": f"Source: BothBosu/multi-agent-scam-conversation, Type: {scam_type}"
-                })
+                }
             except Exception as e:
                 logger.warning(f"Skipping an item due to error: {e}")
+                continue
+            yield record
                 
     except Exception as e:
         logger.error(f"Failed to load HF dataset: {e}")
-                
-    return data
+        if errors is not None:
+            errors.append(e)
 
-def generate_embeddings(texts, model_name="BAAI/bge-base-en-v1.5", max_seq_length=512, batch_size=32):
+def iter_raw_records(errors=None, hf_revision=None):
+    """
+    Streams every corpus record (raw text files, then the HF dataset) one at a time.
+    A failed HF download is logged and appended to errors, so callers can tell the corpus is partial.
+    """
+    # Non-scam (legit) safe examples first, then the known scam scripts
+    for filename, scam_type, risk_label, description in RAW_TEXT_FILES:
+        yield from _iter_text_file(RAW_DATA_DIR / filename, scam_type, risk_label, description)
+    yield from _iter_hf_dataset(errors, hf_revision)
+
+def hf_dataset_revision():
+    """
+    Current commit of the HF dataset, or None when the Hub cannot be reached.
+    """
+    try:
+        from huggingface_hub import HfApi  # installed with datasets
+
+        return HfApi().dataset_info(HF_DATASET, timeout=10).sha
+    except Exception as e:
+        logger.warning(f"Could not look up the {HF_DATASET} revision: {e}")
+        return None
+
+def raw_sources(store):
+    """
+    Fingerprint of everything iter_raw_records reads, to tell whether stored records are stale.
+    """
+    return store.fingerprint_sources(
+        [RAW_DATA_DIR / filename for filename, *_ in RAW_TEXT_FILES],
+        {HF_DATASET: hf_dataset_revision()},
+    )
+
+def load_raw_data():
+    """
+    The whole corpus as a list (kept for scripts that want it in memory; ingestion streams).
+    """
+    return list(iter_raw_records())
+
+def generate_embeddings(texts, model_name=TEXT_EMBEDDING_MODEL, max_seq_length=512, batch_size=32, show_progress=None, pool=None):
     """
     Generate embeddings for a list of texts using the specified model.
+    The model comes from the process-wide registry, so only the first call pays for loading it.
+    With a pool from model_registry.multi_process_pool the batch is split across its processes.
     """
-    logger.info(f"Loading embedding model: {model_name}...")
-    model = SentenceTransformer(model_name)
-    model.max_seq_length = max_seq_length
-    logger.info(f"Model sequence length set to: {max_seq_length}")
-    logger.info(f"Model loaded on device: {model.device}")
-    
-    logger.info(f"Generating embeddings (Batch Size: {batch_size})...")
-    embeddings = model.encode(texts, show_progress_bar=True, batch_size=batch_size)
+    model = get_model(model_name, max_seq_length=max_seq_length)
+    if pool is not None:
+        embeddings = model.encode_multi_process(texts, pool, batch_size=batch_size)
+        return embeddings, model.get_sentence_embedding_dimension()
+
+    # Progress bars are only useful for bulk ingestion, not single request-path queries
+    if show_progress is None:
+        show_progress = len(texts) > batch_size
+    if show_progress:
+        logger.info(f"Generating embeddings (Batch Size: {batch_size})...")
+    embeddings = model.encode(texts, show_progress_bar=show_progress, batch_size=batch_size)
     return embeddings, model.get_sentence_embedding_dimension()
 
+def _upload_shards(client, collection_name, directory, uploader, checkpoint):
+    """
+    Upserts every shard part under directory (no model inference), skipping points
+    already stored with the model version recorded in their payload.
+    """
+    total, uploaded = 0, 0
+    for ids, payloads, vectors in tqdm(iter_shard_parts(directory), desc="Merging shards", unit=" parts"):
+        total += len(ids)
+        rows = {point_id: (payload, vector) for point_id, payload, vector in zip(ids, payloads, vectors)}
+        by_version = {}
+        for point_id, (payload, _) in rows.items():
+            by_version.setdefault(payload.get("model_version"), []).append((point_id, None))
+        for model_version, items in by_version.items():
+            pending = pending_items(client, collection_name, items, model_version, checkpoint)
+            uploader.put([
+                models.PointStruct(
+                    id=point_id,
+                    vector={TEXT_VECTOR: rows[point_id][1].tolist()},
+                    payload=rows[point_id][0],
+                )
+                for point_id, _ in pending
+            ])
+            uploaded += len(pending)
+    return total, uploaded
+
 @app.command()
 def main(
-    collection_name: str = "Scam Genome",
-    model_name: str = "BAAI/bge-base-en-v1.5",
+    collection_name: str = SCAM_GENOME_COLLECTION,
+    model_name: str = TEXT_EMBEDDING_MODEL,
     batch_size: int = 8,
     recreate: bool = False,
-    max_seq_length: int = 512
+    max_seq_length: int = 512,
+    hnsw_m: Optional[int] = None,
+    ef_construct: Optional[int] = None,
+    quantization: Optional[str] = typer.Option(None, help="none | scalar | binary"),
+    on_disk: Optional[bool] = None,
+    on_disk_payload: Optional[bool] = None,
+    upload_workers: int = 4,
+    upload_batch_size: int = 64,
+    workers: int = typer.Option(1, help="Encode processes, each with its own model copy"),
+    shards: int = typer.Option(1, help="Split the corpus into this many shards"),
+    shard_index: Optional[int] = typer.Option(None, help="Only embed this shard (0-based)"),
+    shard_dir: Optional[Path] = typer.Option(None, help="Write embeddings here instead of upserting"),
+    merge_shards: Optional[Path] = typer.Option(None, help="Upsert shards written with --shard-dir"),
+    processed_dir: Path = typer.Option(PROCESSED_DATA_DIR / "scam_genome", help="Parsed records and embeddings"),
+    refresh_records: bool = typer.Option(False, help="Re-parse the raw files and HF dataset"),
+    load: bool = typer.Option(False, help="Upsert stored embeddings only, without any model inference"),
 ):
     """
-    Load data, generate embeddings, and upsert to Qdrant.
+    Stream data, generate embeddings, and upsert to Qdrant.
+    Index options default to the GENOME_* settings and only apply when the collection is created
+    (use `python -m risk_agent.index_tuning` for an existing one).
+
+    For large jobs, run `--shards N --shard-index i --shard-dir DIR` on N machines and then
+    `--merge-shards DIR` once to upsert all shards without re-embedding.
+
+    Parsed records and their embeddings are kept under --processed-dir, so later runs skip
+    parsing and only embed what is new; `--load` rebuilds a collection from them alone.
     """
-    logger.info("Loading raw data...")
-    raw_data = load_raw_data()
-    logger.info(f"Total records found: {len(raw_data)}")
-    
-    if not raw_data:
-        logger.error("No data found! Exiting.")
-        return
+    if shards > 1 and (shard_index is None or not 0 <= shard_index < shards):
+        logger.error(f"--shard-index must be between 0 and {shards - 1} when --shards is {shards}.")
+        raise typer.Exit(code=1)
+
+    from risk_agent.processed import ProcessedStore
+
+    model_version = f"{model_name}@{max_seq_length}"
+    chunk_size = batch_size * CHUNK_BATCHES
+    store = ProcessedStore(processed_dir)
+    stored_vectors = store.embeddings(model_version)
+
+    # Shard-only runs just embed to disk and never touch Qdrant
+    client, checkpoint, writer, uploader = None, None, None, None
+    if shard_dir is not None:
+        writer = ShardWriter(shard_dir, shard_index or 0, shards)
+    else:
+        tuning = override_tuning(
+            dict(settings.GENOME_INDEX),
+            hnsw_m=hnsw_m,
+            ef_construct=ef_construct,
+            quantization=quantization,
+            on_disk=on_disk,
+            on_disk_payload=on_disk_payload,
+        )
+
+        # Initialize Qdrant
+        client = settings.get_qdrant_client()
+
+        # Check collection
+        collections = client.get_collections().collections
+        exists = any(c.name == collection_name for c in collections)
+
+        if not exists or recreate:
+            if recreate and exists:
+                logger.info(f"Deleting existing collection {collection_name}...")
+                client.delete_collection(collection_name)
+            # Image checkpoints too: ingest_images must not skip screenshots the new collection lacks
+            reset_checkpoints(INTERIM_DATA_DIR, collection_name)
 
-    texts = [d["text"] for d in raw_data]
-    
-    # Generate Embeddings
-    embeddings, embedding_dim = generate_embeddings(texts, model_name, max_seq_length, batch_size)
-    
-    # Initialize Qdrant
-    client = settings.get_qdrant_client()
-    
-    # Check collection
-    collections = client.get_collections().collections
-    exists = any(c.name == collection_name for c in collections)
-
-    
-    if not exists or recreate:
-        if recreate and exists:
-            logger.info(f"Deleting existing collection {collection_name}...")
-            client.delete_collection(collection_name)
-            
-        logger.info(f"Creating collection {collection_name} with dimension {embedding_dim}...")
-        client.create_collection(
-            collection_name=collection_name,
-            vectors_config=models.VectorParams(
-                size=embedding_dim, 
-                distance=models.Distance.COSINE
-            )
+            logger.info(f"Creating collection {collection_name} with named vectors (text, image)...")
+            create_collection(client, collection_name, genome_vectors_config(), tuning)
+        else:
+            if not has_named_vectors(client, collection_name):
+                logger.error(
+                    f"Collection {collection_name} still uses the old single-vector schema. "
+                    "Run `python -m risk_agent.migrate` first (or pass --recreate)."
+                )
+                return
+            logger.info(f"Collection {collection_name} already exists. Appending to it.")
+            ensure_payload_indexes(client, collection_name, tuning)
+
+        checkpoint = IngestCheckpoint(INTERIM_DATA_DIR, collection_name, model_version)
+        uploader = ParallelUploader(
+            client, collection_name, workers=upload_workers, batch_size=upload_batch_size,
+            on_uploaded=checkpoint.add,
         )
+
+    if merge_shards is not None or load:
+        if uploader is None:
+            logger.error("--merge-shards and --load upsert to Qdrant and cannot be combined with --shard-dir.")
+            raise typer.Exit(code=1)
+        source = merge_shards if merge_shards is not None else stored_vectors.path
+        with uploader:
+            total, uploaded = _upload_shards(client, collection_name, source, uploader, checkpoint)
+        logger.success(f"Loaded {total} stored records from {source} ({uploaded} upserted) into collection '{collection_name}'.")
+        return
+
+    sources = raw_sources(store)
+    if store.records_current(sources) and not refresh_records:
+        logger.info(f"Reading parsed records from {store.records_path}")
+        records = store.iter_records()
     else:
-        logger.info(f"Collection {collection_name} already exists. Appending to it.")
-
-    # Prepare points
-    logger.info("Upserting points to Qdrant...")
-    points = []
-    for idx, (item, vector) in enumerate(zip(raw_data, embeddings)):
-        # We can use a simple integer ID or UUID. 
-        # Ideally, hash the content for deduplication, but simple int ID for now.
-        # If appending, we need to know the offset. 
-        # But for this simple script, let's assume valid IDs.
-        # Actually Qdrant allows creating points with integer IDs.
-        points.append(models.PointStruct(
-            id=idx,
-            vector=vector.tolist(),
-            payload=item
-        ))
-    
-    # Batch upsert
-    total_batches = (len(points) + batch_size - 1) // batch_size
-    for i in tqdm(range(0, len(points), batch_size), total=total_batches, desc="Upserting"):
-        batch = points[i : i + batch_size]
-        client.upsert(
-            collection_name=collection_name,
-            points=batch
+        if store.has_records() and not refresh_records:
+            logger.info("Raw files or the HF dataset changed since the records were parsed; re-parsing.")
+        errors = []
+        # A partial corpus (e.g. the HF download failed) is used for this run but not stored
+        records = store.caching_records(
+            iter_raw_records(errors, sources["revisions"][HF_DATASET]), keep=lambda: not errors, sources=sources
         )
-        
-    logger.success(f"Successfully processed {len(points)} records into collection '{collection_name}'.")
+
+    # Records stream through in chunks: while one chunk is being embedded, the upload
+    # workers push the previous ones to Qdrant, so memory stays flat and the run takes
+    # about max(embed, upload) rather than their sum.
+    # Point ids are derived from the embedded text, so unchanged dialogues keep their id
+    # and only new or edited ones (or ones embedded by another model) are processed.
+    seen = set()
+    total, embedded, reused, embed_seconds = 0, 0, 0, 0.0
+    pool_context = multi_process_pool(model_name, max_seq_length, workers) if workers > 1 else nullcontext()
+    with pool_context as pool, uploader or nullcontext(), tqdm(desc="Ingesting", unit=" records") as progress:
+        for chunk in chunked(records, chunk_size):
+            items = []
+            for item in chunk:
+                point_id = content_point_id("text", item["text"])
+                if point_id in seen or (shards > 1 and shard_of(point_id, shards) != shard_index):
+                    continue
+                seen.add(point_id)
+                items.append((point_id, item))
+            total += len(items)
+            if writer is not None:
+                pending = [(point_id, item) for point_id, item in items if point_id not in writer]
+            else:
+                pending = pending_items(client, collection_name, items, model_version, checkpoint)
+            if pending:
+                # Vectors already in the processed store for this model are reused as-is
+                vectors = stored_vectors.vectors([point_id for point_id, _ in pending])
+                missing = [(point_id, item) for point_id, item in pending if point_id not in vectors]
+                if missing:
+                    started = time.perf_counter()
+                    embeddings, _ = generate_embeddings(
+                        [item["text"] for _, item in missing], model_name, max_seq_length, batch_size,
+                        show_progress=False, pool=pool,
+                    )
+                    embed_seconds += time.perf_counter() - started
+                    stored_vectors.write(
+                        [point_id for point_id, _ in missing],
+                        [{**item, "model_version": model_version} for _, item in missing],
+                        embeddings,
+                    )
+                    vectors.update(zip((point_id for point_id, _ in missing), embeddings))
+                    embedded += len(missing)
+                reused += len(pending) - len(missing)
+                ids = [point_id for point_id, _ in pending]
+                payloads = [{**item, "model_version": model_version} for _, item in pending]
+                if writer is not None:
+                    writer.write(ids, payloads, [vectors[point_id] for point_id in ids])
+                else:
+                    uploader.put([
+                        models.PointStruct(id=point_id, vector={TEXT_VECTOR: vectors[point_id].tolist()}, payload=payload)
+                        for point_id, payload in zip(ids, payloads)
+                    ])
+            progress.update(len(chunk))
+
+    if not total:
+        logger.error("No data found! Exiting.")
+        return
+    if embed_seconds:
+        rate = embedded / embed_seconds
+        cores = os.cpu_count() or 1
+        logger.info(
+            f"Embedded {embedded} records in {embed_seconds:.1f}s: {rate:.1f} records/s, "
+            f"{rate / max(1, workers):.1f}/s per worker, {rate / cores:.2f}/s per core ({cores} cores)."
+        )
+    processed = embedded + reused
+    logger.info(
+        f"{total} unique records, {total - processed} already ingested, "
+        f"{reused} reused from {stored_vectors.path}, {embedded} embedded."
+    )
+    if writer is not None:
+        logger.success(f"Wrote {processed} records to {writer.path}.")
+    else:
+        logger.success(f"Successfully processed {processed} records into collection '{collection_name}'.")
 
 if __name__ == "__main__":
     app()
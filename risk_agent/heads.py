@@ -0,0 +1,453 @@
+from collections import Counter
+import json
+import os
+from pathlib import Path
+import re
+import sys
+import threading
+import time
+
+from loguru import logger
+import numpy as np
+import typer
+
+# Ensure project root is in path for imports
+PROJ_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJ_ROOT))
+
+from risk_agent.metrics import LatencyWindow
+from risk_agent.schema import IMAGE_VECTOR, SCAM_GENOME_COLLECTION, TEXT_VECTOR
+
+app = typer.Typer()
+
+HEAD_VERSION = 1
+SPACES = (TEXT_VECTOR, IMAGE_VECTOR)
+LABELS = {"scam": 1, "legit": 0}
+# Metadata header that features.py prepends to the dialogue before embedding it
+EMBEDDING_HEADER = re.compile(r"\AType:[^\n]*\nPersonality:[^\n]*\nDialogue:\n")
+
+
+def _normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -40, 40)))
+
+
+class ClassifierHead:
+    """
+    A linear or one-hidden-layer (ReLU) scorer over unit-length embeddings, followed by
+    Platt scaling, so predict() returns a calibrated P(scam). Stored as a single .npz of
+    float32 weights plus a JSON metadata string (model version, split sizes, metrics).
+    """
+
+    def __init__(self, weights, calibration, meta):
+        self.weights = [np.asarray(w, dtype=np.float32) for w in weights]
+        self.calibration = np.asarray(calibration, dtype=np.float64)
+        self.meta = meta
+        self.latency = LatencyWindow()
+
+    def logits(self, vectors):
+        hidden = _normalize(np.atleast_2d(vectors))
+        layers = list(zip(self.weights[::2], self.weights[1::2]))
+        for weight, bias in layers[:-1]:
+            hidden = np.maximum(hidden @ weight + bias, 0.0)
+        weight, bias = layers[-1]
+        return (hidden @ weight + bias).ravel()
+
+    def predict(self, vectors):
+        """
+        Calibrated P(scam) for each row (a single vector gives a length-1 array).
+        """
+        slope, intercept = self.calibration
+        return _sigmoid(slope * self.logits(vectors) + intercept)
+
+    def probability(self, vector):
+        """
+        P(scam) of one embedding, timed for stats().
+        """
+        started = time.perf_counter()
+        value = float(self.predict(vector)[0])
+        self.latency.record(time.perf_counter() - started)
+        return round(value, 4)
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {f"w{i}": weight for i, weight in enumerate(self.weights)}
+        tmp_path = path.with_name(path.stem + ".tmp.npz")
+        np.savez(tmp_path, calibration=self.calibration, meta=np.array(json.dumps(self.meta)), **arrays)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            weights = [data[f"w{i}"] for i in range(sum(1 for key in data.files if key.startswith("w")))]
+            return cls(weights, data["calibration"], json.loads(str(data["meta"])))
+
+    def stats(self):
+        latency = self.latency.snapshot()
+        return {
+            "kind": self.meta.get("kind"),
+            "model_version": self.meta.get("model_version"),
+            "trained_on": self.meta.get("train_size"),
+            "test": self.meta.get("test"),
+            "evaluations": latency["count"],
+            "mean_us": round(latency["mean_ms"] * 1000, 1) if latency["mean_ms"] is not None else None,
+        }
+
+
+# --- Training (numpy only, CPU) ---
+
+def fit_linear(X, y, l2=1e-3, iterations=25):
+    """
+    L2-regularized logistic regression by Newton's method; [weight (d x 1), bias (1,)].
+    """
+    n, d = X.shape
+    Xb = np.hstack([X, np.ones((n, 1), dtype=X.dtype)]).astype(np.float64)
+    theta = np.zeros(d + 1)
+    penalty = np.full(d + 1, l2 * n)
+    penalty[-1] = 0.0  # bias is not regularized
+    for _ in range(iterations):
+        p = _sigmoid(Xb @ theta)
+        gradient = Xb.T @ (p - y) + penalty * theta
+        hessian = (Xb * (p * (1 - p))[:, None]).T @ Xb + np.diag(penalty) + 1e-9 * np.eye(d + 1)
+        step = np.linalg.solve(hessian, gradient)
+        theta -= step
+        if np.abs(step).max() < 1e-6:
+            break
+    return [theta[:-1, None], theta[-1:]]
+
+
+def fit_mlp(X, y, hidden=64, l2=1e-4, epochs=300, learning_rate=1e-2, batch_size=256, seed=0):
+    """
+    One ReLU hidden layer trained with Adam on the logistic loss; [w0, b0, w1, b1].
+    """
+    rng = np.random.default_rng(seed)
+    n, d = X.shape
+    params = [
+        rng.normal(0, np.sqrt(2 / d), (d, hidden)), np.zeros(hidden),
+        rng.normal(0, np.sqrt(1 / hidden), (hidden, 1)), np.zeros(1),
+    ]
+    moments = [np.zeros_like(p) for p in params]
+    velocities = [np.zeros_like(p) for p in params]
+    step = 0
+    for _ in range(epochs):
+        order = rng.permutation(n)
+        for start in range(0, n, batch_size):
+            batch = order[start:start + batch_size]
+            xb, yb = X[batch], y[batch]
+            pre = xb @ params[0] + params[1]
+            act = np.maximum(pre, 0.0)
+            p = _sigmoid((act @ params[2] + params[3]).ravel())
+            delta = ((p - yb) / len(batch))[:, None]
+            back = (delta @ params[2].T) * (pre > 0)
+            grads = [xb.T @ back + l2 * params[0], back.sum(0), act.T @ delta + l2 * params[2], delta.sum(0)]
+            step += 1
+            for i, grad in enumerate(grads):
+                moments[i] = 0.9 * moments[i] + 0.1 * grad
+                velocities[i] = 0.999 * velocities[i] + 0.001 * grad ** 2
+                corrected = moments[i] / (1 - 0.9 ** step)
+                scale = np.sqrt(velocities[i] / (1 - 0.999 ** step)) + 1e-8
+                params[i] = params[i] - learning_rate * corrected / scale
+    return params
+
+
+def fit_platt(logits, y, iterations=50):
+    """
+    (slope, intercept) mapping raw logits to calibrated probabilities, fitted with Platt's
+    smoothed targets so a perfectly separated calibration split does not blow up.
+    """
+    positives, negatives = y.sum(), len(y) - y.sum()
+    targets = np.where(y == 1, (positives + 1) / (positives + 2), 1 / (negatives + 2))
+    Z = np.stack([logits, np.ones_like(logits)], axis=1).astype(np.float64)
+    theta = np.array([1.0, 0.0])
+    for _ in range(iterations):
+        p = _sigmoid(Z @ theta)
+        gradient = Z.T @ (p - targets)
+        hessian = (Z * (p * (1 - p))[:, None]).T @ Z + 1e-9 * np.eye(2)
+        step = np.linalg.solve(hessian, gradient)
+        theta -= step
+        if np.abs(step).max() < 1e-8:
+            break
+    return theta
+
+
+def evaluate(probabilities, y, bins=10):
+    """
+    Accuracy at 0.5, Brier score, log loss and expected calibration error.
+    """
+    probabilities = np.clip(np.asarray(probabilities, dtype=np.float64), 1e-7, 1 - 1e-7)
+    edges = np.minimum((probabilities * bins).astype(int), bins - 1)
+    ece = sum(
+        abs(probabilities[edges == b].mean() - y[edges == b].mean()) * (edges == b).mean()
+        for b in range(bins) if (edges == b).any()
+    )
+    return {
+        "size": int(len(y)),
+        "accuracy": round(float(((probabilities >= 0.5) == y).mean()), 4),
+        "brier": round(float(((probabilities - y) ** 2).mean()), 4),
+        "log_loss": round(float(-(y * np.log(probabilities) + (1 - y) * np.log(1 - probabilities)).mean()), 4),
+        "ece": round(float(ece), 4),
+    }
+
+
+def split(y, fractions=(0.7, 0.15), seed=0):
+    """
+    Shuffled train / calibration / test index arrays, stratified by label.
+    """
+    rng = np.random.default_rng(seed)
+    parts = ([], [], [])
+    for label in (0, 1):
+        index = rng.permutation(np.flatnonzero(y == label))
+        train_end = int(round(len(index) * fractions[0]))
+        calibration_end = train_end + int(round(len(index) * fractions[1]))
+        for part, chunk in zip(parts, (index[:train_end], index[train_end:calibration_end], index[calibration_end:])):
+            part.append(chunk)
+    return [np.concatenate(part) for part in parts]
+
+
+def train_head(X, y, kind="linear", hidden=64, seed=0, model_version=None):
+    """
+    Fits a head on the train split, calibrates it on the calibration split and reports
+    metrics on the held-out test split.
+    """
+    X, y = _normalize(X), np.asarray(y, dtype=np.float64)
+    if len(np.unique(y)) < 2 or min(np.bincount(y.astype(int))) < 5:
+        raise ValueError("Need at least 5 scam and 5 legit examples to train a head")
+    train, calibration, test = split(y, seed=seed)
+    if kind == "linear":
+        weights = fit_linear(X[train], y[train])
+    elif kind == "mlp":
+        weights = fit_mlp(X[train], y[train], hidden=hidden, seed=seed)
+    else:
+        raise ValueError(f"Unknown head kind {kind!r}, expected linear or mlp")
+
+    head = ClassifierHead(weights, [1.0, 0.0], {})
+    head.calibration = fit_platt(head.logits(X[calibration]), y[calibration])
+    head.meta = {
+        "version": HEAD_VERSION,
+        "kind": kind,
+        "model_version": model_version,
+        "dims": int(X.shape[1]),
+        "train_size": int(len(train)),
+        "scam_share": round(float(y.mean()), 4),
+        "test": evaluate(head.predict(X[test]), y[test]) if len(test) else None,
+    }
+    return head
+
+
+# --- Export ---
+
+def labelled_arrays(rows):
+    """
+    (vectors, labels, model_version) from (vector, payload) rows with a scam/legit
+    risk_label; other rows are skipped. model_version is the most common one seen.
+    """
+    vectors, labels, versions = [], [], Counter()
+    for vector, payload in rows:
+        label = LABELS.get((payload or {}).get("risk_label"))
+        if label is None or vector is None:
+            continue
+        vectors.append(np.asarray(vector, dtype=np.float32))
+        labels.append(label)
+        versions[(payload or {}).get("model_version")] += 1
+    if not vectors:
+        return np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.int8), None
+    return np.stack(vectors), np.asarray(labels, dtype=np.int8), versions.most_common(1)[0][0]
+
+
+def dialogue_text(record):
+    """
+    The bare dialogue of a Scam Genome record: "original_text", else "text" without the
+    "Type: ... / Personality: ... / Dialogue:" header.
+    """
+    text = record.get("original_text") or EMBEDDING_HEADER.sub("", record.get("text") or "", count=1)
+    return text.strip()
+
+
+def text_training_arrays(records, encode, batch_size=256):
+    """
+    (vectors, labels) for the text head: the dialogue of every scam/legit record, embedded
+    with encode(texts) the way request-time evidence is.
+
+    The vectors stored in Scam Genome embed the header too, and its "Type:" line names the
+    label (legit_banking vs scam_scripts), so a head trained on them learns the header, and
+    its test metrics and calibration do not carry over to header-free request text.
+    """
+    texts, labels = [], []
+    for record in records:
+        label = LABELS.get(record.get("risk_label"))
+        text = dialogue_text(record)
+        if label is not None and text:
+            texts.append(text)
+            labels.append(label)
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.int8)
+    vectors = np.concatenate([
+        np.asarray(encode(texts[start:start + batch_size]), dtype=np.float32)
+        for start in range(0, len(texts), batch_size)
+    ])
+    return vectors, np.asarray(labels, dtype=np.int8)
+
+
+def _scroll_space(client, collection_name, space=None, batch_size=256):
+    """
+    (vector of space, payload) for every point; payloads only when space is None.
+    """
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=[space] if space else False,
+        )
+        for record in records:
+            vectors = record.vector if isinstance(record.vector, dict) else {}
+            yield vectors.get(space), record.payload
+        if offset is None:
+            break
+
+
+def save_labelled(path, vectors, labels, model_version):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(path, vectors=vectors.astype(np.float16), labels=labels, model_version=np.array(model_version or ""))
+
+
+def load_labelled(path):
+    with np.load(path, allow_pickle=False) as data:
+        return data["vectors"].astype(np.float32), data["labels"], str(data["model_version"]) or None
+
+
+# --- Request path ---
+
+class HeadSet:
+    """
+    The trained heads found in one directory (<space>.npz), reloaded when a file changes.
+    Heads trained on a different embedding model than the one serving requests are ignored.
+    """
+
+    def __init__(self, directory, expected_versions=None):
+        self.directory = Path(directory)
+        self.expected_versions = expected_versions or {}
+        self._heads = {}
+        self._mtimes = {}
+        self._lock = threading.Lock()
+
+    def get(self, space):
+        path = self.directory / f"{space}.npz"
+        mtime = os.stat(path).st_mtime if path.exists() else None
+        with self._lock:
+            if self._mtimes.get(space, -1) != mtime:
+                self._mtimes[space] = mtime
+                self._heads[space] = self._load(space, path) if mtime is not None else None
+            return self._heads[space]
+
+    def _load(self, space, path):
+        try:
+            head = ClassifierHead.load(path)
+        except Exception as e:
+            logger.error(f"Could not load classifier head {path}: {e}")
+            return None
+        expected = self.expected_versions.get(space)
+        if expected and head.meta.get("model_version") not in (None, expected):
+            logger.warning(f"Ignoring {path}: trained on {head.meta['model_version']}, serving {expected}")
+            return None
+        return head
+
+    def stats(self):
+        return {space: (head.stats() if (head := self.get(space)) else None) for space in SPACES}
+
+
+_head_sets = {}
+
+
+def get_heads(directory, expected_versions=None):
+    """
+    One shared HeadSet per directory for the process.
+    """
+    key = str(directory)
+    if key not in _head_sets:
+        _head_sets[key] = HeadSet(directory, expected_versions)
+    return _head_sets[key]
+
+
+@app.command()
+def main(
+    collection_name: str = SCAM_GENOME_COLLECTION,
+    heads_dir: Path = None,
+    space: str = "all",
+    kind: str = "linear",
+    hidden: int = 64,
+    export: bool = True,
+    source: str = "qdrant",
+    processed_dir: Path = None,
+    seed: int = 0,
+):
+    """
+    Export labelled Scam Genome examples and fit a calibrated classifier head per vector
+    space. The text head is trained on the dialogues re-embedded without their metadata
+    header (read from Qdrant payloads, or from data/processed with --source processed);
+    the image head on the stored CLIP vectors. --no-export retrains from the last export.
+    """
+    from risk_agent.config import PROCESSED_DATA_DIR, TEXT_EMBEDDING_MODEL, settings
+
+    heads_dir = heads_dir or settings.HEADS_DIR
+    spaces = SPACES if space == "all" else (space,)
+    if any(s not in SPACES for s in spaces):
+        logger.error(f"Unknown vector space {space!r}, expected one of: all, {', '.join(SPACES)}")
+        raise typer.Exit(code=1)
+
+    for current in spaces:
+        export_path = heads_dir / f"{current}-labelled.npz"
+        if export:
+            if current == TEXT_VECTOR:
+                from risk_agent.features import generate_embeddings
+
+                if source == "processed":
+                    from risk_agent.processed import ProcessedStore
+
+                    store = ProcessedStore(processed_dir or PROCESSED_DATA_DIR / "scam_genome")
+                    if not store.has_records():
+                        logger.error(
+                            f"No stored records at {store.records_path}; "
+                            "run `python -m risk_agent.features` first."
+                        )
+                        raise typer.Exit(code=1)
+                    records = store.iter_records()
+                else:
+                    client = settings.get_qdrant_client()
+                    records = (payload or {} for _, payload in _scroll_space(client, collection_name))
+                vectors, labels = text_training_arrays(
+                    records, lambda texts: generate_embeddings(texts, show_progress=False)[0]
+                )
+                model_version = f"{TEXT_EMBEDDING_MODEL}@512"
+            elif source == "processed":
+                logger.warning(f"No stored {current} embeddings under data/processed, skipping")
+                continue
+            else:
+                rows = _scroll_space(settings.get_qdrant_client(), collection_name, current)
+                vectors, labels, model_version = labelled_arrays(rows)
+            save_labelled(export_path, vectors, labels, model_version)
+            logger.info(f"Exported {len(labels)} labelled {current} vectors to {export_path}")
+        elif not export_path.exists():
+            logger.error(f"No export at {export_path}; run without --no-export first.")
+            raise typer.Exit(code=1)
+
+        vectors, labels, model_version = load_labelled(export_path)
+        try:
+            head = train_head(vectors, labels, kind=kind, hidden=hidden, seed=seed, model_version=model_version)
+        except ValueError as e:
+            logger.warning(f"Skipping the {current} head: {e}")
+            continue
+        head.save(heads_dir / f"{current}.npz")
+        logger.success(f"{current} head ({kind}) saved to {heads_dir / f'{current}.npz'}; test: {head.meta['test']}")
+
+
+if __name__ == "__main__":
+    app()
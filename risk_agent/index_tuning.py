@@ -0,0 +1,159 @@
+from pathlib import Path
+import sys
+import time
+from typing import Optional
+
+from loguru import logger
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+import typer
+
+# Ensure project root is in path for imports
+PROJ_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJ_ROOT))
+
+from risk_agent.config import settings
+from risk_agent.metrics import percentile
+from risk_agent.schema import SCAM_GENOME_COLLECTION, apply_tuning, override_tuning, search_params
+
+app = typer.Typer()
+console = Console()
+
+HISTORY_COLLECTION = "user_history"
+
+
+def tuning_for(collection_name):
+    """
+    Configured tuning for a collection (Scam Genome or user_history).
+    """
+    if collection_name == HISTORY_COLLECTION:
+        return dict(settings.HISTORY_INDEX)
+    return dict(settings.GENOME_INDEX)
+
+
+def estimate_memory(info):
+    """
+    Rough RAM estimate per vector space: raw float32 vectors unless on disk, the quantized
+    copy (always in RAM), and the HNSW graph links.
+    """
+    points = info.points_count or 0
+    params = info.config.params.vectors
+    spaces = params.items() if isinstance(params, dict) else [("", params)]
+    quant = info.config.quantization_config
+    m = info.config.hnsw_config.m
+    rows = []
+    for name, vector_params in spaces:
+        dim = vector_params.size
+        quant_cfg = vector_params.quantization_config or quant
+        raw_bytes = 0 if vector_params.on_disk else points * dim * 4
+        if quant_cfg is None:
+            quant_bytes = 0
+        elif getattr(quant_cfg, "binary", None) is not None:
+            quant_bytes = points * dim / 8
+        else:
+            quant_bytes = points * dim
+        graph_bytes = points * m * 2 * 4
+        rows.append({
+            "vector": name or "(default)",
+            "dim": dim,
+            "raw_mb": raw_bytes / 2**20,
+            "quantized_mb": quant_bytes / 2**20,
+            "graph_mb": graph_bytes / 2**20,
+        })
+    return rows
+
+
+def benchmark(client, collection_name, tuning, queries=50, limit=5):
+    """
+    p50/p95 latency of random queries against every vector space of the collection.
+    """
+    info = client.get_collection(collection_name)
+    params = info.config.params.vectors
+    spaces = params.items() if isinstance(params, dict) else [(None, params)]
+    rng = np.random.default_rng(0)
+    results = {}
+    for name, vector_params in spaces:
+        timings = []
+        for _ in range(queries):
+            query = rng.standard_normal(vector_params.size).astype(np.float32)
+            started = time.perf_counter()
+            client.query_points(
+                collection_name=collection_name,
+                query=query.tolist(),
+                using=name,
+                limit=limit,
+                search_params=search_params(tuning),
+            )
+            timings.append(time.perf_counter() - started)
+        results[name or "(default)"] = (percentile(timings, 50) * 1000, percentile(timings, 95) * 1000)
+    return results
+
+
+def wait_until_optimized(client, collection_name, timeout=300):
+    started = time.time()
+    while time.time() - started < timeout:
+        status = client.get_collection(collection_name).status
+        if status == "green":
+            return True
+        time.sleep(1)
+    logger.warning(f"{collection_name} is still optimizing after {timeout}s; reporting anyway.")
+    return False
+
+
+def print_report(title, memory_rows, latency):
+    table = Table(title=title)
+    for column in ("Vector", "Dim", "Raw RAM (MB)", "Quantized (MB)", "HNSW (MB)", "p50 (ms)", "p95 (ms)"):
+        table.add_column(column)
+    for row in memory_rows:
+        p50, p95 = latency.get(row["vector"], (float("nan"), float("nan")))
+        table.add_row(
+            row["vector"], str(row["dim"]), f"{row['raw_mb']:.1f}", f"{row['quantized_mb']:.1f}",
+            f"{row['graph_mb']:.1f}", f"{p50:.1f}", f"{p95:.1f}",
+        )
+    console.print(table)
+
+
+@app.command()
+def main(
+    collection_name: str = SCAM_GENOME_COLLECTION,
+    hnsw_m: Optional[int] = None,
+    ef_construct: Optional[int] = None,
+    hnsw_ef: Optional[int] = None,
+    quantization: Optional[str] = typer.Option(None, help="none | scalar | binary"),
+    on_disk: Optional[bool] = None,
+    on_disk_payload: Optional[bool] = None,
+    payload_indexes: Optional[str] = typer.Option(None, help="Comma-separated keyword fields"),
+    queries: int = 50,
+):
+    """
+    Apply HNSW / quantization / on-disk / payload-index settings to an existing collection
+    and report estimated memory and search latency before and after.
+    """
+    client = settings.get_qdrant_client()
+    if not client.collection_exists(collection_name):
+        logger.error(f"Collection {collection_name} not found.")
+        raise typer.Exit(code=1)
+
+    old_tuning = tuning_for(collection_name)
+    new_tuning = override_tuning(
+        old_tuning, hnsw_m, ef_construct, hnsw_ef, quantization, on_disk, on_disk_payload, payload_indexes
+    )
+    logger.info(f"Applying tuning to {collection_name}: {new_tuning}")
+
+    before_info = client.get_collection(collection_name)
+    before_latency = benchmark(client, collection_name, old_tuning, queries)
+
+    apply_tuning(client, collection_name, new_tuning)
+    wait_until_optimized(client, collection_name)
+
+    after_info = client.get_collection(collection_name)
+    after_latency = benchmark(client, collection_name, new_tuning, queries)
+
+    console.print(f"[bold]{collection_name}[/bold]: {after_info.points_count} points (memory figures are estimates)")
+    print_report("Before", estimate_memory(before_info), before_latency)
+    print_report("After", estimate_memory(after_info), after_latency)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,55 @@
+from risk_agent.batching import MicroBatcher
+from risk_agent.config import TEXT_EMBEDDING_MODEL, settings
+from risk_agent.executors import cpu_executor
+from risk_agent.features import generate_embeddings
+from risk_agent.logic import encode_images
+from risk_agent.model_registry import get_model
+from risk_agent.resources import register
+
+# BGE loads on first use (or at API warmup); same registry key as generate_embeddings' default
+text_model = register("bge", lambda: get_model(TEXT_EMBEDDING_MODEL, max_seq_length=512))
+
+
+def _encode_texts(texts):
+    text_model.get()  # loads BGE through the resource, so /ready sees it
+    return generate_embeddings(texts, batch_size=len(texts))[0]
+
+
+# Request-path encoders. Concurrent requests share one forward pass per batch.
+text_batcher = MicroBatcher(
+    "bge_text",
+    _encode_texts,
+    max_batch_size=settings.BATCH_MAX_SIZE,
+    max_wait_ms=settings.BATCH_MAX_WAIT_MS,
+    executor=cpu_executor,
+)
+image_batcher = MicroBatcher(
+    "clip_image",
+    encode_images,
+    max_batch_size=settings.BATCH_MAX_SIZE,
+    max_wait_ms=settings.BATCH_MAX_WAIT_MS,
+    executor=cpu_executor,
+)
+
+
+async def embed_text(text):
+    """
+    BGE vector for one query text.
+    """
+    return await text_batcher.submit(text)
+
+
+async def embed_image(image):
+    """
+    CLIP vector (512 dims) for one PIL image.
+    """
+    return await image_batcher.submit(image)
+
+
+def get_batching_stats():
+    return {batcher.name: batcher.stats() for batcher in (text_batcher, image_batcher)}
+
+
+async def close_batchers():
+    for batcher in (text_batcher, image_batcher):
+        await batcher.close()
@@ -1,115 +1,193 @@
+from concurrent.futures import ThreadPoolExecutor
 import os
-import numpy as np
-from PIL import Image
-from sentence_transformers import SentenceTransformer
-from risk_agent.config import get_client
+from pathlib import Path
+import sys
+import time
+from typing import List, Optional
+
 from qdrant_client.http import models
 from rich.console import Console
-from rich.progress import track
+from rich.progress import Progress
+import typer
+
+# Ensure project root is in path for imports
+PROJ_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJ_ROOT))
 
+from risk_agent.config import DATA_DIR, IMAGE_EMBEDDING_MODEL, INTERIM_DATA_DIR, settings
+from risk_agent.ingestion import (
+    IngestCheckpoint,
+    ParallelUploader,
+    chunked,
+    content_point_id,
+    pending_items,
+)
+from risk_agent.model_registry import get_model
+from risk_agent.phash import PerceptualIndex, phash
+from risk_agent.preprocess import IMAGE_EXTENSIONS, clip_view, decode_image
+from risk_agent.schema import IMAGE_VECTOR, SCAM_GENOME_COLLECTION, has_named_vectors
+
+app = typer.Typer()
 console = Console()
-client = get_client()
-
-# 1. Collection Name Check (Crucial step from your logs)
-# Your logs showed the collection is named 'Scam Genome'
-COLLECTION_NAME = "Scam Genome" 
-TARGET_SIZE = 768
-
-# 2. Load the SMALL Model (Safe for laptop)
-# We use the standard model (512 dims) to avoid RAM crash
-console.print("Loading Standard CLIP Model (Lightweight)...")
-model = SentenceTransformer('clip-ViT-B-32')
-
-# 3. Check Connection
-try:
-    collections = client.get_collections().collections
-    exists = any(c.name == COLLECTION_NAME for c in collections)
-    
-    if not exists:
-        console.print(f" Error: Collection '{COLLECTION_NAME}' not found!", style="red")
-        console.print("Ask your teammate for the exact collection name.")
-        exit(1)
-    else:
-        console.print(f" Found collection: {COLLECTION_NAME}")
-
-except Exception as e:
-    console.print(f" Connection Error: {e}")
-    exit(1)
-
-# 4. Images Process Logic
-IMAGE_DIRS = {
-    "scam": "data/images/scam",
-    "legit": "data/images/legit"
-}
-
-points = []
-# Start IDs at 10,000 to avoid clashing with teammate's text data (0-2000)
-idx = 10000 
-
-for label, folder_path in IMAGE_DIRS.items():
-    if not os.path.exists(folder_path):
-        console.print(f" Folder not found: {folder_path}", style="yellow")
-        continue
-
-    files = [f for f in os.listdir(folder_path) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))]
-    
-    # Sort files to ensure order is consistent
-    files.sort()
-    
-    for file_name in track(files, description=f"Embedding {label} images..."):
-        file_path = os.path.join(folder_path, file_name)
-        
-        try:
-            # A. Load Image
-            image = Image.open(file_path)
-            
-            # B. Generate 512-dim Vector
-            vector_512 = model.encode(image)
-            
-            # C. THE HACK: Pad with Zeros to reach 1024
-            # We add 512 zeros to the end to match teammate's schema
-            padding = np.zeros(TARGET_SIZE - len(vector_512))
-            vector_1024 = np.concatenate([vector_512, padding]).tolist()
-            
-            # D. Create Payload
-            payload = {
-                "category": "image_evidence",
-                "risk_label": label,  # 'scam' or 'legit'
-                "description": f"{label} screenshot: {file_name}",
-                "source": "manual_collection",
-                "filename": file_name,
-                "type": "screenshot"
-            }
-            
-            # E. Add Point
-            points.append(models.PointStruct(
-                id=idx,
-                vector=vector_1024,
-                payload=payload
-            ))
-            idx += 1
-            
-        except Exception as e:
-            console.print(f" Error processing {file_name}: {e}", style="red")
-
-# 5. Upload to Qdrant
-# 5. Upload to Qdrant (Batched)
-if points:
-    BATCH_SIZE = 64
-    total_batches = (len(points) + BATCH_SIZE - 1) // BATCH_SIZE
-    console.print(f" Uploading {len(points)} image vectors to Cloud in {total_batches} batches...")
-    
+
+
+def label_dirs(images_dir, label_dir=None):
+    """
+    {label: folder}. Every subdirectory of images_dir is a label (data/images/scam -> "scam");
+    "label=path" entries from --label-dir add or replace labels.
+    """
+    dirs = {}
+    if images_dir and Path(images_dir).is_dir():
+        dirs = {p.name: p for p in sorted(Path(images_dir).iterdir()) if p.is_dir()}
+    for entry in label_dir or []:
+        label, sep, path = entry.partition("=")
+        if not sep or not label or not path:
+            raise typer.BadParameter(f"Expected LABEL=PATH, got {entry!r}")
+        dirs[label] = Path(path)
+    return dirs
+
+
+def list_images(folder):
+    return sorted(p for p in Path(folder).iterdir() if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS)
+
+
+def _hash_file(path):
+    return content_point_id("image", path.read_bytes()), path
+
+
+def _decode(path):
+    """
+    (CLIP-sized image, perceptual hash) for one file, or None if it cannot be decoded.
+    """
     try:
-        for i in range(0, len(points), BATCH_SIZE):
-            batch = points[i : i + BATCH_SIZE]
-            client.upsert(
-                collection_name=COLLECTION_NAME,
-                points=batch
-            )
-            console.print(f"  Uploaded batch {i // BATCH_SIZE + 1}/{total_batches}", style="dim")
-            
-        console.print(" Image Ingestion Complete! (Memory Safe Mode)", style="green bold")
+        # Same decode and CLIP view as the API, so hashes and vectors match at request time
+        image, _ = decode_image(path.read_bytes())
+        image = clip_view(image)
+        return image, phash(image)
     except Exception as e:
-        console.print(f" Upload Failed: {e}", style="red")
-else:
-    console.print(" No valid images found to upload.", style="red")
+        console.print(f" Error decoding {path.name}: {e}", style="red")
+        return None
+
+
+def _payload(label, path, model_version):
+    return {
+        "category": "image_evidence",
+        "risk_label": label,
+        "description": f"{label} screenshot: {path.name}",
+        "source": "manual_collection",
+        "filename": path.name,
+        "type": "screenshot",
+        "model_version": model_version,
+    }
+
+
+@app.command()
+def main(
+    images_dir: Path = typer.Option(DATA_DIR / "images", help="One subdirectory per label"),
+    label_dir: Optional[List[str]] = typer.Option(None, help="Extra LABEL=PATH folder (repeatable)"),
+    collection_name: str = SCAM_GENOME_COLLECTION,
+    batch_size: int = typer.Option(32, help="Images per CLIP forward pass"),
+    decode_workers: int = typer.Option(os.cpu_count() or 4, help="Threads decoding and resizing images"),
+    upload_workers: int = 2,
+    upload_batch_size: int = 64,
+    phash_index: Path = typer.Option(settings.PHASH_INDEX_PATH, help="Perceptual-hash index for the fast path"),
+):
+    """
+    Embed labelled screenshots with CLIP into the "image" vector space of Scam Genome.
+
+    Point ids are hashed from the image bytes, so re-running only embeds new files, and the
+    same screenshot never gets two points. Each screenshot's perceptual hash is also added
+    to the fast-path index, including ones ingested before the index existed.
+    """
+    client = settings.get_qdrant_client()
+    if not client.collection_exists(collection_name):
+        console.print(f" Error: Collection '{collection_name}' not found!", style="red")
+        console.print("Create it first with `python -m risk_agent.features`.")
+        raise typer.Exit(code=1)
+    if not has_named_vectors(client, collection_name):
+        console.print(f" Error: Collection '{collection_name}' uses the old single-vector schema.", style="red")
+        console.print("Run `python -m risk_agent.migrate` first.")
+        raise typer.Exit(code=1)
+
+    dirs = label_dirs(images_dir, label_dir)
+    if not dirs:
+        console.print(f" No label folders found under {images_dir}", style="yellow")
+        return
+
+    model_version = IMAGE_EMBEDDING_MODEL
+    checkpoint = IngestCheckpoint(INTERIM_DATA_DIR, collection_name, model_version)
+    model = get_model(IMAGE_EMBEDDING_MODEL)
+    hashes = PerceptualIndex(phash_index)
+
+    embedded, encode_seconds = 0, 0.0
+    started = time.perf_counter()
+    uploader = ParallelUploader(
+        client, collection_name, workers=upload_workers, batch_size=upload_batch_size,
+        on_uploaded=checkpoint.add,
+    )
+    with ThreadPoolExecutor(max_workers=max(1, decode_workers), thread_name_prefix="decode") as pool, uploader:
+        for label, folder in dirs.items():
+            if not folder.is_dir():
+                console.print(f" Folder not found: {folder}", style="yellow")
+                continue
+
+            candidates = list(pool.map(_hash_file, list_images(folder)))
+            pending = pending_items(client, collection_name, candidates, model_version, checkpoint)
+            if len(pending) < len(candidates):
+                console.print(f" Skipping {len(candidates) - len(pending)} {label} images already ingested.", style="dim")
+
+            # Already embedded but missing from the hash index: hash only, no CLIP
+            pending_ids = {point_id for point_id, _ in pending}
+            unhashed = [(point_id, path) for point_id, path in candidates if point_id not in pending_ids and point_id not in hashes]
+            for (point_id, path), decoded in zip(unhashed, pool.map(_decode, [path for _, path in unhashed])):
+                if decoded is not None:
+                    hashes.add(point_id, decoded[1], _payload(label, path, model_version))
+            if not pending:
+                continue
+
+            # Decoding of the next batch runs on the pool while CLIP encodes the current one
+            batches = list(chunked(pending, batch_size))
+            upcoming = [pool.submit(_decode, path) for _, path in batches[0]]
+            with Progress(console=console) as progress:
+                task = progress.add_task(f"Embedding {label} images...", total=len(pending))
+                for i, batch in enumerate(batches):
+                    futures = upcoming
+                    upcoming = [pool.submit(_decode, path) for _, path in batches[i + 1]] if i + 1 < len(batches) else []
+                    decoded = [future.result() for future in futures]
+                    rows = [
+                        (point_id, path, result[0], result[1])
+                        for (point_id, path), result in zip(batch, decoded) if result is not None
+                    ]
+                    if rows:
+                        encode_started = time.perf_counter()
+                        vectors = model.encode([image for _, _, image, _ in rows], batch_size=batch_size)
+                        encode_seconds += time.perf_counter() - encode_started
+                        uploader.put([
+                            models.PointStruct(
+                                id=point_id,
+                                vector={IMAGE_VECTOR: vector.tolist()},
+                                payload=_payload(label, path, model_version),
+                            )
+                            for (point_id, path, _, _), vector in zip(rows, vectors)
+                        ])
+                        for point_id, path, _, value in rows:
+                            hashes.add(point_id, value, _payload(label, path, model_version))
+                        embedded += len(rows)
+                    progress.advance(task, len(batch))
+
+    hashes.save()
+    console.print(f" Perceptual-hash index: {len(hashes)} screenshots in {phash_index}", style="dim")
+
+    elapsed = time.perf_counter() - started
+    if embedded:
+        console.print(
+            f" Embedded {embedded} images in {elapsed:.1f}s "
+            f"({embedded / elapsed:.1f} images/s, {encode_seconds:.1f}s in CLIP).",
+            style="green bold",
+        )
+    else:
+        console.print(" No new images to upload.", style="yellow")
+
+
+if __name__ == "__main__":
+    app()
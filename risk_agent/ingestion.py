@@ -0,0 +1,274 @@
+import hashlib
+from itertools import islice
+import json
+from pathlib import Path
+import queue
+import re
+import threading
+import uuid
+
+import numpy as np
+
+# Fixed namespace: the same content always maps to the same point id, on every machine
+POINT_ID_NAMESPACE = uuid.UUID("5b7c3f0e-8d7a-4a43-9a53-2f4f6c1d9e21")
+
+RETRIEVE_BATCH_SIZE = 256
+
+
+def content_point_id(kind, content):
+    """
+    Deterministic point id (UUID5) for a piece of content: re-ingesting the same dialogue
+    or image overwrites its own point instead of taking a fresh id.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{kind}:{hashlib.sha256(content).hexdigest()}"))
+
+
+def existing_versions(client, collection_name, ids, batch_size=RETRIEVE_BATCH_SIZE):
+    """
+    Bulk lookup of which ids are already in the collection, with the model_version
+    they were embedded with (None for points ingested before versions were recorded).
+    """
+    versions = {}
+    ids = list(ids)
+    for start in range(0, len(ids), batch_size):
+        records = client.retrieve(
+            collection_name=collection_name,
+            ids=ids[start:start + batch_size],
+            with_payload=["model_version"],
+            with_vectors=False,
+        )
+        for record in records:
+            versions[str(record.id)] = (record.payload or {}).get("model_version")
+    return versions
+
+
+def _slug(name):
+    # Runs of other characters collapse to one "_", so a slug never contains "__"
+    return re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_")
+
+
+class IngestCheckpoint:
+    """
+    Append-only record of point ids already upserted for one (collection, model version),
+    so an interrupted ingestion resumes where it stopped.
+    """
+
+    def __init__(self, directory, collection_name, model_version):
+        self.path = Path(directory) / f"{_slug(collection_name)}__{_slug(model_version)}.checkpoint.jsonl"
+        self.done = set()
+        # Upload workers record finished batches from several threads
+        self._lock = threading.Lock()
+        if self.path.exists():
+            for line in self.path.read_text().splitlines():
+                if line.strip():
+                    self.done.update(json.loads(line))
+
+    def __contains__(self, point_id):
+        return str(point_id) in self.done
+
+    def add(self, ids):
+        ids = [str(i) for i in ids]
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a") as f:
+                f.write(json.dumps(ids) + "\n")
+            self.done.update(ids)
+
+    def reset(self):
+        self.done = set()
+        if self.path.exists():
+            self.path.unlink()
+
+
+def reset_checkpoints(directory, collection_name):
+    """
+    Drops the checkpoints of every model version (text and image) of a collection. Call it
+    whenever the collection is created or recreated: ids recorded for the old one are not in it.
+    """
+    for path in Path(directory).glob(f"{_slug(collection_name)}__*.checkpoint.jsonl"):
+        path.unlink()
+
+
+def pending_items(client, collection_name, items, model_version, checkpoint=None):
+    """
+    Keeps only the (point_id, item) pairs that still need embedding: ids not in the
+    checkpoint and not already stored with the same model_version.
+    """
+    items = [(point_id, item) for point_id, item in items if checkpoint is None or point_id not in checkpoint]
+    versions = existing_versions(client, collection_name, [point_id for point_id, _ in items])
+    return [(point_id, item) for point_id, item in items if versions.get(point_id) != model_version]
+
+
+def chunked(iterable, size):
+    """
+    Yields lists of up to size items from any iterable, without materializing it.
+    """
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class ParallelUploader:
+    """
+    Upserts points from a bounded queue on several worker threads, so the producer
+    (embedding) keeps going while earlier batches are in flight. put() blocks when the
+    queue is full, which bounds memory. on_uploaded(ids) runs after each batch lands.
+
+    Use as a context manager: leaving it waits for all uploads and re-raises the first
+    upload error.
+    """
+
+    def __init__(self, client, collection_name, workers=4, batch_size=64, queue_size=None, on_uploaded=None):
+        self.client = client
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.on_uploaded = on_uploaded
+        self.uploaded = 0
+        self._queue = queue.Queue(maxsize=queue_size or workers * 2)
+        self._error = None
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"upsert-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _work(self):
+        while True:
+            batch = self._queue.get()
+            try:
+                if batch is None:
+                    return
+                if self._error is None:
+                    self.client.upsert(collection_name=self.collection_name, points=batch)
+                    if self.on_uploaded:
+                        self.on_uploaded([point.id for point in batch])
+                    with self._lock:
+                        self.uploaded += len(batch)
+            except Exception as e:
+                # Remaining batches are drained without uploading; close() re-raises
+                self._error = self._error or e
+            finally:
+                self._queue.task_done()
+
+    def put(self, points):
+        if self._error is not None:
+            raise self._error
+        for start in range(0, len(points), self.batch_size):
+            self._queue.put(points[start:start + self.batch_size])
+
+    def close(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def shard_of(point_id, shards):
+    """
+    Shard (0..shards-1) a point id belongs to. Derived from the id itself, so every machine
+    splitting the same corpus agrees on the partition without coordinating.
+    """
+    return uuid.UUID(str(point_id)).int % shards
+
+
+class PartWriter:
+    """
+    Writes embedded points as numbered parts in one directory: part-NNNNN.npy (float32
+    vectors) next to part-NNNNN.jsonl (one {"id", "payload"} per row). Parts are written
+    whole, so ids already in the directory are skipped when an interrupted run is repeated.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        # point id -> (part .npy path, row), built from the .jsonl sidecars only
+        self._rows = {}
+        self._parts = 0
+        for vectors_path, rows in _iter_part_rows(self.path):
+            self._parts += 1
+            for row, entry in enumerate(rows):
+                self._rows[entry["id"]] = (vectors_path, row)
+
+    @property
+    def done(self):
+        return self._rows.keys()
+
+    def __contains__(self, point_id):
+        return str(point_id) in self._rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def write(self, ids, payloads, vectors):
+        stem = self.path / f"part-{self._parts:05d}"
+        # The .npy lands last: a part without one is incomplete and ignored on read
+        with open(f"{stem}.jsonl", "w") as f:
+            for point_id, payload in zip(ids, payloads):
+                f.write(json.dumps({"id": str(point_id), "payload": payload}) + "\n")
+        np.save(f"{stem}.tmp.npy", np.asarray(vectors, dtype=np.float32))
+        Path(f"{stem}.tmp.npy").replace(f"{stem}.npy")
+        for row, point_id in enumerate(ids):
+            self._rows[str(point_id)] = (Path(f"{stem}.npy"), row)
+        self._parts += 1
+
+    def vectors(self, ids):
+        """
+        {point_id: vector} for the requested ids that are stored here.
+        """
+        by_part = {}
+        for point_id in map(str, ids):
+            if point_id in self._rows:
+                vectors_path, row = self._rows[point_id]
+                by_part.setdefault(vectors_path, []).append((point_id, row))
+        found = {}
+        for vectors_path, rows in by_part.items():
+            vectors = np.load(vectors_path, mmap_mode="r")
+            for point_id, row in rows:
+                found[point_id] = np.array(vectors[row])
+        return found
+
+
+class ShardWriter(PartWriter):
+    """
+    PartWriter for one shard of a job split across machines (see shard_of).
+    """
+
+    def __init__(self, directory, shard_index, shards):
+        super().__init__(Path(directory) / f"shard-{shard_index:03d}-of-{shards:03d}")
+
+
+def _iter_part_rows(directory):
+    for vectors_path in sorted(Path(directory).rglob("part-*.npy")):
+        if vectors_path.name.endswith(".tmp.npy"):
+            continue
+        rows = [json.loads(line) for line in vectors_path.with_suffix(".jsonl").read_text().splitlines() if line]
+        yield vectors_path, rows
+
+
+def iter_shard_parts(directory):
+    """
+    Yields (ids, payloads, vectors) for every complete part under directory, which may be
+    a single shard or a parent holding the shards of several machines.
+    """
+    for vectors_path, rows in _iter_part_rows(directory):
+        vectors = np.load(vectors_path, mmap_mode="r")
+        yield [row["id"] for row in rows], [row["payload"] for row in rows], vectors
+
+
+def iter_shard_rows(directory, with_vectors=True):
+    for ids, payloads, vectors in iter_shard_parts(directory):
+        for i, (point_id, payload) in enumerate(zip(ids, payloads)):
+            yield point_id, payload, (vectors[i] if with_vectors else None)
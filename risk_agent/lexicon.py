@@ -0,0 +1,321 @@
+from collections import Counter, deque
+import json
+import math
+import os
+from pathlib import Path
+import re
+import sys
+import threading
+
+from loguru import logger
+import typer
+
+# Ensure project root is in path for imports
+PROJ_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJ_ROOT))
+
+app = typer.Typer()
+
+LEXICON_VERSION = 1
+
+# Script markers that on their own say little but together are unmistakable.
+# phrase -> (weight, category); matched case-insensitively on whole words.
+CURATED_LEXICON = {
+    # Pig butchering / investment
+    "usdt": (1.5, "crypto_investment"),
+    "trc20": (2.0, "crypto_investment"),
+    "mining pool": (2.0, "crypto_investment"),
+    "liquidity mining": (3.0, "crypto_investment"),
+    "guaranteed returns": (3.0, "crypto_investment"),
+    "guaranteed profit": (3.0, "crypto_investment"),
+    "trading platform": (1.0, "crypto_investment"),
+    "my uncle": (1.0, "crypto_investment"),
+    "insider information": (2.5, "crypto_investment"),
+    "withdrawal fee": (3.0, "crypto_investment"),
+    "unlock your withdrawal": (3.5, "crypto_investment"),
+    "account is frozen": (2.0, "crypto_investment"),
+    "personal income tax": (2.0, "crypto_investment"),
+    "deposit more": (2.0, "crypto_investment"),
+    # Tech support
+    "remote access": (2.5, "tech_support"),
+    "anydesk": (3.0, "tech_support"),
+    "teamviewer": (2.5, "tech_support"),
+    "your computer is infected": (3.5, "tech_support"),
+    "microsoft support": (2.0, "tech_support"),
+    "refund department": (2.5, "tech_support"),
+    # Bank / government impersonation
+    "safe account": (3.5, "impersonation"),
+    "secure account": (2.0, "impersonation"),
+    "transfer your savings": (3.0, "impersonation"),
+    "arrest warrant": (3.0, "impersonation"),
+    "social security number is suspended": (4.0, "impersonation"),
+    "do not tell the bank": (3.5, "impersonation"),
+    "do not hang up": (1.5, "impersonation"),
+    "one time password": (1.5, "impersonation"),
+    "otp": (1.0, "impersonation"),
+    # Payment channels scammers insist on
+    "gift card": (2.0, "payment_channel"),
+    "gift cards": (2.0, "payment_channel"),
+    "google play card": (3.0, "payment_channel"),
+    "bitcoin atm": (3.0, "payment_channel"),
+    "wire the money": (2.0, "payment_channel"),
+    # Advance fee / prizes
+    "processing fee": (2.0, "advance_fee"),
+    "you have won": (2.5, "advance_fee"),
+    "claim your prize": (3.0, "advance_fee"),
+    "customs clearance fee": (3.0, "advance_fee"),
+}
+
+CATEGORY_ADVICE = {
+    "crypto_investment": "Do not deposit more money to 'unlock' a withdrawal; legitimate platforms never charge fees up front to release funds.",
+    "tech_support": "Do not install remote-access software (AnyDesk, TeamViewer) at a caller's request; disconnect and contact the company yourself.",
+    "impersonation": "Banks and authorities never ask you to move money to a 'safe account' or to keep a call secret; call your bank on its official number.",
+    "payment_channel": "Nobody legitimate asks to be paid in gift cards, crypto ATMs or wire transfers to settle a debt.",
+    "advance_fee": "Genuine prizes and deliveries never require a fee before release.",
+}
+
+# Mined phrases score lower than curated ones: they are frequent in scam dialogues, not proof
+MINED_MAX_WEIGHT = 1.5
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from have i if in is it me my of on or our so that the "
+    "this to we will with you your yes no ok okay sir madam hello hi um uh just".split()
+)
+
+
+def normalize(text):
+    """
+    Lowercase words separated by single spaces, padded with one space on each side so that
+    every pattern (normalized the same way) only matches whole words.
+    """
+    return " " + " ".join(re.findall(r"[a-z0-9]+", text.lower())) + " "
+
+
+class AhoCorasick:
+    """
+    Multi-pattern automaton: one pass over the text reports every occurrence of every
+    pattern, in time linear in the text length plus the number of matches.
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+    def add(self, pattern, value):
+        node = 0
+        for char in pattern:
+            child = self._goto[node].get(char)
+            if child is None:
+                child = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[node][char] = child
+            node = child
+        self._out[node].append((len(pattern), value))
+
+    def build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+        return self
+
+    def iter_matches(self, text):
+        """
+        (start, value) for every pattern occurrence in text.
+        """
+        node = 0
+        for end, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length, value in self._out[node]:
+                yield end - length + 1, value
+
+
+class LexiconMatcher:
+    """
+    Weighted red-flag phrases compiled into one automaton. scan() scores a text by the
+    summed weight of the distinct phrases it contains; repeating a phrase adds nothing.
+    """
+
+    def __init__(self, phrases):
+        self.phrases = {}
+        automaton = AhoCorasick()
+        for phrase, (weight, category) in phrases.items():
+            key = normalize(phrase).strip()
+            if not key or key in self.phrases:
+                continue
+            self.phrases[key] = (weight, category)
+            automaton.add(f" {key} ", key)
+        self._automaton = automaton.build()
+        self._lock = threading.Lock()
+        self.scans = 0
+        self.hits = 0
+
+    def __len__(self):
+        return len(self.phrases)
+
+    def scan(self, text):
+        """
+        {"score", "hits": [{"phrase", "weight", "category", "count"}]}, heaviest hits first.
+        """
+        counts = Counter(key for _, key in self._automaton.iter_matches(normalize(text)))
+        hits = [
+            {"phrase": key, "weight": self.phrases[key][0], "category": self.phrases[key][1], "count": count}
+            for key, count in counts.items()
+        ]
+        hits.sort(key=lambda hit: (-hit["weight"], hit["phrase"]))
+        return {"score": round(sum(hit["weight"] for hit in hits), 2), "hits": hits}
+
+    def match(self, text, threshold):
+        """
+        The scan when its score reaches threshold, else None. Counts toward stats().
+        """
+        result = self.scan(text)
+        fired = threshold > 0 and result["score"] >= threshold
+        with self._lock:
+            self.scans += 1
+            if fired:
+                self.hits += 1
+        return result if fired else None
+
+    def stats(self):
+        return {
+            "phrases": len(self.phrases),
+            "scans": self.scans,
+            "fast_path_hits": self.hits,
+            "fast_path_rate": round(self.hits / self.scans, 4) if self.scans else None,
+        }
+
+
+def lexicon_verdict(result, threshold):
+    """
+    High-risk verdict (same shape as the LLM's) citing the matched phrases.
+    """
+    cited = [hit["phrase"] for hit in result["hits"]]
+    categories = list(dict.fromkeys(hit["category"] for hit in result["hits"]))
+    advice = [CATEGORY_ADVICE[category] for category in categories if category in CATEGORY_ADVICE]
+    return {
+        "probability": round(min(0.99, 0.9 + 0.01 * (result["score"] - threshold)), 2),
+        "risk_level": "High",
+        "analysis": (
+            "The evidence contains known scam-script phrases: "
+            + ", ".join(f'"{phrase}"' for phrase in cited)
+            + f" (red-flag score {result['score']:g}, threshold {threshold:g})."
+        ),
+        "recommendations": advice,
+        "sources": [f"lexicon: {phrase}" for phrase in cited],
+    }
+
+
+def mine_phrases(records, min_scam_docs=5, min_log_odds=2.0, max_phrases=300, ngram_sizes=(2, 3)):
+    """
+    Word n-grams far more common in scam dialogues than in legit ones, from records with
+    "original_text" and "risk_label". Returns [{"phrase", "weight", "scam_docs", "legit_docs"}],
+    strongest first. Uses the raw dialogue, not the embedded text, whose "Type:" header
+    would give the label away.
+    """
+    scam_df, legit_df = Counter(), Counter()
+    scam_docs = legit_docs = 0
+    for record in records:
+        label = record.get("risk_label")
+        if label not in ("scam", "legit"):
+            continue
+        words = normalize(record.get("original_text") or "").split()
+        grams = {
+            " ".join(words[i:i + n])
+            for n in ngram_sizes
+            for i in range(len(words) - n + 1)
+            if not all(word in STOPWORDS for word in words[i:i + n])
+        }
+        if label == "scam":
+            scam_docs += 1
+            scam_df.update(grams)
+        else:
+            legit_docs += 1
+            legit_df.update(grams)
+
+    mined = []
+    for phrase, count in scam_df.items():
+        if count < min_scam_docs:
+            continue
+        # Smoothed log ratio of document frequencies
+        log_odds = math.log((count + 1) / (scam_docs + 2)) - math.log((legit_df[phrase] + 1) / (legit_docs + 2))
+        if log_odds < min_log_odds:
+            continue
+        weight = round(min(MINED_MAX_WEIGHT, log_odds / 4), 2)
+        mined.append({"phrase": phrase, "weight": weight, "scam_docs": count, "legit_docs": legit_df[phrase]})
+    mined.sort(key=lambda entry: (-entry["weight"], -entry["scam_docs"], entry["phrase"]))
+    return mined[:max_phrases]
+
+
+def load_phrases(path=None):
+    """
+    The curated lexicon plus the mined phrases saved at path (curated weights win).
+    """
+    # LexiconMatcher keeps the first entry of each phrase, so curated ones go first
+    phrases = dict(CURATED_LEXICON)
+    if path is not None and Path(path).exists():
+        data = json.loads(Path(path).read_text())
+        for entry in data.get("mined", []):
+            phrases.setdefault(entry["phrase"], (entry["weight"], "mined"))
+    return phrases
+
+
+_matchers = {}
+_matchers_lock = threading.Lock()
+
+
+def get_lexicon_matcher(path):
+    """
+    One shared matcher per lexicon file, rebuilt when the file on disk changes.
+    """
+    key = str(path)
+    mtime = os.stat(path).st_mtime if Path(path).exists() else None
+    with _matchers_lock:
+        cached = _matchers.get(key)
+        if cached is None or cached[0] != mtime:
+            cached = _matchers[key] = (mtime, LexiconMatcher(load_phrases(path)))
+    return cached[1]
+
+
+@app.command()
+def main(
+    processed_dir: Path = None,
+    output: Path = None,
+    min_scam_docs: int = 5,
+    min_log_odds: float = 2.0,
+    max_phrases: int = 300,
+):
+    """
+    Mine red-flag phrases from the scam side of the stored Scam Genome corpus (written by
+    `python -m risk_agent.features`) and save them next to it for the lexicon fast path.
+    """
+    from risk_agent.config import PROCESSED_DATA_DIR, settings
+    from risk_agent.processed import ProcessedStore
+
+    store = ProcessedStore(processed_dir or PROCESSED_DATA_DIR / "scam_genome")
+    if not store.has_records():
+        logger.error(f"No stored records at {store.records_path}; run `python -m risk_agent.features` first.")
+        raise typer.Exit(code=1)
+
+    mined = mine_phrases(store.iter_records(), min_scam_docs, min_log_odds, max_phrases)
+    output = output or settings.LEXICON_PATH
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps({"version": LEXICON_VERSION, "mined": mined}, indent=1))
+    tmp_path.replace(output)
+    logger.success(f"Saved {len(mined)} mined phrases to {output} (plus {len(CURATED_LEXICON)} curated).")
+
+
+if __name__ == "__main__":
+    app()
@@ -1,95 +1,197 @@
-import google.generativeai as genai
-from risk_agent.config import settings
-import PIL.Image
-import io
+import asyncio
+from collections import Counter
 import json
+import random
+import threading
+import time
+
+from groq import AsyncGroq, Groq
+import httpx
 from loguru import logger
-from groq import Groq
-import easyocr
-
-# Initialize the reader once to avoid reloading the model on every request
-# gpu=False can be set if no GPU is available, but let's let it auto-detect or default.
-# For a generic environment, we might want to wrap this in a try-except or lazy load if it's heavy,
-# but the requirement says "Initialize the OCR reader globally".
-try:
-    reader = easyocr.Reader(['en'])
-except Exception as e:
-    logger.error(f"Failed to initialize EasyOCR: {e}")
-    reader = None
+import numpy as np
 
-def configure_genai():
-    if not settings.GOOGLE_API_KEY:
-        # We might not need this for OCR anymore, but keep it for other functions if they use it
-        # raise ValueError("GOOGLE_API_KEY is not set...") 
-        # The original code raised an error. Let's keep it but it won't be called by extract_text_from_image anymore.
-        pass
-    if settings.GOOGLE_API_KEY:
-        genai.configure(api_key=settings.GOOGLE_API_KEY)
+from risk_agent.audio import (
+    AudioDecodeError,
+    ChunkedTranscriber,
+    PartialTranscriptError,
+    stub_transcribe,
+)
+from risk_agent.config import settings
+from risk_agent.executors import run_cpu
+from risk_agent.metrics import LatencyWindow
+from risk_agent.ocr import OcrEngine
+from risk_agent.preprocess import decode_image
+from risk_agent.resources import register
 
-def extract_text_from_image(image_bytes: bytes) -> str:
+# Model identifiers recorded next to cached artifacts, so a model change invalidates them
+OCR_MODEL_VERSION = "easyocr-en"
+TRANSCRIPTION_MODEL = "whisper-large-v3"
+GEMINI_MODEL = "gemini-2.0-flash"
+GROQ_MODEL = "llama-3.3-70b-versatile"
+
+PROVIDERS = ("gemini", "groq")
+
+SAFE_DEFAULT_RECOMMENDATIONS = [
+    "Ensure you are using official apps/websites only.",
+    "Never share your private keys or OTP with anyone.",
+    "If you suspect a scam, stop all communication immediately.",
+]
+
+# Readers are created on first OCR call (or at API warmup), up to OCR_POOL_SIZE of them
+ocr_engine = OcrEngine(
+    pool_size=settings.OCR_POOL_SIZE,
+    mode=settings.OCR_MODE,
+    min_edge_density=settings.OCR_MIN_EDGE_DENSITY,
+    tile_aspect=settings.OCR_TILE_ASPECT,
+    tile_overlap=settings.OCR_TILE_OVERLAP,
+    batch_size=settings.OCR_BATCH_SIZE,
+)
+reader = register("easyocr", ocr_engine.warm)
+
+def read_image_text(image) -> str:
     """
-    Uses local EasyOCR to extract text from images.
+    Text in an image via local EasyOCR ("" when there is none). Raises when the reader
+    cannot be loaded or OCR fails, so callers can tell a failure from an image without text.
+    Accepts raw image bytes or an already decoded uint8 array (see preprocess.ocr_view).
+    """
+    reader.get()
+    if isinstance(image, (bytes, bytearray)):
+        image = np.asarray(decode_image(image)[0])
+    return ocr_engine.read(image)
+
+def extract_text_from_image(image) -> str:
+    """
+    Uses local EasyOCR to extract text from images; "" when there is none or OCR failed.
     """
-    if reader is None:
-        logger.error("EasyOCR reader not initialized.")
-        return ""
-        
     try:
-        # EasyOCR supports bytes directly!
-        result = reader.readtext(image_bytes, detail=0)
-        return " ".join(result)
+        return read_image_text(image)
     except Exception as e:
         logger.error(f"Error in OCR: {e}")
         return ""
 
-def transcribe_audio(audio_bytes: bytes, mime_type: str = "audio/mp3") -> str:
+def get_ocr_stats() -> dict:
+    return ocr_engine.stats()
+
+# --- PROVIDER LAYER ---
+# Long-lived clients with pooled HTTP connections, created on first use.
+_clients = {}
+_clients_lock = threading.Lock()
+_genai_configured = False
+
+class ProviderStats:
     """
-    Uses Groq (Whisper) to transcribe audio files.
+    Latency and error counters for one LLM provider.
     """
-    try:
-        if not settings.GROQ_API_KEY:
-             raise ValueError("GROQ_API_KEY not set")
-        
-        client = Groq(api_key=settings.GROQ_API_KEY)
-        
-        # Determine extension from mime_type
-        ext = "mp3"
-        if "wav" in mime_type: ext = "wav"
-        elif "mp4" in mime_type: ext = "mp4"
-        elif "ogg" in mime_type: ext = "ogg"
-
-        # Prepare file-like object
-        audio_file = io.BytesIO(audio_bytes)
-        audio_file.name = f"audio.{ext}" # Groq needs a filename to detect format
-        
-        transcription = client.audio.transcriptions.create(
-            file=(audio_file.name, audio_file.read()),
-            model="whisper-large-v3",
-            response_format="json",
-            temperature=0.0
-        )
-        
-        return transcription.text
-    except Exception as e:
-        logger.error(f"Error in Audio Transcription (Groq): {e}")
-        return f"[Error in Transcription: {e}]"
+    def __init__(self):
+        self.latency = LatencyWindow()
+        self.counters = Counter()
 
-def analyze_risk_with_gemini(user_content: str, similar_cases: list) -> dict:
+    def snapshot(self):
+        calls = self.counters["calls"]
+        return {
+            **self.latency.snapshot(),
+            "calls": calls,
+            "errors": self.counters["errors"],
+            "error_rate": round(self.counters["errors"] / calls, 3) if calls else None,
+            "retries": self.counters["retries"],
+            "hedged": self.counters["hedged"],
+            "hedge_wins": self.counters["hedge_wins"],
+            "gave_up": self.counters["gave_up"],
+        }
+
+provider_stats = {name: ProviderStats() for name in PROVIDERS + ("groq_whisper",)}
+
+def _http_limits():
+    return httpx.Limits(
+        max_connections=settings.LLM_POOL_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_POOL_CONNECTIONS,
+    )
+
+def _get_client(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory()
+                _clients[name] = client
+    return client
+
+def get_groq_client() -> Groq:
+    if not settings.GROQ_API_KEY:
+        raise ValueError("GROQ_API_KEY not set")
+    # Retries are handled here (with jitter and failover), not by the SDK
+    return _get_client("groq", lambda: Groq(
+        api_key=settings.GROQ_API_KEY,
+        max_retries=0,
+        timeout=settings.LLM_TIMEOUT_SECONDS,
+        http_client=httpx.Client(limits=_http_limits(), timeout=settings.LLM_TIMEOUT_SECONDS),
+    ))
+
+def get_async_groq_client() -> AsyncGroq:
+    if not settings.GROQ_API_KEY:
+        raise ValueError("GROQ_API_KEY not set")
+    return _get_client("groq_async", lambda: AsyncGroq(
+        api_key=settings.GROQ_API_KEY,
+        max_retries=0,
+        timeout=settings.LLM_TIMEOUT_SECONDS,
+        http_client=httpx.AsyncClient(limits=_http_limits(), timeout=settings.LLM_TIMEOUT_SECONDS),
+    ))
+
+def configure_genai():
+    global _genai_configured
+    if not settings.GOOGLE_API_KEY:
+        raise ValueError("GOOGLE_API_KEY not set")
+    if not _genai_configured:
+        import google.generativeai as genai  # slow import, deferred to the first Gemini call
+
+        genai.configure(api_key=settings.GOOGLE_API_KEY)
+        _genai_configured = True
+
+def get_gemini_model():
+    configure_genai()
+    import google.generativeai as genai
+
+    return _get_client("gemini", lambda: genai.GenerativeModel(GEMINI_MODEL))
+
+def _provider_available(provider: str) -> bool:
+    if provider == "groq":
+        return bool(settings.GROQ_API_KEY)
+    return bool(settings.GOOGLE_API_KEY)
+
+def _backoff_seconds(attempt: int) -> float:
+    # Exponential backoff with full jitter, so parallel requests do not retry in lockstep
+    return random.uniform(0, settings.LLM_BACKOFF_SECONDS * (2 ** attempt))
+
+def _hedge_delay(provider: str):
     """
-    Sends the aggregated evidence (Visual + Text + Audio) to Gemini for a final verdict.
+    Seconds to wait before firing a duplicate request, or None when hedging is off
+    or there are not yet enough latency samples to pick a percentile.
     """
-    try:
-        configure_genai()
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        
-        # Format similar cases from Qdrant for the LLM context
-        similar_cases_str = "\n\n".join([
-            f"Case (Risk: {c['risk_label']}, Score: {c['score']:.2f}):\n{c['text_snippet']}" 
-            for c in similar_cases
-        ])
-        
-        # --- PROMPT ENGINEERING ---
-        prompt = f"""
+    if not settings.LLM_HEDGE_PERCENTILE:
+        return None
+    window = provider_stats[provider].latency
+    if len(window) < 20:
+        return None
+    return window.percentile(settings.LLM_HEDGE_PERCENTILE)
+
+def _parse_verdict(text: str) -> dict:
+    # Cleaning the response to ensure valid JSON
+    cleaned = text.replace("```json", "").replace("```", "").strip()
+    return json.loads(cleaned)
+
+def build_risk_prompt(user_content: str, similar_cases: list) -> str:
+    """
+    Prompt shared by every provider: the aggregated evidence plus the similar Scam Genome cases.
+    """
+    # Format similar cases from Qdrant for the LLM context
+    similar_cases_str = "\n\n".join([
+        f"Case (Risk: {c['risk_label']}, Score: {c['score']:.2f}):\n{c['text_snippet']}" 
+        for c in similar_cases
+    ])
+    
+    # --- PROMPT ENGINEERING ---
+    return f"""
         You are a generic but highly specialized Risk Analysis Agent for financial scams.
         You have access to MULTIMODAL evidence:
         1. VISUAL EVIDENCE: Descriptions of screenshots (e.g., "Fake Crypto Dashboard detected").
@@ -120,103 +222,329 @@ def analyze_risk_with_gemini(user_content: str, similar_cases: list) -> dict:
             "sources": ["<refer to specific similar cases if relevant>"]
         }}
         """
-        
-        response = model.generate_content(prompt)
-        
-        # Cleaning the response to ensure valid JSON
-        text = response.text.replace("```json", "").replace("```", "").strip()
-        
-        return json.loads(text)
 
-    except Exception as e:
-        logger.error(f"Error in Gemini Analysis: {e}")
-        # Fallback response if LLM fails
-        return {
-            "probability": 0.0,
-            "risk_level": "Unknown",
-            "analysis": f"AI reasoning failed: {e}. Rely on raw visual/text matches.",
-            "recommendations": ["Ensure you are using official apps/websites only.", "Never share your private keys or OTP with anyone.", "If you suspect a scam, stop all communication immediately."],
-            "sources": []
-        }
+def _groq_messages(prompt: str) -> list:
+    return [
+        {"role": "system", "content": "You are a helpful assistant that outputs JSON only."},
+        {"role": "user", "content": prompt}
+    ]
 
-def analyze_risk_with_groq(user_content: str, similar_cases: list) -> dict:
+def _call_gemini(prompt: str) -> dict:
+    response = get_gemini_model().generate_content(
+        prompt, request_options={"timeout": settings.LLM_TIMEOUT_SECONDS}
+    )
+    return _parse_verdict(response.text)
+
+async def _call_gemini_async(prompt: str) -> dict:
+    response = await get_gemini_model().generate_content_async(
+        prompt, request_options={"timeout": settings.LLM_TIMEOUT_SECONDS}
+    )
+    return _parse_verdict(response.text)
+
+def _call_groq(prompt: str) -> dict:
+    completion = get_groq_client().chat.completions.create(
+        model=GROQ_MODEL,
+        messages=_groq_messages(prompt),
+        temperature=0.1,
+        response_format={"type": "json_object"}
+    )
+    return json.loads(completion.choices[0].message.content)
+
+async def _call_groq_async(prompt: str) -> dict:
+    completion = await get_async_groq_client().chat.completions.create(
+        model=GROQ_MODEL,
+        messages=_groq_messages(prompt),
+        temperature=0.1,
+        response_format={"type": "json_object"}
+    )
+    return json.loads(completion.choices[0].message.content)
+
+_SYNC_CALLS = {"gemini": _call_gemini, "groq": _call_groq}
+_ASYNC_CALLS = {"gemini": _call_gemini_async, "groq": _call_groq_async}
+
+def _call_with_retries(provider: str, fn, *args):
     """
-    Sends the aggregated evidence to Groq (Llama 3) for a final verdict.
+    Calls fn with bounded, jittered retries, recording latency and errors for the provider.
+    Raises the last error once retries are exhausted.
     """
+    stats = provider_stats[provider]
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        stats.counters["calls"] += 1
+        started = time.perf_counter()
+        try:
+            result = fn(*args)
+            stats.latency.record(time.perf_counter() - started)
+            return result
+        except Exception as e:
+            stats.counters["errors"] += 1
+            if attempt == settings.LLM_MAX_RETRIES:
+                raise
+            stats.counters["retries"] += 1
+            logger.warning(f"{provider} call failed (attempt {attempt + 1}): {e}. Retrying...")
+            time.sleep(_backoff_seconds(attempt))
+
+async def _timed_async(provider: str, coro_fn, *args):
+    stats = provider_stats[provider]
+    stats.counters["calls"] += 1
+    started = time.perf_counter()
     try:
-        if not settings.GROQ_API_KEY:
-             raise ValueError("GROQ_API_KEY not set")
-        
-        client = Groq(api_key=settings.GROQ_API_KEY)
-        
-        # Format similar cases
-        similar_cases_str = "\n\n".join([
-            f"Case (Risk: {c['risk_label']}, Score: {c['score']:.2f}):\n{c['text_snippet']}" 
-            for c in similar_cases
-        ])
-        
-        prompt = f"""
-        You are a generic but highly specialized Risk Analysis Agent for financial scams.
-        You have access to MULTIMODAL evidence:
-        1. VISUAL EVIDENCE: Descriptions of screenshots (e.g., "Fake Crypto Dashboard detected").
-        2. TEXTUAL EVIDENCE: Chat logs or text extracted from images.
-        3. AUDIO EVIDENCE: Transcripts of voice messages or calls.
+        result = await coro_fn(*args)
+    except Exception:
+        stats.counters["errors"] += 1
+        raise
+    stats.latency.record(time.perf_counter() - started)
+    return result
 
-        --------------------------------------------------
-        USER SUBMISSION (EVIDENCE):
-        {user_content}
-        --------------------------------------------------
+async def _hedged_async(provider: str, coro_fn, *args):
+    """
+    Runs one request; if it is still pending after the provider's hedge percentile,
+    fires a duplicate and returns whichever succeeds first.
+    """
+    delay = _hedge_delay(provider)
+    primary = asyncio.ensure_future(_timed_async(provider, coro_fn, *args))
+    if delay is None:
+        return await primary
 
-        SIMILAR KNOWN SCAM PATTERNS (From Database):
-        {similar_cases_str}
-        --------------------------------------------------
-        
-        TASK:
-        Analyze the evidence for signs of a scam.
-        - If VISUAL EVIDENCE indicates a "High Risk" or "Fake Dashboard", weight this heavily.
-        - If TEXTUAL/AUDIO EVIDENCE matches known "Pig Butchering" or "Tech Support" scripts, flag it.
-        - Provide 3-4 SPECIFIC, ACTIONABLE recommendations for the user to stay safe.
-        
-        OUTPUT JSON FORMAT ONLY:
-        {{
-            "probability": <float 0.0 to 1.0>,
-            "risk_level": "Low" | "Medium" | "High",
-            "analysis": "<detailed explanation citing specific visual, text, or audio red flags>",
-            "recommendations": ["<step 1>", "<step 2>", "<step 3>"],
-            "sources": ["<refer to specific similar cases if relevant>"]
-        }}
-        """
-        
-        completion = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that outputs JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1,
-            response_format={"type": "json_object"}
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done:
+        return primary.result()
+
+    provider_stats[provider].counters["hedged"] += 1
+    hedge = asyncio.ensure_future(_timed_async(provider, coro_fn, *args))
+    pending = {primary, hedge}
+    last_error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        provider_stats[provider].counters["hedge_wins"] += 1
+                    return task.result()
+                last_error = task.exception()
+        raise last_error
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def _call_with_retries_async(provider: str, coro_fn, *args):
+    stats = provider_stats[provider]
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        try:
+            return await _hedged_async(provider, coro_fn, *args)
+        except Exception as e:
+            if attempt == settings.LLM_MAX_RETRIES:
+                raise
+            stats.counters["retries"] += 1
+            logger.warning(f"{provider} call failed (attempt {attempt + 1}): {e}. Retrying...")
+            await asyncio.sleep(_backoff_seconds(attempt))
+
+def _provider_order() -> list:
+    """
+    Configured LLM_PROVIDER first, then the other one when failover is enabled.
+    """
+    primary = settings.LLM_PROVIDER if settings.LLM_PROVIDER in PROVIDERS else "gemini"
+    if not settings.LLM_FAILOVER:
+        return [primary]
+    return [primary] + [p for p in PROVIDERS if p != primary]
+
+def _failed_verdict(error) -> dict:
+    # Fallback response if every provider fails
+    return {
+        "probability": 0.0,
+        "risk_level": "Unknown",
+        "analysis": f"AI reasoning failed: {error}. Rely on raw visual/text matches.",
+        "recommendations": list(SAFE_DEFAULT_RECOMMENDATIONS),
+        "sources": []
+    }
+
+def transcribe_audio(audio_bytes: bytes, mime_type: str = "audio/mp3") -> str:
+    """
+    Uses Groq (Whisper) to transcribe audio files.
+    """
+    try:
+        audio_name = _audio_filename(mime_type)
+        transcription = _call_with_retries(
+            "groq_whisper",
+            lambda: get_groq_client().audio.transcriptions.create(
+                file=(audio_name, audio_bytes),
+                model=TRANSCRIPTION_MODEL,
+                response_format="json",
+                temperature=0.0
+            )
+        )
+        return transcription.text
+    except Exception as e:
+        logger.error(f"Error in Audio Transcription (Groq): {e}")
+        return f"[Error in Transcription: {e}]"
+
+async def _transcribe_chunk_groq(audio_bytes: bytes, mime_type: str) -> str:
+    async def _transcribe():
+        return await get_async_groq_client().audio.transcriptions.create(
+            file=(_audio_filename(mime_type), audio_bytes),
+            model=TRANSCRIPTION_MODEL,
+            response_format="json",
+            temperature=0.0
         )
-        
-        return json.loads(completion.choices[0].message.content)
 
+    return (await _call_with_retries_async("groq_whisper", _transcribe)).text
+
+_CHUNK_TRANSCRIBERS = {"groq": _transcribe_chunk_groq, "stub": stub_transcribe}
+
+# Decodes, trims silence and fans chunks out to the transcription backend
+audio_transcriber = ChunkedTranscriber(
+    _CHUNK_TRANSCRIBERS.get(settings.TRANSCRIPTION_BACKEND, _transcribe_chunk_groq),
+    chunk_seconds=settings.AUDIO_CHUNK_SECONDS,
+    overlap_seconds=settings.AUDIO_CHUNK_OVERLAP_SECONDS,
+    concurrency=settings.AUDIO_CHUNK_CONCURRENCY,
+    threshold_db=settings.AUDIO_VAD_THRESHOLD_DB,
+    min_silence_ms=settings.AUDIO_MIN_SILENCE_MS,
+    run_cpu=run_cpu,
+)
+
+async def transcribe_audio_async(audio_bytes: bytes, mime_type: str = "audio/mp3") -> str:
+    """
+    Async variant of transcribe_audio: decodes locally and transcribes silence-trimmed,
+    overlapping chunks concurrently (see audio.ChunkedTranscriber). Audio that cannot be
+    decoded here is uploaded whole.
+    """
+    try:
+        try:
+            return await audio_transcriber.transcribe(audio_bytes)
+        except AudioDecodeError as e:
+            logger.warning(f"Could not decode audio locally ({e}), uploading it whole")
+            return await audio_transcriber.transcribe_chunk(audio_bytes, mime_type)
+    except PartialTranscriptError as e:
+        # Keep what was transcribed; the marker stops the pipeline from caching it
+        logger.error(f"Error in Audio Transcription: {e}")
+        return f"[Error in Transcription: {e}] {e.text}"
+    except Exception as e:
+        logger.error(f"Error in Audio Transcription ({settings.TRANSCRIPTION_BACKEND}): {e}")
+        return f"[Error in Transcription: {e}]"
+
+def get_audio_stats() -> dict:
+    return audio_transcriber.stats.snapshot()
+
+# Groq needs a filename to detect the format: mime_type marker -> upload name (else mp3)
+AUDIO_FILENAMES = {"wav": "audio.wav", "mp4": "audio.mp4", "ogg": "audio.ogg", "flac": "audio.flac"}
+
+def _audio_filename(mime_type: str) -> str:
+    return next((name for marker, name in AUDIO_FILENAMES.items() if marker in mime_type), "audio.mp3")
+
+def analyze_risk_with_gemini(user_content: str, similar_cases: list) -> dict:
+    """
+    Sends the aggregated evidence (Visual + Text + Audio) to Gemini for a final verdict.
+    """
+    try:
+        return _call_with_retries("gemini", _call_gemini, build_risk_prompt(user_content, similar_cases))
+    except Exception as e:
+        logger.error(f"Error in Gemini Analysis: {e}")
+        return _failed_verdict(e)
+
+def analyze_risk_with_groq(user_content: str, similar_cases: list) -> dict:
+    """
+    Sends the aggregated evidence to Groq (Llama 3) for a final verdict.
+    """
+    try:
+        return _call_with_retries("groq", _call_groq, build_risk_prompt(user_content, similar_cases))
     except Exception as e:
         logger.error(f"Error in Groq Analysis: {e}")
-        return {
-             "probability": 0.0,
-             "risk_level": "Unknown",
-             "analysis": f"Groq reasoning failed: {e}",
-             "recommendations": [],
-             "sources": []
-        }
+        return _failed_verdict(e)
 
 def analyze_risk_evidence(user_content: str, similar_cases: list) -> dict:
     """
-    Dispatches the analysis to the configured LLM provider.
+    Dispatches the analysis to the configured LLM provider, failing over to the other one.
     """
-    provider = settings.LLM_PROVIDER
-    if provider == "groq":
-        logger.info("Using Groq for Risk Analysis")
-        return analyze_risk_with_groq(user_content, similar_cases)
-    else:
-        logger.info("Using Gemini for Risk Analysis")
-        return analyze_risk_with_gemini(user_content, similar_cases)
+    prompt = build_risk_prompt(user_content, similar_cases)
+    last_error = None
+    for provider in _provider_order():
+        if not _provider_available(provider):
+            continue
+        logger.info(f"Using {provider} for Risk Analysis")
+        try:
+            return _call_with_retries(provider, _SYNC_CALLS[provider], prompt)
+        except Exception as e:
+            logger.error(f"Error in {provider} Analysis: {e}")
+            provider_stats[provider].counters["gave_up"] += 1
+            last_error = e
+    return _failed_verdict(last_error or "no LLM provider configured")
+
+async def analyze_risk_evidence_async(user_content: str, similar_cases: list) -> dict:
+    """
+    Async variant of analyze_risk_evidence with hedged requests.
+    """
+    prompt = build_risk_prompt(user_content, similar_cases)
+    last_error = None
+    for provider in _provider_order():
+        if not _provider_available(provider):
+            continue
+        logger.info(f"Using {provider} for Risk Analysis")
+        try:
+            return await _call_with_retries_async(provider, _ASYNC_CALLS[provider], prompt)
+        except Exception as e:
+            logger.error(f"Error in {provider} Analysis: {e}")
+            provider_stats[provider].counters["gave_up"] += 1
+            last_error = e
+    return _failed_verdict(last_error or "no LLM provider configured")
+
+async def _stream_gemini(prompt: str):
+    response = await get_gemini_model().generate_content_async(
+        prompt, stream=True, request_options={"timeout": settings.LLM_TIMEOUT_SECONDS}
+    )
+    async for chunk in response:
+        if chunk.text:
+            yield chunk.text
+
+async def _stream_groq(prompt: str):
+    stream = await get_async_groq_client().chat.completions.create(
+        model=GROQ_MODEL,
+        messages=_groq_messages(prompt),
+        temperature=0.1,
+        response_format={"type": "json_object"},
+        stream=True
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+_STREAM_CALLS = {"gemini": _stream_gemini, "groq": _stream_groq}
+
+async def stream_risk_evidence_async(user_content: str, similar_cases: list, on_token, on_reset=None) -> dict:
+    """
+    Streams the verdict from the first available provider, awaiting on_token(text) for every
+    chunk as it arrives. If the stream fails before the first chunk, falls back to
+    analyze_risk_evidence_async (retries and failover, no streaming).
+
+    Once chunks have been sent the client holds a partial answer, so the fallback only runs
+    after on_reset(error) has told it to discard them; without on_reset the failed verdict
+    is returned instead.
+    """
+    prompt = build_risk_prompt(user_content, similar_cases)
+    provider = next((p for p in _provider_order() if _provider_available(p)), None)
+    if provider is None:
+        return _failed_verdict("no LLM provider configured")
+
+    stats = provider_stats[provider]
+    stats.counters["calls"] += 1
+    started = time.perf_counter()
+    chunks = []
+    try:
+        logger.info(f"Streaming {provider} Risk Analysis")
+        async for text in _STREAM_CALLS[provider](prompt):
+            chunks.append(text)
+            await on_token(text)
+        verdict = _parse_verdict("".join(chunks))
+        stats.latency.record(time.perf_counter() - started)
+        return verdict
+    except Exception as e:
+        stats.counters["errors"] += 1
+        if chunks:
+            if on_reset is None:
+                logger.error(f"Streaming from {provider} failed after {len(chunks)} chunks: {e}")
+                return _failed_verdict(e)
+            await on_reset(str(e))
+        logger.warning(f"Streaming from {provider} failed: {e}. Falling back to a regular call.")
+        return await analyze_risk_evidence_async(user_content, similar_cases)
+
+def get_llm_stats() -> dict:
+    return {name: stats.snapshot() for name, stats in provider_stats.items()}
@@ -1,75 +1,162 @@
 import numpy as np
-from risk_agent.config import get_client
-from sentence_transformers import SentenceTransformer
+from risk_agent.config import IMAGE_EMBEDDING_MODEL, get_client, settings
+from risk_agent.model_registry import get_model
+from risk_agent.phash import get_phash_index
+from risk_agent.resources import register
+from risk_agent.schema import IMAGE_VECTOR, SCAM_GENOME_COLLECTION, search_params
+from risk_agent.snapshot import get_snapshot_retriever
 from PIL import Image
 
-# Load Models (Global Load)
-# Note: Loading model at module level means it loads when imported. 
-# Ensure enough memory or handle lazy loading if app scales.
-vision_model = SentenceTransformer('clip-ViT-B-32')
+# CLIP loads on first use (or at API warmup), not at import.
+# The registry shares this instance with every other module asking for CLIP.
+vision_model = register("clip", lambda: get_model(IMAGE_EMBEDDING_MODEL))
 
-client = get_client()
-COLLECTION_NAME = "Scam Genome"
-TARGET_SIZE = 1024
+COLLECTION_NAME = SCAM_GENOME_COLLECTION
 
-def analyze_image_risk(image_file):
+def encode_images(images):
+    """
+    Encodes a batch of PIL images with CLIP in a single forward pass (512 dims each).
+    """
+    return vision_model.get().encode(images, batch_size=len(images))
+
+def genome_snapshot():
+    """
+    The in-process Scam Genome snapshot when RETRIEVAL_BACKEND=snapshot and one has been
+    exported, else None (searches then go to Qdrant).
+    """
+    if settings.RETRIEVAL_BACKEND != "snapshot":
+        return None
+    retriever = get_snapshot_retriever(settings.SNAPSHOT_PATH, settings.SNAPSHOT_ANN)
+    return retriever if retriever.available else None
+
+def search_image(vector_512):
+    """
+    Finds the closest known image evidence for a CLIP vector.
+    Only the "image" vector space is searched, so text points are never scanned.
+    """
+    snapshot = genome_snapshot()
+    if snapshot is not None:
+        return snapshot.query(vector_512, using=IMAGE_VECTOR, limit=1)
+
+    # Using query_points as search might be deprecated/behaving odd in some versions
+    return get_client().query_points(
+        collection_name=COLLECTION_NAME,
+        query=np.asarray(vector_512).tolist(),
+        using=IMAGE_VECTOR,
+        limit=1,
+        with_payload=True,
+        search_params=search_params(settings.GENOME_INDEX)
+    ).points
+
+def image_risk_from_hits(results):
+    """
+    Turns the nearest image matches into a risk_level / probability / analysis verdict.
+    """
+    if not results:
+        return {
+            "risk_level": "Unknown",
+            "probability": 0.0,
+            "analysis": "No similar image found in database.",
+            "source": None
+        }
+
+    top_match = results[0]
+    label = top_match.payload.get("risk_label")
+    score = top_match.score
+    filename = top_match.payload.get("filename", "unknown")
+
+    # Decision Logic
+    if label == "scam" and score > 0.28:
+        return {
+            "risk_level": "High",
+            "probability": float(score),
+            "analysis": f"CRITICAL: Visual similarity to known scam evidence ({filename}). Do not trust this screenshot.",
+            "source": top_match.payload
+        }
+    elif label == "legit":
+        return {
+            "risk_level": "Low",
+            "probability": float(score),
+            "analysis": "Verified: Matches interface of official/legit applications.",
+            "source": top_match.payload
+        }
+    else:
+        return {
+            "risk_level": "Medium",
+            "probability": float(score),
+            "analysis": "Suspicious: Image content is unclear but resembles financial charts.",
+            "source": top_match.payload
+        }
+
+def image_risk_from_phash(match):
+    """
+    Verdict for a screenshot that is a near-duplicate of an ingested one, from
+    PerceptualIndex.lookup's (distance, point_id, payload).
+    """
+    distance, _, payload = match
+    label = payload.get("risk_label")
+    filename = payload.get("filename", "unknown")
+    # 64-bit hash: 0 bits apart is the same picture, a few bits is a re-compressed copy
+    similarity = 1.0 - distance / 64
+    verdict = {
+        "probability": similarity,
+        "source": payload,
+        "match": "phash",
+        "hamming_distance": distance,
+    }
+    if label == "scam":
+        verdict.update(
+            risk_level="High",
+            analysis=f"CRITICAL: Near-identical copy of known scam evidence ({filename}). Do not trust this screenshot.",
+        )
+    elif label == "legit":
+        verdict.update(
+            risk_level="Low",
+            analysis=f"Verified: Near-identical copy of an official/legit application screen ({filename}).",
+        )
+    else:
+        verdict.update(
+            risk_level="Medium",
+            analysis=f"Suspicious: Near-identical copy of previously seen evidence ({filename}).",
+        )
+    return verdict
+
+def phash_image_risk(image_file):
+    """
+    Perceptual-hash fast path: the verdict for a known screenshot, or None when the image
+    is not a near-duplicate of anything ingested (or the fast path is disabled).
+    """
+    if settings.PHASH_MAX_DISTANCE <= 0:
+        return None
+    index = get_phash_index(settings.PHASH_INDEX_PATH)
+    if not len(index):
+        return None
+    match = index.lookup(image_file, settings.PHASH_MAX_DISTANCE)
+    return image_risk_from_phash(match) if match else None
+
+def analyze_image_risk(image_file, vector_512=None):
     """
     Input: Image file (from API upload) - expects a PIL Image object
+           Optionally the CLIP vector, when it was already computed by the batching layer.
     Output: Dictionary with risk_level, score, and analysis.
     """
     try:
+        # 0. Known screenshot? Answer from the perceptual hash, without CLIP or Qdrant
+        if vector_512 is None:
+            verdict = phash_image_risk(image_file)
+            if verdict is not None:
+                return verdict
+
         # 1. Image ko Vector mein badlo (512 dims)
         # Note: 'image_file' PIL image honi chahiye
-        vector_512 = vision_model.encode(image_file)
-        
-        # 2. Zero Padding (Hack to match 1024 dims of teammate's DB)
-        padding = np.zeros(TARGET_SIZE - len(vector_512))
-        query_vector = np.concatenate([vector_512, padding]).tolist()
-
-        # 3. Search in Qdrant
-        # Using query_points as search might be deprecated/behaving odd in some versions
-        results = client.query_points(
-            collection_name=COLLECTION_NAME,
-            query=query_vector,
-            limit=1,
-            with_payload=True
-        ).points
-
-        if not results:
-            return {
-                "risk_level": "Unknown",
-                "probability": 0.0,
-                "analysis": "No similar image found in database.",
-                "source": None
-            }
-
-        top_match = results[0]
-        label = top_match.payload.get("risk_label")
-        score = top_match.score
-        filename = top_match.payload.get("filename", "unknown")
-
-        # 4. Decision Logic
-        if label == "scam" and score > 0.28:
-            return {
-                "risk_level": "High", 
-                "probability": float(score), 
-                "analysis": f"CRITICAL: Visual similarity to known scam evidence ({filename}). Do not trust this screenshot.",
-                "source": top_match.payload
-            }
-        elif label == "legit":
-            return {
-                "risk_level": "Low", 
-                "probability": float(score), 
-                "analysis": "Verified: Matches interface of official/legit applications.",
-                "source": top_match.payload
-            }
-        else:
-            return {
-                "risk_level": "Medium", 
-                "probability": float(score), 
-                "analysis": "Suspicious: Image content is unclear but resembles financial charts.",
-                "source": top_match.payload
-            }
+        if vector_512 is None:
+            vector_512 = vision_model.get().encode(image_file)
+
+        # 2. Search in Qdrant
+        results = search_image(vector_512)
+
+        # 3. Decision Logic
+        return image_risk_from_hits(results)
 
     except Exception as e:
         return {"risk_level": "Error", "analysis": str(e), "source": None}
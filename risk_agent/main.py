@@ -1,195 +1,210 @@
+import time
+
+# Measures how long importing the API (and everything it imports) takes; heavy resources
+# are loaded later by warmup, so this should stay well under a second or two.
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 from risk_agent.config import settings
-from risk_agent.features import generate_embeddings
-from risk_agent.llm import extract_text_from_image, analyze_risk_evidence, transcribe_audio
-from risk_agent.logic import analyze_image_risk
-from PIL import Image
-import io
-import uuid
+from risk_agent.executors import get_pool_stats, run_io, shutdown_executors
+from risk_agent.inference import close_batchers, get_batching_stats
+from risk_agent.lexicon import get_lexicon_matcher
+from risk_agent.llm import get_audio_stats, get_llm_stats, get_ocr_stats
+from risk_agent.model_registry import get_model_stats
+from risk_agent.phash import get_phash_index
+from risk_agent.pipeline import HISTORY_COLLECTION, artifact_cache, heads, router, run_analysis, verdict_cache
+from risk_agent.resources import readiness, warmup
+from risk_agent.schema import create_collection, ensure_payload_indexes
+from risk_agent.snapshot import get_snapshot_retriever
+import asyncio
+import json
 from typing import List
 from loguru import logger
 from qdrant_client.http import models
 
 app = FastAPI(title="ScamShield Risk Agent", version="0.1.0")
 
-HISTORY_COLLECTION = "user_history"
+IMPORT_SECONDS = round(time.perf_counter() - _import_started, 3)
+logger.info(f"risk_agent.main imported in {IMPORT_SECONDS:.2f}s")
 
 @app.on_event("startup")
 async def startup_event():
     """
-    Ensure the user_history collection exists for long-term memory.
+    Start preloading models in the background, and ensure the user_history collection
+    exists for long-term memory.
     """
-    client = settings.get_qdrant_client()
+    if settings.WARMUP_ON_STARTUP:
+        # Not awaited: the worker accepts connections right away and /ready reports progress
+        app.state.warmup_task = asyncio.create_task(run_io(warmup))
+
     try:
-        collections = client.get_collections().collections
+        client = await run_io(settings.get_qdrant_client)
+        collections = (await run_io(client.get_collections)).collections
         exists = any(c.name == HISTORY_COLLECTION for c in collections)
-        
+
         if not exists:
             logger.info(f"Creating {HISTORY_COLLECTION} collection for Long-term Memory...")
-            client.create_collection(
-                collection_name=HISTORY_COLLECTION,
-                vectors_config=models.VectorParams(
+            await run_io(
+                create_collection,
+                client,
+                HISTORY_COLLECTION,
+                models.VectorParams(
                     size=768, # Matching BGE-base standard (768 dims)
                     distance=models.Distance.COSINE
-                )
+                ),
+                settings.HISTORY_INDEX
             )
+        else:
+            await run_io(ensure_payload_indexes, client, HISTORY_COLLECTION, settings.HISTORY_INDEX)
     except Exception as e:
         logger.error(f"Could not initialize {HISTORY_COLLECTION}: {e}")
 
+    if settings.RETRIEVAL_BACKEND == "snapshot":
+        app.state.snapshot_task = asyncio.create_task(_keep_snapshot_fresh())
+
+async def _keep_snapshot_fresh():
+    """
+    Loads the Scam Genome snapshot and reloads it whenever it changes on disk, checking
+    every SNAPSHOT_RELOAD_SECONDS. Until a snapshot exists, searches go to Qdrant.
+
+    Workers never write the snapshot: `python -m risk_agent.snapshot --watch` (or a cron
+    `--refresh`) does, once for all of them.
+    """
+    retriever = get_snapshot_retriever(settings.SNAPSHOT_PATH, settings.SNAPSHOT_ANN)
+    warned = False
+    while True:
+        try:
+            if retriever.available:
+                await run_io(retriever.maybe_reload)
+            elif not warned:
+                logger.warning(
+                    f"No snapshot at {settings.SNAPSHOT_PATH}; searching Qdrant until "
+                    "`python -m risk_agent.snapshot` writes one."
+                )
+                warned = True
+        except Exception as e:
+            # Keep serving the snapshot we have; the writer may be mid-swap
+            logger.error(f"Snapshot reload failed: {e}")
+        if settings.SNAPSHOT_RELOAD_SECONDS > 0:
+            await asyncio.sleep(settings.SNAPSHOT_RELOAD_SECONDS)
+        elif retriever.available:
+            return
+        else:
+            # Load-once mode still has to wait for the first snapshot
+            await asyncio.sleep(30)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    snapshot_task = getattr(app.state, "snapshot_task", None)
+    if snapshot_task is not None:
+        snapshot_task.cancel()
+    await close_batchers()
+    shutdown_executors()
+
 @app.get("/")
 async def root():
     return {"message": "ScamShield Risk Agent is running", "mode": "Cloud" if settings.USE_CLOUD else "Local"}
 
+@app.post("/warmup")
+async def warmup_resources():
+    """
+    Loads every lazy resource (models, OCR reader, Qdrant client) in parallel and returns
+    their state. Resources that are already loaded return immediately.
+    """
+    return await run_io(warmup)
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness probe: 200 once every resource is loaded, else 503. Both list each resource's
+    state and load time.
+    """
+    status = {**readiness(), "import_seconds": IMPORT_SECONDS}
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Runtime statistics for the request path (model load times, memory, batching, OCR, audio
+    throughput, traffic and latency per verdict tier).
+    """
+    return {
+        "models": get_model_stats(),
+        "pools": get_pool_stats(),
+        "batching": get_batching_stats(),
+        "artifact_cache": artifact_cache.stats(),
+        "verdict_cache": verdict_cache.stats(),
+        "routing": router.stats(),
+        "heads": heads.stats(),
+        "llm": get_llm_stats(),
+        "ocr": get_ocr_stats(),
+        "audio": get_audio_stats(),
+        "phash": get_phash_index(settings.PHASH_INDEX_PATH).stats(),
+        "lexicon": get_lexicon_matcher(settings.LEXICON_PATH).stats(),
+        "snapshot": (
+            get_snapshot_retriever(settings.SNAPSHOT_PATH, settings.SNAPSHOT_ANN).stats()
+            if settings.RETRIEVAL_BACKEND == "snapshot" else None
+        ),
+    }
+
+async def _read_uploads(files: List[UploadFile]) -> list:
+    return [(file.filename, await file.read()) for file in files]
+
 @app.post("/analyze_risk/")
 async def analyze_risk(files: List[UploadFile] = File(...)):
-    aggregated_text = ""
-    visual_evidence = []
-    memory_context = ""
-    
     try:
-        inputs_processed = 0
-        
-        for file in files:
-            content = await file.read()
-            filename = file.filename
-            
-            # --- IMAGE PROCESSING ---
-            if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')):
-                try:
-                    pil_image = Image.open(io.BytesIO(content))
-                    visual_result = analyze_image_risk(pil_image)
-                    if visual_result["risk_level"] in ["High", "Medium", "Low"]:
-                        visual_evidence.append({"filename": filename, "visual_risk": visual_result})
-                except Exception as v_err:
-                    logger.error(f"Visual fail: {v_err}")
-
-                extracted = extract_text_from_image(content)
-                if extracted:
-                    aggregated_text += f"\n--- Source: {filename} (Image Text) ---\n{extracted}\n"
-                    inputs_processed += 1
-            
-            # --- AUDIO PROCESSING ---
-            elif filename.lower().endswith(('.mp3', '.wav', '.m4a', '.ogg')):
-                mime = "audio/mp3"
-                if filename.lower().endswith('.wav'): mime = "audio/wav"
-                elif filename.lower().endswith('.m4a'): mime = "audio/mp4"
-                
-                transcript = transcribe_audio(content, mime_type=mime)
-                if transcript:
-                    aggregated_text += f"\n--- Source: {filename} (Audio Transcript) ---\n{transcript}\n"
-                    inputs_processed += 1
-
-            # --- TEXT FILE PROCESSING ---
-            elif filename.endswith('.txt'):
-                text = content.decode('utf-8', errors='replace')
-                if text.strip():
-                    aggregated_text += f"\n--- Source: {filename} (Chat Log) ---\n{text.strip()}\n"
-                    inputs_processed += 1
-            
-        # --- PHASE 2: SEARCH GENOME (Public Database) ---
-        similar_text_cases = []
-        if aggregated_text.strip():
-            search_query = aggregated_text[:2000] 
-            embeddings, _ = generate_embeddings([search_query])
-            query_vector = embeddings[0]
-            
-            client = settings.get_qdrant_client()
-            
-            # 1. Search Known Scam Genome (Public)
-            search_result = client.query_points(
-                collection_name="Scam Genome",
-                query=query_vector.tolist(),
-                limit=5
-            )
-            for hit in search_result.points:
-                payload = hit.payload or {}
-                # Try multiple common keys for text content
-                raw_text = (
-                    payload.get("original_text") or 
-                    payload.get("text") or 
-                    payload.get("page_content") or 
-                    payload.get("content") or
-                    payload.get("description") or
-                    "No text content available"
-                )
-                
-                # specific fix: if it's a list (some embeddings do this), join it
-                if isinstance(raw_text, list):
-                    raw_text = " ".join(str(x) for x in raw_text)
-                
-                # Clean up whitespace
-                clean_text = " ".join(str(raw_text).split())
-                
-                similar_text_cases.append({
-                    "text_snippet": clean_text[:300],
-                    "risk_label": payload.get("risk_label", "unknown"),
-                    "score": float(hit.score)
-                })
-
-            # 2. LONG-TERM MEMORY: Search User History (Private)
-            history_result = client.query_points(
-                collection_name=HISTORY_COLLECTION,
-                query=query_vector.tolist(),
-                limit=3,
-                score_threshold=0.85 # Only bring back high-confidence matches
-            )
-            
-            if history_result.points:
-                memory_context = "PAST USER REPORTS DETECTED:\n"
-                for hit in history_result.points:
-                    prev_verdict = hit.payload.get('verdict_summary', 'No summary')
-                    memory_context += f"- Previously seen on {hit.payload.get('timestamp', 'Unknown date')}. Verdict: {prev_verdict}\n"
-
-        # --- PHASE 3: FINAL REASONING (LLM) ---
-        visual_summary = ""
-        for item in visual_evidence:
-            v = item['visual_risk']
-            visual_summary += f"- Image '{item['filename']}' detected as {v['risk_level']} Risk. Analysis: {v['analysis']}\n"
-
-        final_user_content = f"""
-        {memory_context if memory_context else ""}
-
-        VISUAL EVIDENCE FOUND:
-        {visual_summary if visual_summary else "No specific visual scam patterns detected."}
-
-        TEXTUAL/AUDIO EVIDENCE:
-        {aggregated_text if aggregated_text else "No readable text found."}
-        """
-
-        llm_analysis = analyze_risk_evidence(final_user_content, similar_text_cases)
-        
-        # --- PHASE 4: PERSIST TO MEMORY ---
-        if aggregated_text.strip():
-            try:
-                import datetime
-                client.upsert(
-                    collection_name=HISTORY_COLLECTION,
-                    points=[models.PointStruct(
-                        id=str(uuid.uuid4()),
-                        vector=query_vector.tolist(),
-                        payload={
-                            "timestamp": datetime.datetime.now().isoformat(),
-                            "original_input": aggregated_text[:500],
-                            "verdict_summary": f"{llm_analysis['risk_level']} Risk ({llm_analysis['probability']*100:.0f}%)",
-                            "recommendations": llm_analysis.get("recommendations", [])
-                        }
-                    )]
-                )
-                logger.info("Interaction saved to Long-term Memory.")
-            except Exception as e:
-                logger.error(f"Memory persistence failed: {e}")
-        
-        return {
-            "inputs_processed": inputs_processed,
-            "final_verdict": llm_analysis,
-            "detailed_evidence": {
-                "visual_analysis": visual_evidence,
-                "text_matches": similar_text_cases,
-                "aggregated_text": aggregated_text,
-                "memory_context": memory_context
-            }
-        }
-
+        uploads = await _read_uploads(files)
+        return await run_analysis(uploads)
     except Exception as e:
         logger.error(f"Error processing request: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.post("/analyze_risk/stream")
+async def analyze_risk_stream(files: List[UploadFile] = File(...)):
+    """
+    Server-sent events variant of /analyze_risk/.
+
+    Emits visual_risk, extracted_text, lexicon_match, genome_matches, memory_context, llm_token
+    and timeout events as each phase finishes (llm_reset when a broken LLM stream is retried:
+    discard the llm_token text received so far), then a final "result" event carrying the same
+    JSON body as the non-streaming endpoint (or an "error" event).
+    """
+    # Uploads are read up front: the request's files are closed once this handler returns
+    uploads = await _read_uploads(files)
+    queue = asyncio.Queue()
+
+    async def emit(event, data):
+        await queue.put((event, data))
+
+    async def produce():
+        try:
+            result = await run_analysis(uploads, emit=emit, stream_tokens=True)
+            await queue.put(("result", result))
+        except Exception as e:
+            logger.error(f"Error processing request: {e}")
+            await queue.put(("error", {"detail": str(e)}))
+        finally:
+            await queue.put(None)
+
+    async def event_stream():
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                yield _sse(*item)
+        finally:
+            # Client went away: stop the analysis instead of finishing it for nobody
+            if not producer.done():
+                producer.cancel()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,51 @@
+from collections import deque
+import threading
+
+
+def percentile(values, q):
+    """
+    Nearest-rank percentile of a list of numbers (q in 0..100).
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[rank]
+
+
+class LatencyWindow:
+    """
+    Rolling window of the most recent latency samples (in seconds), safe to share across threads.
+    """
+
+    def __init__(self, maxlen=1000):
+        self._samples = deque(maxlen=maxlen)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self._count += 1
+
+    def percentile(self, q):
+        with self._lock:
+            samples = list(self._samples)
+        return percentile(samples, q)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def snapshot(self):
+        with self._lock:
+            samples = list(self._samples)
+            count = self._count
+        if not samples:
+            return {"count": count, "mean_ms": None, "p50_ms": None, "p95_ms": None, "max_ms": None}
+        return {
+            "count": count,
+            "mean_ms": round(1000 * sum(samples) / len(samples), 2),
+            "p50_ms": round(1000 * percentile(samples, 50), 2),
+            "p95_ms": round(1000 * percentile(samples, 95), 2),
+            "max_ms": round(1000 * max(samples), 2),
+        }
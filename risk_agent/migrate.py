@@ -0,0 +1,141 @@
+from pathlib import Path
+import sys
+
+from loguru import logger
+from qdrant_client import models
+from tqdm import tqdm
+import typer
+
+# Ensure project root is in path for imports
+PROJ_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJ_ROOT))
+
+from risk_agent.config import settings
+from risk_agent.schema import (
+    IMAGE_VECTOR,
+    IMAGE_VECTOR_SIZE,
+    SCAM_GENOME_COLLECTION,
+    TEXT_VECTOR,
+    TEXT_VECTOR_SIZE,
+    create_collection,
+    genome_vectors_config,
+    has_named_vectors,
+    is_image_point,
+)
+
+app = typer.Typer()
+
+
+def to_named_point(record):
+    """
+    Converts a point of the old single-vector schema into a named-vector point.
+    Image points keep the first 512 dims (the CLIP vector before zero padding),
+    text points the first 768 dims (the BGE vector).
+    """
+    vector = record.vector
+    if is_image_point(record.payload):
+        named = {IMAGE_VECTOR: vector[:IMAGE_VECTOR_SIZE]}
+    else:
+        if len(vector) < TEXT_VECTOR_SIZE:
+            return None
+        named = {TEXT_VECTOR: vector[:TEXT_VECTOR_SIZE]}
+    return models.PointStruct(id=record.id, vector=named, payload=record.payload)
+
+
+def copy_points(client, source, target, batch_size, convert=None):
+    """
+    Scrolls every point of source into target, optionally converting each one.
+    Returns (copied, skipped).
+    """
+    total = client.count(source, exact=True).count
+    copied, skipped = 0, 0
+    offset = None
+    with tqdm(total=total, desc=f"{source} -> {target}") as progress:
+        while True:
+            records, offset = client.scroll(
+                collection_name=source,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            points = []
+            for record in records:
+                point = (
+                    convert(record)
+                    if convert
+                    else models.PointStruct(id=record.id, vector=record.vector, payload=record.payload)
+                )
+                if point is None:
+                    skipped += 1
+                else:
+                    points.append(point)
+            if points:
+                client.upsert(collection_name=target, points=points)
+                copied += len(points)
+            progress.update(len(records))
+            if offset is None:
+                break
+    return copied, skipped
+
+
+@app.command()
+def main(
+    collection_name: str = SCAM_GENOME_COLLECTION,
+    batch_size: int = 256,
+    keep_backup: bool = False,
+):
+    """
+    Migrate Scam Genome from zero-padded single vectors to named "text" (768) and "image" (512) vectors.
+
+    Qdrant cannot change a collection's vector schema, so the collection is converted into a
+    staging collection, recreated under the same name with the new schema (and the GENOME_*
+    index settings), and filled back.
+    """
+    client = settings.get_qdrant_client()
+
+    if not client.collection_exists(collection_name):
+        logger.error(f"Collection {collection_name} not found.")
+        raise typer.Exit(code=1)
+
+    if has_named_vectors(client, collection_name):
+        logger.info(f"Collection {collection_name} already uses named vectors. Nothing to do.")
+        return
+
+    old_vectors = client.get_collection(collection_name).config.params.vectors
+    if isinstance(old_vectors, dict):
+        logger.error(f"Unexpected vector schema on {collection_name}: {list(old_vectors)}")
+        raise typer.Exit(code=1)
+    logger.info(f"Old schema: single {old_vectors.size}-dim vector per point.")
+
+    staging = f"{collection_name}__migration"
+    if client.collection_exists(staging):
+        client.delete_collection(staging)
+    create_collection(client, staging, genome_vectors_config(), settings.GENOME_INDEX)
+
+    # 1. Convert into the staging collection
+    copied, skipped = copy_points(client, collection_name, staging, batch_size, convert=to_named_point)
+    if skipped:
+        logger.warning(f"Skipped {skipped} text points with fewer than {TEXT_VECTOR_SIZE} dims.")
+
+    staged = client.count(staging, exact=True).count
+    if staged != copied:
+        logger.error(f"Staging collection has {staged} points, expected {copied}. Original left untouched.")
+        raise typer.Exit(code=1)
+
+    # 2. Recreate the original collection with the new schema and fill it back
+    logger.info(f"Recreating {collection_name} with named vectors...")
+    client.delete_collection(collection_name)
+    create_collection(client, collection_name, genome_vectors_config(), settings.GENOME_INDEX)
+    restored, _ = copy_points(client, staging, collection_name, batch_size)
+
+    if keep_backup:
+        logger.info(f"Staging copy kept as {staging}.")
+    else:
+        client.delete_collection(staging)
+
+    logger.success(f"Migrated {restored} points in '{collection_name}' to named vectors.")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,145 @@
+from contextlib import contextmanager
+import os
+import sys
+import threading
+import time
+
+from loguru import logger
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# One SentenceTransformer per (model_name, max_seq_length, device) for the whole process.
+_models = {}
+_stats = {}
+_lock = threading.Lock()
+_key_locks = {}
+
+
+def _current_rss_bytes():
+    """
+    Resident set size of this process in bytes, read from /proc, or None where there is
+    no /proc (macOS, Windows). Only this figure is used for per-model deltas.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _peak_rss_bytes():
+    """
+    Peak resident set size of this process in bytes from getrusage, or None on Windows.
+    It never goes down, so it is reported on its own and not used for deltas.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kilobytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _mb(size_bytes):
+    return round(size_bytes / (1024 * 1024), 1) if size_bytes is not None else None
+
+
+def _parameter_bytes(model):
+    try:
+        return sum(p.numel() * p.element_size() for p in model.parameters())
+    except Exception:
+        return None
+
+
+def get_model(model_name, max_seq_length=None, device=None):
+    """
+    Returns the shared SentenceTransformer for this key, loading it on first use.
+    Concurrent callers asking for the same key wait for a single load.
+    """
+    key = (model_name, max_seq_length, device)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+
+    with key_lock:
+        model = _models.get(key)
+        if model is not None:
+            return model
+
+        logger.info(f"Loading model: {model_name} (max_seq_length={max_seq_length}, device={device or 'auto'})...")
+        rss_before = _current_rss_bytes()
+        start = time.perf_counter()
+
+        # Imported here: torch and transformers take seconds to import
+        from sentence_transformers import SentenceTransformer
+
+        model = SentenceTransformer(model_name, device=device)
+        if max_seq_length is not None:
+            model.max_seq_length = max_seq_length
+
+        load_seconds = time.perf_counter() - start
+        rss_after = _current_rss_bytes()
+        rss_delta = rss_after - rss_before if rss_after is not None and rss_before is not None else None
+        param_bytes = _parameter_bytes(model)
+
+        _stats[key] = {
+            "model_name": model_name,
+            "max_seq_length": max_seq_length,
+            "device": str(model.device),
+            "load_seconds": round(load_seconds, 3),
+            "rss_delta_mb": _mb(rss_delta),
+            "parameter_mb": round(param_bytes / (1024 * 1024), 1) if param_bytes else None,
+        }
+        _models[key] = model
+        resident = f" (+{_stats[key]['rss_delta_mb']} MB resident)" if rss_delta is not None else ""
+        logger.info(f"Model {model_name} loaded on {model.device} in {load_seconds:.2f}s{resident}")
+        return model
+
+
+@contextmanager
+def multi_process_pool(model_name, max_seq_length=None, workers=2):
+    """
+    Starts `workers` CPU processes, each holding its own copy of the model, for
+    model.encode_multi_process. Torch threads are split between them so the pool
+    does not oversubscribe the cores.
+    """
+    model = get_model(model_name, max_seq_length=max_seq_length)
+    threads = str(max(1, (os.cpu_count() or workers) // workers))
+    previous = os.environ.get("OMP_NUM_THREADS")
+    # Spawned workers read this when they import torch
+    os.environ["OMP_NUM_THREADS"] = threads
+    try:
+        pool = model.start_multi_process_pool(target_devices=["cpu"] * workers)
+    finally:
+        if previous is None:
+            os.environ.pop("OMP_NUM_THREADS", None)
+        else:
+            os.environ["OMP_NUM_THREADS"] = previous
+    logger.info(f"Started {workers} encode processes for {model_name} ({threads} threads each)")
+    try:
+        yield pool
+    finally:
+        model.stop_multi_process_pool(pool)
+
+
+def is_loaded(model_name, max_seq_length=None, device=None):
+    return (model_name, max_seq_length, device) in _models
+
+
+def get_model_stats():
+    """
+    Load time and memory footprint of every model loaded in this process. Resident sizes
+    are None where they cannot be measured; process_peak_rss_mb is the high-water mark.
+    """
+    stats = [dict(s) for s in _stats.values()]
+    return {
+        "models": stats,
+        "process_rss_mb": _mb(_current_rss_bytes()),
+        "process_peak_rss_mb": _mb(_peak_rss_bytes()),
+    }
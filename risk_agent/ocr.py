@@ -0,0 +1,224 @@
+from collections import Counter
+import queue
+import threading
+import time
+
+import numpy as np
+
+from risk_agent.metrics import LatencyWindow
+
+# Recognition modes: "standard" is EasyOCR's default (dynamically quantized on CPU, 2560 px
+# detection canvas); "fast" halves the canvas and the input; "accurate" keeps float weights.
+OCR_MODES = {
+    "accurate": {"quantize": False, "canvas_size": 2560, "max_side": None},
+    "standard": {"quantize": True, "canvas_size": 2560, "max_side": None},
+    "fast": {"quantize": True, "canvas_size": 1280, "max_side": 1280},
+}
+
+# Gradient step (0-255) that counts as an edge for the text-region prefilter
+EDGE_THRESHOLD = 40
+PREFILTER_SIDE = 512
+
+
+def _gray(image):
+    image = np.asarray(image)
+    if image.ndim == 3:
+        image = image.mean(axis=2)
+    return image
+
+
+def edge_density(image):
+    """
+    Fraction of pixels on a strong horizontal or vertical edge, measured on a ~512 px
+    subsample. Rendered text is dense in such edges; blank or flat regions have almost none.
+    """
+    gray = _gray(image)
+    step = max(1, max(gray.shape) // PREFILTER_SIDE)
+    small = gray[::step, ::step].astype(np.int16)
+    if small.shape[0] < 2 or small.shape[1] < 2:
+        return 0.0
+    gx = np.abs(np.diff(small, axis=1))[:-1, :]
+    gy = np.abs(np.diff(small, axis=0))[:, :-1]
+    return float(((gx > EDGE_THRESHOLD) | (gy > EDGE_THRESHOLD)).mean())
+
+
+def tile_image(image, tile_aspect=1.0, overlap=48):
+    """
+    Splits a tall image into equal-height tiles (height = width * tile_aspect) that overlap
+    by `overlap` pixels; the last one is padded with the image's edge colour so all tiles
+    can be recognized as one batch. Returns [(tile, y_offset)]; images that are not much
+    taller than one tile come back whole.
+    """
+    image = np.asarray(image)
+    height, width = image.shape[:2]
+    tile_height = max(overlap * 2 + 1, int(width * tile_aspect))
+    if height <= tile_height * 1.5:
+        return [(image, 0)]
+    stride = tile_height - overlap
+    tiles = []
+    for top in range(0, height - overlap, stride):
+        tile = image[top:top + tile_height]
+        if tile.shape[0] < tile_height:
+            pad = [(0, tile_height - tile.shape[0])] + [(0, 0)] * (image.ndim - 1)
+            tile = np.pad(tile, pad, mode="edge")
+        tiles.append((tile, top))
+        if top + tile_height >= height:
+            break
+    return tiles
+
+
+def _center_y(box):
+    return sum(point[1] for point in box) / len(box)
+
+
+class OcrEngine:
+    """
+    EasyOCR behind a pool of readers, one per concurrent caller, so OCR calls never share a
+    reader across threads.
+
+    Each image first goes through a cheap edge-density check: images (and tiles) with no
+    text-like structure skip recognition entirely. Tall chat screenshots are cut into
+    overlapping tiles that go through detection and recognition as one batch; lines in the
+    overlap are kept from one tile only.
+    """
+
+    def __init__(self, pool_size=2, mode="standard", min_edge_density=0.002, tile_aspect=1.0,
+                 tile_overlap=48, batch_size=8, reader_factory=None):
+        if mode not in OCR_MODES:
+            raise ValueError(f"Unknown OCR mode {mode!r}, expected one of {', '.join(OCR_MODES)}")
+        self.pool_size = max(1, pool_size)
+        self.mode = mode
+        self.options = OCR_MODES[mode]
+        self.min_edge_density = min_edge_density
+        self.tile_aspect = tile_aspect
+        self.tile_overlap = tile_overlap
+        self.batch_size = batch_size
+        self.reader_factory = reader_factory or self._create_reader
+
+        self._idle = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+        self.latency = LatencyWindow()
+        self.counters = Counter()
+        self.tile_counts = Counter()
+
+    @property
+    def version(self):
+        """
+        Tag of the settings that change OCR output, stored with cached OCR text.
+        """
+        return f"{self.mode}-tile{self.tile_aspect:g}x{self.tile_overlap}-edge{self.min_edge_density:g}"
+
+    def _create_reader(self):
+        # easyocr pulls in torch, so it is imported with the first reader
+        import easyocr
+
+        return easyocr.Reader(["en"], quantize=self.options["quantize"], verbose=False)
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.pool_size
+            if create:
+                self._created += 1
+        if not create:
+            return self._idle.get()
+        try:
+            return self.reader_factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def warm(self):
+        """
+        Creates every reader of the pool up front (used by the API warmup).
+        """
+        readers = [self._acquire() for _ in range(self.pool_size - self._idle.qsize())]
+        for reader in readers:
+            self._idle.put(reader)
+        return self
+
+    def _fit(self, image):
+        max_side = self.options["max_side"]
+        height, width = image.shape[:2]
+        if not max_side or max(height, width) <= max_side:
+            return image
+        from PIL import Image
+
+        scale = max_side / max(height, width)
+        resized = Image.fromarray(image).resize((max(1, round(width * scale)), max(1, round(height * scale))))
+        return np.asarray(resized)
+
+    def _recognize(self, reader, tiles):
+        canvas = self.options["canvas_size"]
+        if len(tiles) == 1:
+            return [reader.readtext(tiles[0][0], detail=1, canvas_size=canvas, batch_size=self.batch_size)]
+        return reader.readtext_batched(
+            [tile for tile, _ in tiles], detail=1, canvas_size=canvas, batch_size=self.batch_size
+        )
+
+    def read(self, image):
+        """
+        Text of one image (decoded uint8 array, grayscale or RGB) in reading order.
+        """
+        started = time.perf_counter()
+        image = self._fit(np.asarray(image))
+        try:
+            if self.min_edge_density and edge_density(image) < self.min_edge_density:
+                self._count(tiles=0, skipped_no_text=1)
+                return ""
+
+            tiles = tile_image(image, self.tile_aspect, self.tile_overlap)
+            total = len(tiles)
+            if total > 1 and self.min_edge_density:
+                tiles = [(tile, top) for tile, top in tiles if edge_density(tile) >= self.min_edge_density]
+            self._count(tiles=len(tiles), tiles_skipped=total - len(tiles))
+            if not tiles:
+                return ""
+
+            reader = self._acquire()
+            try:
+                results = self._recognize(reader, tiles)
+            finally:
+                self._idle.put(reader)
+
+            tile_height = tiles[0][0].shape[0]
+            half = self.tile_overlap / 2
+            lines = []
+            for (_, top), detections in zip(tiles, results):
+                for box, text, _ in detections:
+                    y = _center_y(box)
+                    # A line inside an overlap belongs to the tile where it is further from the cut
+                    if top > 0 and y < half:
+                        continue
+                    if len(tiles) > 1 and top + tile_height < image.shape[0] and y >= tile_height - half:
+                        continue
+                    lines.append((top + y, box[0][0], text))
+            lines.sort(key=lambda line: (line[0], line[1]))
+            return " ".join(text for _, _, text in lines)
+        finally:
+            self.latency.record(time.perf_counter() - started)
+
+    def _count(self, tiles, **counters):
+        with self._lock:
+            self.counters.update(images=1, tiles=tiles, **counters)
+            self.tile_counts[tiles] += 1
+
+    def stats(self):
+        images = self.counters["images"]
+        return {
+            **self.latency.snapshot(),
+            "mode": self.mode,
+            "readers": self._created,
+            "images": images,
+            "skipped_no_text": self.counters["skipped_no_text"],
+            "tiles": self.counters["tiles"],
+            "tiles_skipped": self.counters["tiles_skipped"],
+            "mean_tiles_per_image": round(self.counters["tiles"] / images, 2) if images else None,
+            "tile_count_histogram": dict(sorted(self.tile_counts.items())),
+        }
@@ -0,0 +1,197 @@
+import json
+import os
+from pathlib import Path
+import threading
+
+import numpy as np
+from PIL import Image, ImageOps
+
+HASH_SIZE = 8        # 8x8 DCT coefficients -> 64-bit hash
+HIGHFREQ_FACTOR = 4  # hashed from a 32x32 thumbnail
+INDEX_VERSION = 1
+
+
+def _dct_matrix(n):
+    k = np.arange(n)
+    matrix = np.cos(np.pi / n * (k[None, :] + 0.5) * k[:, None])
+    matrix[0] *= 1 / np.sqrt(2)
+    return matrix * np.sqrt(2 / n)
+
+
+_DCT = _dct_matrix(HASH_SIZE * HIGHFREQ_FACTOR)
+
+
+def phash(image):
+    """
+    64-bit perceptual hash of a PIL image: the sign of the low-frequency DCT coefficients of
+    a 32x32 grayscale thumbnail against their median. Re-compressed, rescaled or lightly
+    edited copies of a screenshot land within a few bits of the original.
+    """
+    size = HASH_SIZE * HIGHFREQ_FACTOR
+    if getattr(image, "is_animated", False):
+        image.seek(0)
+    gray = ImageOps.exif_transpose(image).convert("L").resize((size, size), Image.LANCZOS)
+    pixels = np.asarray(gray, dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    bits = (low > np.median(low)).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over Hamming distance: a radius-r lookup only descends into
+    children whose edge distance is within r of the query's distance to the node, so it
+    touches a small fraction of the hashes for the small radii used here.
+    """
+
+    def __init__(self):
+        self._root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, value, item):
+        node = [value, item, {}]
+        self._size += 1
+        if self._root is None:
+            self._root = node
+            return
+        current = self._root
+        while True:
+            distance = hamming(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, value, max_distance):
+        """
+        [(distance, item)] of every entry within max_distance bits, closest first.
+        """
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        while stack:
+            node_value, item, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance:
+                found.append((distance, item))
+            for edge, child in children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda match: match[0])
+        return found
+
+
+class PerceptualIndex:
+    """
+    Perceptual hashes of the ingested screenshots, kept on disk as JSON next to the other
+    processed artifacts and searched in memory with a BK-tree.
+
+    Entries are keyed by their Scam Genome point id, so re-running ingestion never adds a
+    screenshot twice. lookup() counts how often the fast path matched.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else None
+        self._entries = {}
+        self._tree = BKTree()
+        self._mtime = None
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        if self.path is not None and self.path.exists():
+            self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, point_id):
+        return str(point_id) in self._entries
+
+    def _load(self):
+        data = json.loads(self.path.read_text())
+        entries = {}
+        tree = BKTree()
+        for entry in data.get("entries", []):
+            value = int(entry["hash"], 16)
+            entries[entry["id"]] = (value, entry["payload"])
+            tree.add(value, (entry["id"], entry["payload"]))
+        self._entries, self._tree = entries, tree
+        self._mtime = os.stat(self.path).st_mtime
+
+    def maybe_reload(self):
+        """
+        Picks up a newer index written by an ingestion run.
+        """
+        if self.path is None or not self.path.exists():
+            return False
+        if os.stat(self.path).st_mtime == self._mtime:
+            return False
+        with self._lock:
+            self._load()
+        return True
+
+    def add(self, point_id, value, payload):
+        point_id = str(point_id)
+        if point_id in self._entries:
+            return
+        self._entries[point_id] = (value, payload)
+        self._tree.add(value, (point_id, payload))
+
+    def save(self):
+        entries = [
+            {"id": point_id, "hash": f"{value:016x}", "payload": payload}
+            for point_id, (value, payload) in self._entries.items()
+        ]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"version": INDEX_VERSION, "bits": HASH_SIZE * HASH_SIZE, "entries": entries}))
+        tmp_path.replace(self.path)
+        self._mtime = os.stat(self.path).st_mtime
+
+    def lookup(self, image_or_hash, max_distance):
+        """
+        (distance, point_id, payload) of the closest indexed screenshot within max_distance
+        bits, or None.
+        """
+        value = image_or_hash if isinstance(image_or_hash, int) else phash(image_or_hash)
+        matches = self._tree.search(value, max_distance)
+        with self._lock:
+            self.lookups += 1
+            if matches:
+                self.hits += 1
+        if not matches:
+            return None
+        distance, (point_id, payload) = matches[0]
+        return distance, point_id, payload
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "lookups": self.lookups,
+            "fast_path_hits": self.hits,
+            "fast_path_rate": round(self.hits / self.lookups, 4) if self.lookups else None,
+        }
+
+
+_indexes = {}
+
+
+def get_phash_index(path):
+    """
+    One shared index per path for the process, refreshed when the file on disk changes.
+    """
+    key = str(path)
+    if key not in _indexes:
+        _indexes[key] = PerceptualIndex(path)
+    index = _indexes[key]
+    index.maybe_reload()
+    return index
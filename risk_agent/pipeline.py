@@ -0,0 +1,509 @@
+import asyncio
+import datetime
+import uuid
+
+from loguru import logger
+from qdrant_client.http import models
+
+from risk_agent.cache import ArtifactCache, VerdictCache, content_digest
+from risk_agent.config import IMAGE_EMBEDDING_MODEL, TEXT_EMBEDDING_MODEL, settings
+from risk_agent.executors import run_cpu, run_io
+from risk_agent.heads import get_heads
+from risk_agent.inference import embed_image, embed_text
+from risk_agent.lexicon import get_lexicon_matcher, lexicon_verdict
+from risk_agent.llm import (
+    OCR_MODEL_VERSION,
+    SAFE_DEFAULT_RECOMMENDATIONS,
+    TRANSCRIPTION_MODEL,
+    analyze_risk_evidence_async,
+    audio_transcriber,
+    ocr_engine,
+    read_image_text,
+    stream_risk_evidence_async,
+    transcribe_audio_async,
+)
+from risk_agent.logic import phash_image_risk
+from risk_agent.preprocess import IMAGE_EXTENSIONS, ocr_settings_version, prepare_image
+from risk_agent.retrieval import HISTORY_COLLECTION, retrieve
+from risk_agent.routing import TieredRouter, retrieval_verdict
+from risk_agent.schema import IMAGE_VECTOR, TEXT_VECTOR
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.m4a', '.ogg')
+
+# Labels used in aggregated_text for each kind of extracted text
+SOURCE_LABELS = {"ocr": "Image Text", "transcription": "Audio Transcript", "text": "Chat Log"}
+
+# Image verdicts worth reporting ("Unknown" means nothing similar was found)
+VISUAL_RISK_LEVELS = ("High", "Medium", "Low")
+
+# Per-modality limits on how many files of one request (and across requests) run at once
+vision_slots = asyncio.Semaphore(settings.VISION_CONCURRENCY)
+ocr_slots = asyncio.Semaphore(settings.OCR_CONCURRENCY)
+audio_slots = asyncio.Semaphore(settings.AUDIO_CONCURRENCY)
+
+# OCR text, CLIP vectors and transcripts keyed by the SHA-256 of the upload
+artifact_cache = ArtifactCache(
+    max_entries=settings.ARTIFACT_CACHE_SIZE,
+    path=settings.ARTIFACT_CACHE_PATH,
+    max_disk_bytes=int(settings.ARTIFACT_CACHE_MAX_MB * 1024 * 1024),
+    max_age_seconds=settings.ARTIFACT_CACHE_MAX_AGE_DAYS * 86400,
+)
+
+# Recent LLM verdicts, reused for identical or near-identical evidence
+verdict_cache = VerdictCache(
+    max_entries=settings.VERDICT_CACHE_SIZE,
+    ttl_seconds=settings.VERDICT_CACHE_TTL_SECONDS,
+    similarity_threshold=settings.VERDICT_CACHE_SIMILARITY,
+)
+
+# Sends requests whose retrieval evidence is decisive around the LLM (or just logs it in shadow mode)
+router = TieredRouter(
+    mode=settings.ROUTING_MODE,
+    scam_threshold=settings.ROUTING_SCAM_THRESHOLD,
+    legit_threshold=settings.ROUTING_LEGIT_THRESHOLD,
+    min_similarity=settings.ROUTING_MIN_SIMILARITY,
+)
+
+# Calibrated scam classifiers trained by `python -m risk_agent.heads`, for the embedding
+# models that serve requests (text queries are encoded with max_seq_length=512)
+heads = get_heads(
+    settings.HEADS_DIR, {TEXT_VECTOR: f"{TEXT_EMBEDDING_MODEL}@512", IMAGE_VECTOR: IMAGE_EMBEDDING_MODEL}
+)
+
+# OCR text is cached per model, preprocessing and engine mode, so changing OCR_* settings re-runs OCR
+OCR_CACHE_VERSION = f"{OCR_MODEL_VERSION}:" + ocr_settings_version(
+    settings.OCR_MAX_SIDE, settings.OCR_GRAYSCALE, settings.OCR_AUTOCONTRAST, settings.OCR_CONTRAST_CUTOFF
+) + f":{ocr_engine.version}"
+
+# Transcripts depend on the chunking and silence trimming as well as the model
+TRANSCRIPT_CACHE_VERSION = f"{TRANSCRIPTION_MODEL}:{audio_transcriber.version}"
+
+# Keeps fire-and-forget memory writes alive until they finish
+_background_tasks = set()
+
+async def _no_emit(event: str, data):
+    return None
+
+def _remaining(deadline: float) -> float:
+    return max(0.0, deadline - asyncio.get_running_loop().time())
+
+def _prepare(content: bytes):
+    return prepare_image(
+        content,
+        ocr_max_side=settings.OCR_MAX_SIDE,
+        ocr_grayscale=settings.OCR_GRAYSCALE,
+        ocr_autocontrast=settings.OCR_AUTOCONTRAST,
+        ocr_contrast_cutoff=settings.OCR_CONTRAST_CUTOFF,
+    )
+
+def _decode_once(content: bytes):
+    """
+    Returns an async getter for the upload's PreparedImage. The first caller starts the
+    decode on the CPU pool; the visual and OCR phases then share the same pixels, and a
+    phase that gets cancelled does not cancel the decode for the other one.
+    """
+    task = None
+
+    async def get():
+        nonlocal task
+        if task is None:
+            task = asyncio.ensure_future(run_cpu(_prepare, content))
+        return await asyncio.shield(task)
+
+    return get
+
+class _ImageSearch:
+    """
+    Searches the CLIP vectors of one request's images in Scam Genome with a single
+    retrieve() call (one query_batch_points), sent as soon as every image has been embedded
+    or has dropped out (perceptual-hash match, failure). It runs before the text is embedded,
+    so image verdicts are reported without waiting for the text search.
+    """
+
+    def __init__(self, images: int):
+        self._outstanding = images
+        self._waiting = []
+        self._task = None
+
+    def drop(self):
+        """
+        One image that will not be searched.
+        """
+        self._outstanding -= 1
+        self._flush()
+
+    async def search(self, vector):
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append((vector, future))
+        self._outstanding -= 1
+        self._flush()
+        return await future
+
+    def _flush(self):
+        if self._outstanding == 0 and self._waiting:
+            batch, self._waiting = self._waiting, []
+            self._task = asyncio.ensure_future(self._run(batch))
+
+    @staticmethod
+    async def _run(batch):
+        try:
+            _, _, verdicts = await retrieve(image_vectors=[vector for vector, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), verdict in zip(batch, verdicts):
+            if not future.done():
+                future.set_result(verdict)
+
+async def _visual_phase(filename: str, decoded, digest: str, images: _ImageSearch):
+    """
+    (CLIP vector, visual verdict) for one image. The vector is cached by upload hash and
+    searched in Scam Genome together with the request's other images.
+
+    Near-duplicates of ingested screenshots return (None, verdict) straight from the
+    perceptual-hash index, without CLIP or a search.
+    """
+    async with vision_slots:
+        try:
+            prepared = await decoded()
+            verdict = await run_cpu(phash_image_risk, prepared.clip)
+            if verdict is not None:
+                images.drop()
+                return None, verdict
+            vector_512 = await run_io(artifact_cache.get, "clip", digest, IMAGE_EMBEDDING_MODEL)
+            if vector_512 is None:
+                # CLIP encode is batched with other requests
+                vector_512 = await embed_image(prepared.clip)
+                await run_io(artifact_cache.put, "clip", digest, IMAGE_EMBEDDING_MODEL, vector_512)
+        except Exception as v_err:
+            logger.error(f"Visual fail: {v_err}")
+            images.drop()
+            return None
+    try:
+        verdict = await images.search(vector_512)
+    except Exception as e:
+        # An unreachable Qdrant costs the visual verdict, not the vector (the heads still score it)
+        logger.error(f"Image search failed for {filename}: {e}")
+        verdict = None
+    return vector_512, verdict
+
+async def _ocr_phase(filename: str, decoded, digest: str):
+    extracted = await run_io(artifact_cache.get, "ocr", digest, OCR_CACHE_VERSION)
+    if extracted is None:
+        prepared = await decoded()
+        async with ocr_slots:
+            try:
+                extracted = await run_cpu(read_image_text, prepared.ocr)
+            except Exception as e:
+                # Failures are not cached, so the next upload of this image tries again
+                logger.error(f"Error in OCR for {filename}: {e}")
+                return None
+        # "" is cached too: a screenshot without text should not be re-OCR'd on every upload
+        await run_io(artifact_cache.put, "ocr", digest, OCR_CACHE_VERSION, extracted)
+    return extracted or None
+
+async def _transcription_phase(filename: str, content: bytes, digest: str):
+    mime = "audio/mp3"
+    if filename.lower().endswith('.wav'):
+        mime = "audio/wav"
+    elif filename.lower().endswith('.m4a'):
+        mime = "audio/mp4"
+
+    transcript = await run_io(artifact_cache.get, "transcript", digest, TRANSCRIPT_CACHE_VERSION)
+    if transcript is None:
+        async with audio_slots:
+            transcript = await transcribe_audio_async(content, mime_type=mime)
+        # Failed transcriptions come back as an "[Error ...]" marker and must not be cached
+        if transcript and not transcript.startswith("[Error"):
+            await run_io(artifact_cache.put, "transcript", digest, TRANSCRIPT_CACHE_VERSION, transcript)
+    return transcript or None
+
+async def _emitting(coro, emit, filename: str, phase: str):
+    """
+    Awaits one file phase and emits its result as soon as it is ready.
+    """
+    result = await coro
+    if result is None:
+        return result
+    if phase == "visual":
+        verdict = result[1]
+        if verdict is not None and verdict["risk_level"] in VISUAL_RISK_LEVELS:
+            await emit("visual_risk", {"filename": filename, "visual_risk": verdict})
+    else:
+        await emit("extracted_text", {
+            "filename": filename, "source": SOURCE_LABELS[phase], "text": result
+        })
+    return result
+
+async def _persist_to_memory(query_vector, aggregated_text: str, llm_analysis: dict):
+    try:
+        client = settings.get_qdrant_client()
+        await run_io(
+            client.upsert,
+            collection_name=HISTORY_COLLECTION,
+            points=[models.PointStruct(
+                id=str(uuid.uuid4()),
+                vector=query_vector.tolist(),
+                payload={
+                    "timestamp": datetime.datetime.now().isoformat(),
+                    "original_input": aggregated_text[:500],
+                    "verdict_summary": f"{llm_analysis['risk_level']} Risk ({llm_analysis['probability']*100:.0f}%)",
+                    "recommendations": llm_analysis.get("recommendations", [])
+                }
+            )]
+        )
+        logger.info("Interaction saved to Long-term Memory.")
+    except Exception as e:
+        logger.error(f"Memory persistence failed: {e}")
+
+def _classifier_scores(query_vector, image_vectors):
+    """
+    P(scam) from the trained heads for the text query and each embedded image, or None
+    when no head is trained (or nothing was embedded).
+    """
+    scores = {}
+    text_head = heads.get(TEXT_VECTOR)
+    if text_head is not None and query_vector is not None:
+        scores["text"] = text_head.probability(query_vector)
+    image_head = heads.get(IMAGE_VECTOR)
+    if image_head is not None and image_vectors:
+        scores["images"] = [
+            {"filename": filename, "probability": image_head.probability(vector)}
+            for _, filename, vector in image_vectors
+        ]
+    return scores or None
+
+def _timeout_verdict(timed_out: list) -> dict:
+    phases = ", ".join(sorted({t["phase"] for t in timed_out}))
+    return {
+        "probability": 0.0,
+        "risk_level": "Unknown",
+        "analysis": f"Analysis deadline of {settings.REQUEST_DEADLINE_SECONDS:g}s exceeded during: {phases}. Partial evidence is returned below.",
+        "recommendations": list(SAFE_DEFAULT_RECOMMENDATIONS),
+        "sources": []
+    }
+
+async def run_analysis(uploads: list, emit=None, stream_tokens: bool = False) -> dict:
+    """
+    Runs the full multimodal analysis for a list of (filename, content) uploads.
+
+    emit(event, data) is awaited as each phase finishes (per-file results, genome matches,
+    memory context, LLM tokens when stream_tokens is set), which is what the streaming
+    endpoint forwards to clients. Returns the same dict the JSON endpoint responds with.
+    """
+    emit = emit or _no_emit
+    aggregated_text = ""
+    visual_evidence = []
+    image_vectors = []
+    memory_context = ""
+    similar_text_cases = []
+    timed_out = []
+    started = asyncio.get_running_loop().time()
+    deadline = started + settings.REQUEST_DEADLINE_SECONDS
+    inputs_processed = 0
+
+    # --- PHASE 1: PER-FILE EXTRACTION (concurrent across files and modalities) ---
+    # Each task is tagged with (file index, filename, phase) so results keep upload order.
+    tasks = {}
+    text_sections = {}
+    image_digests = []
+    images = _ImageSearch(sum(filename.lower().endswith(IMAGE_EXTENSIONS) for filename, _ in uploads))
+
+    def schedule(coro, index, filename, phase):
+        task = asyncio.create_task(_emitting(coro, emit, filename, phase))
+        tasks[task] = (index, filename, phase)
+
+    for index, (filename, content) in enumerate(uploads):
+        lower_name = filename.lower()
+        digest = content_digest(content)
+
+        # --- IMAGE PROCESSING ---
+        if lower_name.endswith(IMAGE_EXTENSIONS):
+            image_digests.append(digest)
+            decoded = _decode_once(content)
+            schedule(_visual_phase(filename, decoded, digest, images), index, filename, "visual")
+            schedule(_ocr_phase(filename, decoded, digest), index, filename, "ocr")
+
+        # --- AUDIO PROCESSING ---
+        elif lower_name.endswith(AUDIO_EXTENSIONS):
+            schedule(_transcription_phase(filename, content, digest), index, filename, "transcription")
+
+        # --- TEXT FILE PROCESSING ---
+        elif filename.endswith('.txt'):
+            text = content.decode('utf-8', errors='replace').strip()
+            if text:
+                text_sections[index] = (filename, "text", text)
+                await emit("extracted_text", {"filename": filename, "source": SOURCE_LABELS["text"], "text": text})
+
+    if tasks:
+        done, pending = await asyncio.wait(tasks.keys(), timeout=_remaining(deadline))
+        for task in pending:
+            task.cancel()
+            index, filename, phase = tasks[task]
+            timed_out.append({"filename": filename, "phase": phase})
+            logger.warning(f"Deadline exceeded: {phase} for {filename}")
+            await emit("timeout", {"filename": filename, "phase": phase})
+
+        for task in sorted(done, key=lambda t: tasks[t][0]):
+            index, filename, phase = tasks[task]
+            try:
+                result = task.result()
+            except Exception as e:
+                logger.error(f"{phase} failed for {filename}: {e}")
+                continue
+            if result is None:
+                continue
+            if phase == "visual":
+                vector, verdict = result
+                if verdict is not None and verdict["risk_level"] in VISUAL_RISK_LEVELS:
+                    visual_evidence.append((index, {"filename": filename, "visual_risk": verdict}))
+                if vector is not None:
+                    image_vectors.append((index, filename, vector))
+            else:
+                text_sections[index] = (filename, phase, result)
+
+    for index in sorted(text_sections):
+        filename, phase, text = text_sections[index]
+        aggregated_text += f"\n--- Source: {filename} ({SOURCE_LABELS[phase]}) ---\n{text}\n"
+        inputs_processed += 1
+    # The extracted text alone: words in the "--- Source" headers (filenames) are not evidence,
+    # and the text head is trained on bare dialogue, so this is also what gets embedded
+    section_text = "\n\n".join(text_sections[index][2] for index in sorted(text_sections))
+
+    # --- LEXICON FAST PATH: unmistakable scam scripts skip text retrieval and the LLM ---
+    lexicon_match = None
+    if section_text.strip() and settings.LEXICON_THRESHOLD > 0:
+        lexicon_match = get_lexicon_matcher(settings.LEXICON_PATH).match(section_text, settings.LEXICON_THRESHOLD)
+        if lexicon_match is not None:
+            await emit("lexicon_match", lexicon_match)
+
+    # --- PHASE 2: RETRIEVAL (Scam Genome text and user history, concurrently) ---
+    # Images were already searched (and reported) in phase 1, in one batch of their own.
+    query_vector = None
+    search_text = bool(aggregated_text.strip()) and lexicon_match is None
+    if search_text:
+        try:
+            search_query = section_text[:2000]
+            query_vector = await asyncio.wait_for(
+                embed_text(search_query), timeout=_remaining(deadline)
+            )
+            similar_text_cases, memory_context, _ = await asyncio.wait_for(
+                retrieve(query_vector), timeout=_remaining(deadline)
+            )
+            await emit("genome_matches", similar_text_cases)
+            await emit("memory_context", {"memory_context": memory_context})
+        except asyncio.TimeoutError:
+            timed_out.append({"filename": None, "phase": "retrieval"})
+            logger.warning("Deadline exceeded during retrieval")
+            await emit("timeout", {"filename": None, "phase": "retrieval"})
+        except Exception as e:
+            # An unreachable Qdrant leaves the evidence lists empty rather than failing the request
+            logger.error(f"Retrieval failed: {e}")
+    elif lexicon_match is not None:
+        # The verdict needs no retrieval, but the interaction still goes to long-term memory
+        try:
+            query_vector = await asyncio.wait_for(
+                embed_text(section_text[:2000]), timeout=_remaining(deadline)
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Deadline exceeded embedding lexicon-matched evidence; not saved to memory")
+        except Exception as e:
+            logger.error(f"Embedding lexicon-matched evidence failed: {e}")
+
+    # Visual evidence in upload order, whether it came from the hash index or from retrieval
+    visual_evidence = [item for _, item in sorted(visual_evidence, key=lambda pair: pair[0])]
+
+    classifier = _classifier_scores(query_vector, image_vectors)
+
+    # --- PHASE 3: FINAL REASONING (LLM) ---
+    visual_summary = ""
+    for item in visual_evidence:
+        v = item['visual_risk']
+        visual_summary += f"- Image '{item['filename']}' detected as {v['risk_level']} Risk. Analysis: {v['analysis']}\n"
+
+    evidence_content = f"""
+        VISUAL EVIDENCE FOUND:
+        {visual_summary if visual_summary else "No specific visual scam patterns detected."}
+
+        TEXTUAL/AUDIO EVIDENCE:
+        {aggregated_text if aggregated_text else "No readable text found."}
+        """
+
+    final_user_content = f"""
+        {memory_context if memory_context else ""}
+        {evidence_content}"""
+
+    # The cache key leaves out memory_context: it lists earlier reports of this same
+    # evidence (with timestamps), so it changes on every repeat submission.
+    case_ids = [case["id"] for case in similar_text_cases]
+    route = None
+    if lexicon_match is not None:
+        llm_analysis = lexicon_verdict(lexicon_match, settings.LEXICON_THRESHOLD)
+        llm_analysis["recommendations"] += SAFE_DEFAULT_RECOMMENDATIONS
+        cache_level, verdict_source = None, "lexicon"
+        logger.info(f"Lexicon fast path: red-flag score {lexicon_match['score']:g}, skipping the LLM")
+    else:
+        llm_analysis, cache_level = verdict_cache.get(evidence_content, case_ids, query_vector, image_digests)
+        verdict_source = f"cache:{cache_level}" if cache_level else "llm"
+        if llm_analysis is None and router.mode != "off":
+            route = router.route(similar_text_cases, visual_evidence, classifier)
+            if route["use"]:
+                llm_analysis = retrieval_verdict(route, similar_text_cases, visual_evidence)
+                llm_analysis["recommendations"] += SAFE_DEFAULT_RECOMMENDATIONS
+                verdict_source = "retrieval"
+                logger.info(f"Retrieval evidence is decisive (score {route['score']:.2f}), skipping the LLM")
+
+    llm_timed_out = False
+    if llm_analysis is None:
+        if stream_tokens:
+            async def on_token(text):
+                await emit("llm_token", {"text": text})
+
+            async def on_reset(error):
+                # The stream broke mid-answer: clients drop the tokens so far before the retry
+                await emit("llm_reset", {"error": error})
+            llm_call = stream_risk_evidence_async(final_user_content, similar_text_cases, on_token, on_reset)
+        else:
+            llm_call = analyze_risk_evidence_async(final_user_content, similar_text_cases)
+        try:
+            llm_analysis = await asyncio.wait_for(llm_call, timeout=_remaining(deadline))
+            if llm_analysis.get("risk_level") != "Unknown":
+                verdict_cache.put(evidence_content, case_ids, query_vector, llm_analysis, image_digests)
+            if route is not None:
+                router.compare(route, llm_analysis)
+        except asyncio.TimeoutError:
+            timed_out.append({"filename": None, "phase": "llm"})
+            logger.warning("Deadline exceeded during LLM reasoning")
+            await emit("timeout", {"filename": None, "phase": "llm"})
+            llm_analysis = _timeout_verdict(timed_out)
+            llm_timed_out = True
+    elif cache_level:
+        logger.info(f"Reusing cached verdict ({cache_level} match)")
+
+    tier = "timeout" if llm_timed_out else verdict_source.split(":")[0]
+    router.record(tier, asyncio.get_running_loop().time() - started)
+
+    # --- PHASE 4: PERSIST TO MEMORY (does not hold up the response) ---
+    if query_vector is not None and not llm_timed_out:
+        task = asyncio.create_task(_persist_to_memory(query_vector, aggregated_text, llm_analysis))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    return {
+        "inputs_processed": inputs_processed,
+        "final_verdict": llm_analysis,
+        "verdict_source": verdict_source,
+        "classifier": classifier,
+        "partial": bool(timed_out),
+        "timed_out": timed_out,
+        "detailed_evidence": {
+            "visual_analysis": visual_evidence,
+            "text_matches": similar_text_cases,
+            "aggregated_text": aggregated_text,
+            "lexicon_match": lexicon_match,
+            "routing": route,
+            "memory_context": memory_context
+        }
+    }
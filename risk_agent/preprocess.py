@@ -0,0 +1,99 @@
+import io
+
+import numpy as np
+from PIL import Image, ImageOps
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp")
+# clip-ViT-B-32 resizes the short side to 224 before its center crop, so handing it an image
+# of exactly that size gives the same input without a second full-resolution resize
+CLIP_IMAGE_SIZE = 224
+
+
+class PreparedImage:
+    """
+    One upload decoded once, with a view for each consumer:
+    clip is an RGB PIL image sized for CLIP, ocr a uint8 array (H x W, or H x W x 3 when not
+    grayscale) that EasyOCR reads directly. Neither is re-encoded to bytes.
+    """
+
+    def __init__(self, clip, ocr, original_size, frames=1):
+        self.clip = clip
+        self.ocr = ocr
+        self.original_size = original_size
+        self.frames = frames
+
+
+def _to_rgb(image):
+    # Transparent screenshots/stickers would turn black on a plain convert("RGB")
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def decode_image(data, max_side=None):
+    """
+    Decodes image bytes into an upright RGB image. Animated GIF/WebP/PNG use their first
+    frame. With max_side, JPEGs are decoded at a reduced scale when that is enough.
+    """
+    image = Image.open(io.BytesIO(data))
+    frames = getattr(image, "n_frames", 1)
+    if frames > 1:
+        image.seek(0)
+    if max_side and image.format == "JPEG":
+        scale = max_side / max(image.size)
+        if scale < 0.5:
+            image.draft("RGB", (round(image.width * scale), round(image.height * scale)))
+    image = ImageOps.exif_transpose(image)
+    return _to_rgb(image), frames
+
+
+def clip_view(image, size=CLIP_IMAGE_SIZE):
+    """
+    The image with its short side scaled down to `size` (never upscaled).
+    """
+    scale = size / min(image.size)
+    if scale >= 1:
+        return image
+    return image.resize(
+        (max(size, round(image.width * scale)), max(size, round(image.height * scale))),
+        Image.BICUBIC,
+    )
+
+
+def ocr_view(image, max_side=2048, grayscale=True, autocontrast=True, contrast_cutoff=1.0):
+    """
+    Array for EasyOCR: long side capped at max_side, optionally grayscale and
+    contrast-stretched (ignoring the darkest/brightest contrast_cutoff percent).
+    """
+    if max_side and max(image.size) > max_side:
+        scale = max_side / max(image.size)
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+    if grayscale:
+        image = image.convert("L")
+    if autocontrast:
+        image = ImageOps.autocontrast(image, cutoff=contrast_cutoff)
+    return np.asarray(image)
+
+
+def prepare_image(data, ocr_max_side=2048, ocr_grayscale=True, ocr_autocontrast=True, ocr_contrast_cutoff=1.0):
+    """
+    Decodes an upload once and builds the CLIP and OCR views from the same pixels.
+    """
+    image, frames = decode_image(data, max_side=ocr_max_side)
+    return PreparedImage(
+        clip=clip_view(image),
+        ocr=ocr_view(image, ocr_max_side, ocr_grayscale, ocr_autocontrast, ocr_contrast_cutoff),
+        original_size=image.size,
+        frames=frames,
+    )
+
+
+def ocr_settings_version(max_side, grayscale, autocontrast, contrast_cutoff):
+    """
+    Short tag of the OCR preprocessing, stored with cached OCR text so changing it
+    invalidates earlier results.
+    """
+    return f"max{max_side}-{'gray' if grayscale else 'rgb'}-ac{contrast_cutoff if autocontrast else 'off'}"
@@ -0,0 +1,147 @@
+import datetime
+import hashlib
+import json
+import os
+from pathlib import Path
+import re
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from risk_agent.ingestion import PartWriter, chunked, content_point_id
+
+RECORDS_FILE = "records.parquet"
+MANIFEST_FILE = "manifest.json"
+RECORD_FIELDS = ("text", "original_text", "category", "risk_label", "scam_type", "personality", "description")
+RECORD_SCHEMA = pa.schema([("point_id", pa.string())] + [(field, pa.string()) for field in RECORD_FIELDS])
+
+
+def file_fingerprint(path, previous=None):
+    """
+    {"size", "mtime_ns", "sha256"} of a source file, or None if it is missing. The hash
+    in previous is reused when size and mtime are unchanged, so unchanged files are not
+    re-read; a touched but identical file keeps its hash.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    stat = path.stat()
+    fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if previous and all(previous.get(key) == value for key, value in fingerprint.items()):
+        return {**fingerprint, "sha256": previous["sha256"]}
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return {**fingerprint, "sha256": digest.hexdigest()}
+
+
+def _hashes(files):
+    return {name: fingerprint and fingerprint["sha256"] for name, fingerprint in files.items()}
+
+
+class ProcessedStore:
+    """
+    Parsed corpus and its embeddings under data/processed, so a lost collection can be
+    rebuilt without re-downloading, re-parsing or re-embedding anything:
+
+        <directory>/records.parquet                  normalized records, one row per dialogue
+        <directory>/manifest.json                    the sources records.parquet was parsed from
+        <directory>/embeddings/<model_version>/      vectors + payloads keyed by content point id
+    """
+
+    def __init__(self, directory):
+        self.path = Path(directory)
+
+    @property
+    def records_path(self):
+        return self.path / RECORDS_FILE
+
+    @property
+    def manifest_path(self):
+        return self.path / MANIFEST_FILE
+
+    def has_records(self):
+        return self.records_path.exists()
+
+    def read_manifest(self):
+        if not self.manifest_path.exists():
+            return {}
+        return json.loads(self.manifest_path.read_text())
+
+    def fingerprint_sources(self, paths, revisions=None):
+        """
+        {"files": {name: file_fingerprint}, "revisions": {dataset: revision}} for the raw
+        files and remote datasets the records come from (a revision of None means unknown).
+        """
+        previous = (self.read_manifest().get("sources") or {}).get("files", {})
+        files = {}
+        for path in paths:
+            name = Path(path).name
+            files[name] = file_fingerprint(path, previous.get(name))
+        return {"files": files, "revisions": dict(revisions or {})}
+
+    def records_current(self, sources):
+        """
+        True when records.parquet was parsed from exactly these sources. File contents are
+        compared by hash; an unknown revision (e.g. offline) does not count as a change.
+        """
+        stored = self.read_manifest().get("sources")
+        if not self.has_records() or stored is None:
+            return False
+        if _hashes(stored.get("files", {})) != _hashes(sources["files"]):
+            return False
+        return all(
+            revision is None or stored.get("revisions", {}).get(dataset) == revision
+            for dataset, revision in sources["revisions"].items()
+        )
+
+    def iter_records(self, batch_size=1024):
+        """
+        Streams the stored records back one row group at a time.
+        """
+        parquet = pq.ParquetFile(self.records_path)
+        for batch in parquet.iter_batches(batch_size=batch_size, columns=list(RECORD_FIELDS)):
+            yield from batch.to_pylist()
+
+    def caching_records(self, records, batch_size=1024, keep=None, sources=None):
+        """
+        Passes records through while writing them to records.parquet. The file only
+        replaces the previous one once the source is exhausted (and keep(), if given,
+        agrees), so an interrupted parse never leaves a truncated corpus behind. sources
+        (from fingerprint_sources) is saved alongside for records_current().
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.records_path.with_suffix(".parquet.tmp")
+        completed = False
+        writer = pq.ParquetWriter(tmp_path, RECORD_SCHEMA)
+        try:
+            for batch in chunked(records, batch_size):
+                rows = [
+                    {"point_id": content_point_id("text", record["text"]),
+                     **{field: record.get(field) for field in RECORD_FIELDS}}
+                    for record in batch
+                ]
+                writer.write_table(pa.Table.from_pylist(rows, schema=RECORD_SCHEMA))
+                yield from batch
+            completed = keep is None or keep()
+        finally:
+            writer.close()
+            if completed:
+                tmp_path.replace(self.records_path)
+                self._write_manifest(sources)
+            else:
+                tmp_path.unlink(missing_ok=True)
+
+    def _write_manifest(self, sources):
+        manifest = {"written_at": datetime.datetime.now().isoformat(), "sources": sources}
+        tmp_path = self.manifest_path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(manifest, indent=2))
+        os.replace(tmp_path, self.manifest_path)
+
+    def embeddings(self, model_version):
+        """
+        The embedding parts for one model version (e.g. "BAAI/bge-base-en-v1.5@512").
+        """
+        slug = re.sub(r"[^A-Za-z0-9.@]+", "_", model_version).strip("_")
+        return PartWriter(self.path / "embeddings" / slug)
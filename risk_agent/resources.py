@@ -0,0 +1,90 @@
+import threading
+import time
+
+from loguru import logger
+
+NOT_LOADED = "not_loaded"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class LazyResource:
+    """
+    A heavy object (model, OCR reader, database client) created by factory() on first get().
+    Concurrent callers wait for a single load; a failed load is retried on the next get().
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.state = NOT_LOADED
+        self.load_seconds = None
+        self.error = None
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.state == READY:
+            return self._value
+        with self._lock:
+            if self.state == READY:
+                return self._value
+            self.state = LOADING
+            started = time.perf_counter()
+            try:
+                value = self.factory()
+            except Exception as e:
+                self.state, self.error = FAILED, str(e)
+                self.load_seconds = round(time.perf_counter() - started, 3)
+                logger.error(f"Failed to load {self.name}: {e}")
+                raise
+            self._value = value
+            self.state, self.error = READY, None
+            self.load_seconds = round(time.perf_counter() - started, 3)
+            logger.info(f"{self.name} ready in {self.load_seconds:.2f}s")
+            return value
+
+    def status(self):
+        return {"state": self.state, "load_seconds": self.load_seconds, "error": self.error}
+
+
+_resources = {}
+
+
+def register(name, factory):
+    """
+    Declares a lazily created resource; warmup() and readiness() cover every registered one.
+    """
+    resource = _resources.get(name)
+    if resource is None:
+        resource = _resources[name] = LazyResource(name, factory)
+    return resource
+
+
+def warmup(names=None):
+    """
+    Loads the named (default: all) resources in parallel threads and returns readiness().
+    """
+    selected = [r for name, r in _resources.items() if names is None or name in names]
+
+    def load(resource):
+        try:
+            resource.get()
+        except Exception:
+            pass  # recorded in the resource status
+
+    threads = [threading.Thread(target=load, args=(r,), name=f"warmup-{r.name}") for r in selected]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return readiness()
+
+
+def readiness():
+    statuses = {name: resource.status() for name, resource in _resources.items()}
+    return {
+        "ready": all(status["state"] == READY for status in statuses.values()),
+        "resources": statuses,
+    }
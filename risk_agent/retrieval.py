@@ -0,0 +1,165 @@
+import asyncio
+
+from loguru import logger
+import numpy as np
+from qdrant_client.http import models
+
+from risk_agent.config import settings
+from risk_agent.executors import run_cpu, run_io
+from risk_agent.logic import genome_snapshot, image_risk_from_hits
+from risk_agent.schema import IMAGE_VECTOR, SCAM_GENOME_COLLECTION, TEXT_VECTOR, search_params
+
+HISTORY_COLLECTION = "user_history"
+
+GENOME_TEXT_LIMIT = 5
+GENOME_IMAGE_LIMIT = 1
+HISTORY_LIMIT = 3
+HISTORY_SCORE_THRESHOLD = 0.85  # Only bring back high-confidence matches
+
+
+def genome_requests(text_vector=None, image_vectors=()):
+    """
+    One QueryRequest per search against Scam Genome: the text query first (if any),
+    then one per image, in the order given.
+    """
+    tuning = search_params(settings.GENOME_INDEX)
+    requests = []
+    if text_vector is not None:
+        requests.append(models.QueryRequest(
+            query=np.asarray(text_vector).tolist(),
+            using=TEXT_VECTOR,
+            limit=GENOME_TEXT_LIMIT,
+            params=tuning,
+            with_payload=True,
+        ))
+    for vector in image_vectors:
+        requests.append(models.QueryRequest(
+            query=np.asarray(vector).tolist(),
+            using=IMAGE_VECTOR,
+            limit=GENOME_IMAGE_LIMIT,
+            params=tuning,
+            with_payload=True,
+        ))
+    return requests
+
+
+def text_cases_from_hits(hits):
+    """
+    Turns Scam Genome text matches into the similar_text_cases passed to the LLM.
+    """
+    cases = []
+    for hit in hits:
+        payload = hit.payload or {}
+        # Try multiple common keys for text content
+        raw_text = (
+            payload.get("original_text") or
+            payload.get("text") or
+            payload.get("page_content") or
+            payload.get("content") or
+            payload.get("description") or
+            "No text content available"
+        )
+
+        # specific fix: if it's a list (some embeddings do this), join it
+        if isinstance(raw_text, list):
+            raw_text = " ".join(str(x) for x in raw_text)
+
+        # Clean up whitespace
+        clean_text = " ".join(str(raw_text).split())
+
+        cases.append({
+            "id": str(hit.id),
+            "text_snippet": clean_text[:300],
+            "risk_label": payload.get("risk_label", "unknown"),
+            "score": float(hit.score)
+        })
+    return cases
+
+
+def memory_context_from_hits(hits):
+    if not hits:
+        return ""
+    memory_context = "PAST USER REPORTS DETECTED:\n"
+    for hit in hits:
+        prev_verdict = hit.payload.get('verdict_summary', 'No summary')
+        memory_context += f"- Previously seen on {hit.payload.get('timestamp', 'Unknown date')}. Verdict: {prev_verdict}\n"
+    return memory_context
+
+
+def _search_snapshot(snapshot, text_vector, image_vectors):
+    """
+    Same searches as genome_requests, answered from the in-process snapshot.
+    """
+    results = []
+    if text_vector is not None:
+        results.append(snapshot.query(text_vector, using=TEXT_VECTOR, limit=GENOME_TEXT_LIMIT))
+    for vector in image_vectors:
+        results.append(snapshot.query(vector, using=IMAGE_VECTOR, limit=GENOME_IMAGE_LIMIT))
+    return results
+
+
+async def _search_genome(client, text_vector, image_vectors):
+    """
+    Scam Genome hits for the text query (if any) followed by one list per image.
+    """
+    snapshot = genome_snapshot()
+    if snapshot is not None:
+        return await run_cpu(_search_snapshot, snapshot, text_vector, image_vectors)
+    responses = await run_io(
+        client.query_batch_points,
+        collection_name=SCAM_GENOME_COLLECTION,
+        requests=genome_requests(text_vector, image_vectors),
+    )
+    return [response.points for response in responses]
+
+
+async def _search_history(client, text_vector):
+    try:
+        history = await run_io(
+            client.query_points,
+            collection_name=HISTORY_COLLECTION,
+            query=np.asarray(text_vector).tolist(),
+            limit=HISTORY_LIMIT,
+            score_threshold=HISTORY_SCORE_THRESHOLD,
+            search_params=search_params(settings.HISTORY_INDEX),
+        )
+    except Exception as e:
+        # Memory is a bonus: a slow or unreachable Qdrant must not cost the genome evidence
+        logger.error(f"User history search failed: {e}")
+        return ""
+    return memory_context_from_hits(history.points)
+
+
+async def retrieve(text_vector=None, image_vectors=()):
+    """
+    Runs every search of one request in a single round-trip per collection: text and all
+    images go to Scam Genome as one query_batch_points call (or to the local snapshot when
+    RETRIEVAL_BACKEND=snapshot), concurrently with the user_history lookup (a separate
+    collection, so it cannot share the batch).
+
+    Returns (similar_text_cases, memory_context, image_risks), image_risks in the order
+    of image_vectors. The request pipeline makes two calls, one with all images as soon as
+    they are embedded and one with the text, so image verdicts do not wait for the text.
+    """
+    client = settings.get_qdrant_client()
+    image_vectors = list(image_vectors)
+    if text_vector is None and not image_vectors:
+        return [], "", []
+
+    genome_call = _search_genome(client, text_vector, image_vectors)
+    if text_vector is not None:
+        results, memory_context = await asyncio.gather(
+            genome_call, _search_history(client, text_vector)
+        )
+    else:
+        results = await genome_call
+        memory_context = ""
+
+    # Fan the results back out: text hits first, then one list per image
+    if text_vector is not None:
+        similar_text_cases = text_cases_from_hits(results[0])
+        results = results[1:]
+    else:
+        similar_text_cases = []
+    image_risks = [image_risk_from_hits(hits) for hits in results]
+    return similar_text_cases, memory_context, image_risks
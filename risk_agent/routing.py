@@ -0,0 +1,191 @@
+from collections import Counter
+import threading
+
+from loguru import logger
+
+from risk_agent.metrics import LatencyWindow
+
+ROUTING_MODES = ("off", "shadow", "on")
+# How much the text neighbours and the screenshots count when both are present
+TEXT_WEIGHT = 0.6
+VISUAL_WEIGHT = 0.4
+# Trained heads (risk_agent.heads), when present, count like one more signal
+CLASSIFIER_WEIGHT = 0.5
+LABEL_SIGN = {"scam": 1.0, "legit": -1.0}
+
+
+def _confidence(similarity, min_similarity):
+    """
+    0 at min_similarity (or below), 1 at a perfect match.
+    """
+    return min(1.0, max(0.0, (similarity - min_similarity) / (1.0 - min_similarity)))
+
+
+def text_signal(text_cases, min_similarity=0.5):
+    """
+    P(scam) from the Scam Genome neighbours: a similarity-weighted label vote, pulled
+    towards 0.5 as the neighbours get less similar. None without labelled neighbours.
+    """
+    labelled = [case for case in text_cases if case.get("risk_label") in LABEL_SIGN]
+    if not labelled:
+        return None
+    total = sum(max(case["score"], 1e-6) for case in labelled)
+    vote = sum(LABEL_SIGN[case["risk_label"]] * max(case["score"], 1e-6) for case in labelled) / total
+    mean_similarity = total / len(labelled)
+    return 0.5 + 0.5 * vote * _confidence(mean_similarity, min_similarity)
+
+
+def visual_signal(visual_evidence, min_similarity=0.5):
+    """
+    P(scam) from the per-image verdicts (High = known scam screen, Low = known legit screen,
+    weighted by match similarity). None when no image matched either way.
+    """
+    signals = []
+    for item in visual_evidence:
+        verdict = item["visual_risk"]
+        sign = {"High": 1.0, "Low": -1.0}.get(verdict.get("risk_level"))
+        if sign is not None:
+            signals.append(0.5 + 0.5 * sign * _confidence(float(verdict.get("probability", 0.0)), min_similarity))
+    return sum(signals) / len(signals) if signals else None
+
+
+def classifier_signal(classifier):
+    """
+    Mean calibrated P(scam) of the trained heads' scores (see pipeline._classifier_scores).
+    """
+    if not classifier:
+        return None
+    scores = [classifier["text"]] if classifier.get("text") is not None else []
+    scores += [image["probability"] for image in classifier.get("images", [])]
+    return sum(scores) / len(scores) if scores else None
+
+
+def route_score(text_cases, visual_evidence, min_similarity=0.5, classifier=None):
+    """
+    {"score": P(scam) or None, "text": ..., "visual": ..., "classifier": ...} combining
+    the available signals.
+    """
+    signals = {
+        "text": (text_signal(text_cases, min_similarity), TEXT_WEIGHT),
+        "visual": (visual_signal(visual_evidence, min_similarity), VISUAL_WEIGHT),
+        "classifier": (classifier_signal(classifier), CLASSIFIER_WEIGHT),
+    }
+    parts = [(p, w) for p, w in signals.values() if p is not None]
+    score = sum(p * w for p, w in parts) / sum(w for _, w in parts) if parts else None
+    route = {"score": round(score, 4) if score is not None else None}
+    route.update({name: round(p, 4) if p is not None else None for name, (p, _) in signals.items()})
+    return route
+
+
+def retrieval_verdict(route, text_cases, visual_evidence):
+    """
+    Verdict (same shape as the LLM's) for a decisive route: High above the scam threshold,
+    Low below the legit one.
+    """
+    scam = route["decision"] == "High"
+    matching = [case for case in text_cases if case.get("risk_label") == ("scam" if scam else "legit")]
+    reasons = []
+    if matching:
+        top = max(case["score"] for case in matching)
+        reasons.append(
+            f"{len(matching)} of {len(text_cases)} closest Scam Genome cases are labelled "
+            f"{'scam' if scam else 'legit'} (best similarity {top:.2f})"
+        )
+    images = [item["filename"] for item in visual_evidence if item["visual_risk"].get("risk_level") == route["decision"]]
+    if images:
+        reasons.append(f"screenshot(s) {', '.join(images)} match known {'scam' if scam else 'legitimate'} screens")
+    analysis = "; ".join(reasons) or "Retrieval evidence is decisive"
+    return {
+        "probability": route["score"],
+        "risk_level": route["decision"],
+        "analysis": f"{'Likely scam' if scam else 'Likely legitimate'}: {analysis}.",
+        "recommendations": [],
+        "sources": [f"genome: {case['id']}" for case in matching],
+    }
+
+
+class TieredRouter:
+    """
+    Decides whether retrieval evidence alone settles a request. Decisive scores (at or above
+    scam_threshold, at or below legit_threshold) get a retrieval-only verdict in "on" mode;
+    in "shadow" mode the LLM still answers and the router logs whether it agreed.
+
+    Also keeps per-tier traffic and latency for every verdict source.
+    """
+
+    def __init__(self, mode="shadow", scam_threshold=0.9, legit_threshold=0.1, min_similarity=0.5):
+        if mode not in ROUTING_MODES:
+            raise ValueError(f"Unknown routing mode {mode!r}, expected one of {', '.join(ROUTING_MODES)}")
+        self.mode = mode
+        self.scam_threshold = scam_threshold
+        self.legit_threshold = legit_threshold
+        self.min_similarity = min_similarity
+        self._lock = threading.Lock()
+        self.tiers = {}
+        self.shadow = Counter()
+
+    def route(self, text_cases, visual_evidence, classifier=None):
+        """
+        route_score() plus "decision": "High", "Low" or None (ambiguous, ask the LLM), and
+        "use": whether the decision replaces the LLM.
+        """
+        route = route_score(text_cases, visual_evidence, self.min_similarity, classifier)
+        score = route["score"]
+        decision = None
+        if score is not None and score >= self.scam_threshold:
+            decision = "High"
+        elif score is not None and score <= self.legit_threshold:
+            decision = "Low"
+        route["decision"] = decision
+        route["use"] = self.mode == "on" and decision is not None
+        return route
+
+    def compare(self, route, llm_verdict):
+        """
+        Shadow bookkeeping: would the retrieval-only verdict have matched the LLM's?
+        """
+        if self.mode == "off" or llm_verdict.get("risk_level") == "Unknown":
+            return
+        with self._lock:
+            if route["decision"] is None:
+                self.shadow["ambiguous"] += 1
+                return
+            self.shadow["decisive"] += 1
+            agreed = route["decision"] == llm_verdict.get("risk_level")
+            self.shadow["agreed" if agreed else "disagreed"] += 1
+        logger.info(
+            f"Routing shadow: retrieval said {route['decision']} (score {route['score']:.2f}), "
+            f"LLM said {llm_verdict.get('risk_level')} -> {'agree' if agreed else 'DISAGREE'}"
+        )
+
+    def record(self, tier, seconds):
+        """
+        One finished request answered by tier ("lexicon", "cache", "retrieval", "llm", ...).
+        """
+        with self._lock:
+            window = self.tiers.get(tier)
+            if window is None:
+                window = self.tiers[tier] = LatencyWindow()
+        window.record(seconds)
+
+    def stats(self):
+        with self._lock:
+            tiers = dict(self.tiers)
+            shadow = Counter(self.shadow)
+        snapshots = {tier: window.snapshot() for tier, window in tiers.items()}
+        total = sum(snapshot["count"] for snapshot in snapshots.values())
+        for snapshot in snapshots.values():
+            snapshot["share"] = round(snapshot["count"] / total, 4) if total else None
+        decisive = shadow["decisive"]
+        return {
+            "mode": self.mode,
+            "scam_threshold": self.scam_threshold,
+            "legit_threshold": self.legit_threshold,
+            "tiers": snapshots,
+            "shadow": {
+                "decisive": decisive,
+                "ambiguous": shadow["ambiguous"],
+                "agreed": shadow["agreed"],
+                "agreement_rate": round(shadow["agreed"] / decisive, 4) if decisive else None,
+            },
+        }
@@ -0,0 +1,150 @@
+from qdrant_client import models
+
+# Scam Genome keeps text and image evidence in one collection, each modality in its own
+# named vector space, so a search only ever scans vectors of the matching model.
+SCAM_GENOME_COLLECTION = "Scam Genome"
+
+TEXT_VECTOR = "text"    # BGE-base (BAAI/bge-base-en-v1.5)
+TEXT_VECTOR_SIZE = 768
+IMAGE_VECTOR = "image"  # CLIP (clip-ViT-B-32)
+IMAGE_VECTOR_SIZE = 512
+
+
+def genome_vectors_config():
+    """
+    Named vector spaces of the Scam Genome collection.
+    """
+    return {
+        TEXT_VECTOR: models.VectorParams(size=TEXT_VECTOR_SIZE, distance=models.Distance.COSINE),
+        IMAGE_VECTOR: models.VectorParams(size=IMAGE_VECTOR_SIZE, distance=models.Distance.COSINE),
+    }
+
+
+def has_named_vectors(client, collection_name=SCAM_GENOME_COLLECTION):
+    """
+    True if the collection already uses the text/image named-vector schema.
+    """
+    vectors = client.get_collection(collection_name).config.params.vectors
+    return isinstance(vectors, dict) and TEXT_VECTOR in vectors and IMAGE_VECTOR in vectors
+
+
+def is_image_point(payload):
+    """
+    Image evidence points written by ingest_images (older ones only carry the payload markers).
+    """
+    payload = payload or {}
+    return payload.get("type") == "screenshot" or payload.get("category") == "image_evidence"
+
+
+# --- INDEX TUNING ---
+# `tuning` dicts come from Settings.GENOME_INDEX / Settings.HISTORY_INDEX.
+
+def override_tuning(tuning, hnsw_m=None, ef_construct=None, hnsw_ef=None, quantization=None,
+                    on_disk=None, on_disk_payload=None, payload_indexes=None):
+    """
+    Applies command-line overrides on top of the Settings values.
+    """
+    overrides = {
+        "hnsw_m": hnsw_m,
+        "hnsw_ef_construct": ef_construct,
+        "hnsw_ef": hnsw_ef,
+        "quantization": quantization.lower() if quantization else None,
+        "on_disk": on_disk,
+        "on_disk_payload": on_disk_payload,
+        "payload_indexes": (
+            [f.strip() for f in payload_indexes.split(",") if f.strip()] if payload_indexes is not None else None
+        ),
+    }
+    return {**tuning, **{k: v for k, v in overrides.items() if v is not None}}
+
+
+def hnsw_config(tuning):
+    if tuning.get("hnsw_m") is None and tuning.get("hnsw_ef_construct") is None:
+        return None
+    return models.HnswConfigDiff(m=tuning.get("hnsw_m"), ef_construct=tuning.get("hnsw_ef_construct"))
+
+
+def quantization_config(tuning, allow_disable=False):
+    """
+    Scalar (int8, ~4x smaller) or binary (~32x smaller) quantization, kept in RAM while the
+    original vectors can live on disk. allow_disable returns Disabled for update_collection.
+    """
+    kind = tuning.get("quantization", "none")
+    if kind == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+            )
+        )
+    if kind == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    if kind != "none":
+        raise ValueError(f"Unknown quantization '{kind}' (expected none, scalar or binary)")
+    return models.Disabled.DISABLED if allow_disable else None
+
+
+def search_params(tuning):
+    """
+    Query-time parameters: HNSW ef and rescoring with the original vectors when quantized.
+    """
+    quantized = tuning.get("quantization", "none") != "none"
+    if tuning.get("hnsw_ef") is None and not quantized:
+        return None
+    return models.SearchParams(
+        hnsw_ef=tuning.get("hnsw_ef"),
+        quantization=models.QuantizationSearchParams(rescore=True) if quantized else None,
+    )
+
+
+def _with_on_disk(vectors_config, on_disk):
+    if isinstance(vectors_config, dict):
+        return {
+            name: params.model_copy(update={"on_disk": on_disk})
+            for name, params in vectors_config.items()
+        }
+    return vectors_config.model_copy(update={"on_disk": on_disk})
+
+
+def ensure_payload_indexes(client, collection_name, tuning):
+    """
+    Keyword indexes on filterable payload fields (risk_label, category, type).
+    """
+    existing = client.get_collection(collection_name).payload_schema or {}
+    for field in tuning.get("payload_indexes", []):
+        if field not in existing:
+            client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field,
+                field_schema=models.PayloadSchemaType.KEYWORD,
+            )
+
+
+def create_collection(client, collection_name, vectors_config, tuning):
+    """
+    Creates a collection with the configured HNSW, quantization, on-disk and payload index options.
+    """
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=_with_on_disk(vectors_config, tuning.get("on_disk", False)),
+        hnsw_config=hnsw_config(tuning),
+        quantization_config=quantization_config(tuning),
+        on_disk_payload=tuning.get("on_disk_payload", False),
+    )
+    ensure_payload_indexes(client, collection_name, tuning)
+
+
+def apply_tuning(client, collection_name, tuning):
+    """
+    Applies the tuning options to an existing collection through update_collection.
+    Qdrant rebuilds indexes in the background; the collection stays searchable meanwhile.
+    """
+    vectors = client.get_collection(collection_name).config.params.vectors
+    names = list(vectors) if isinstance(vectors, dict) else [""]
+    client.update_collection(
+        collection_name=collection_name,
+        vectors_config={name: models.VectorParamsDiff(on_disk=tuning.get("on_disk", False)) for name in names},
+        hnsw_config=hnsw_config(tuning),
+        quantization_config=quantization_config(tuning, allow_disable=True),
+        collection_params=models.CollectionParamsDiff(on_disk_payload=tuning.get("on_disk_payload", False)),
+    )
+    ensure_payload_indexes(client, collection_name, tuning)
@@ -0,0 +1,416 @@
+from contextlib import contextmanager
+import datetime
+import json
+import os
+from pathlib import Path
+import shutil
+import sys
+import threading
+import time
+
+from loguru import logger
+import numpy as np
+from qdrant_client.http import models
+import typer
+
+try:
+    import hnswlib
+except ImportError:  # optional ANN index
+    hnswlib = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Ensure project root is in path for imports
+PROJ_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJ_ROOT))
+
+from risk_agent.schema import SCAM_GENOME_COLLECTION
+
+app = typer.Typer()
+
+MANIFEST = "manifest.json"
+PAYLOADS = "payloads.json"
+DTYPES = ("float16", "int8")
+INT8_SCALE = 127.0
+SCORE_CHUNK_ROWS = 65536
+
+
+class SnapshotBusyError(RuntimeError):
+    """
+    Another process is already exporting or refreshing this snapshot.
+    """
+
+
+@contextmanager
+def writer_lock(path):
+    """
+    Exclusive, non-blocking lock on `<path>.lock` held while a snapshot is written, so two
+    exports/refreshes never share the staging directory. The OS drops it if the writer dies.
+    """
+    path = Path(path)
+    lock_path = path.with_name(path.name + ".lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a+") as handle:
+        handle.seek(0)
+        try:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            raise SnapshotBusyError(f"Another process is writing the snapshot at {path}") from None
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def _encode(matrix, dtype):
+    """
+    Stores unit-length rows so a dot product is the cosine score Qdrant would return.
+    """
+    matrix = _normalize(matrix)
+    if dtype == "int8":
+        return np.clip(np.round(matrix * INT8_SCALE), -127, 127).astype(np.int8)
+    return matrix.astype(np.float16)
+
+
+def _decode(rows, dtype):
+    rows = rows.astype(np.float32)
+    return rows / INT8_SCALE if dtype == "int8" else rows
+
+
+def _scroll(client, collection_name, batch_size, with_vectors):
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=with_vectors,
+            with_vectors=with_vectors,
+        )
+        yield from records
+        if offset is None:
+            break
+
+
+def _write(path, dtype, collection_name, spaces, payloads):
+    """
+    Writes a snapshot next to path and swaps it in, so readers never see a half-written one.
+    Memory maps of the previous files stay valid after the swap.
+    """
+    path = Path(path)
+    staging = path.with_name(path.name + ".tmp")
+    if staging.exists():
+        shutil.rmtree(staging)
+    staging.mkdir(parents=True)
+
+    manifest = {
+        "collection": collection_name,
+        "dtype": dtype,
+        "exported_at": datetime.datetime.now().isoformat(),
+        "vectors": {},
+    }
+    for name, (ids, matrix) in spaces.items():
+        np.save(staging / f"{name}.npy", matrix)
+        (staging / f"{name}_ids.json").write_text(json.dumps(ids))
+        manifest["vectors"][name] = {"dim": int(matrix.shape[1]), "count": len(ids)}
+    (staging / PAYLOADS).write_text(json.dumps(payloads))
+    (staging / MANIFEST).write_text(json.dumps(manifest, indent=2))
+
+    previous = path.with_name(path.name + ".old")
+    if previous.exists():
+        shutil.rmtree(previous)
+    if path.exists():
+        os.replace(path, previous)
+    os.replace(staging, path)
+    if previous.exists():
+        shutil.rmtree(previous)
+    return manifest
+
+
+def _collect(records, dtype, vector_names):
+    rows = {name: ([], []) for name in vector_names}
+    payloads = {}
+    for record in records:
+        if not isinstance(record.vector, dict):
+            raise ValueError("Snapshots need named vectors. Run `python -m risk_agent.migrate` first.")
+        for name, vector in record.vector.items():
+            if name in rows:
+                rows[name][0].append(record.id)
+                rows[name][1].append(vector)
+        payloads[str(record.id)] = record.payload or {}
+    spaces = {}
+    for name, (ids, vectors) in rows.items():
+        dim = len(vectors[0]) if vectors else 0
+        matrix = _encode(np.asarray(vectors, dtype=np.float32).reshape(len(ids), dim), dtype)
+        spaces[name] = (ids, matrix)
+    return spaces, payloads
+
+
+def export_snapshot(client, collection_name, path, dtype="float16", batch_size=256):
+    """
+    Scrolls the whole collection into a compact on-disk snapshot: one float16 or int8 matrix
+    (plus an id list) per named vector and a payload table. Raises SnapshotBusyError when
+    another process is writing the same snapshot.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unknown snapshot dtype '{dtype}' (expected float16 or int8)")
+    vectors = client.get_collection(collection_name).config.params.vectors
+    if not isinstance(vectors, dict):
+        raise ValueError("Snapshots need named vectors. Run `python -m risk_agent.migrate` first.")
+    with writer_lock(path):
+        records = _scroll(client, collection_name, batch_size, with_vectors=True)
+        spaces, payloads = _collect(records, dtype, list(vectors))
+        return _write(path, dtype, collection_name, spaces, payloads)
+
+
+def refresh_snapshot(client, path, batch_size=256):
+    """
+    Brings an existing snapshot up to date by diffing point ids against the collection:
+    only new points are fetched, deleted ones are dropped. Returns (added, removed).
+
+    Points edited in place under the same id are not detected; ingestion derives ids from
+    content, so edited records arrive as new ids (run a full export otherwise).
+    Raises SnapshotBusyError when another process is writing the same snapshot.
+    """
+    path = Path(path)
+    with writer_lock(path):
+        return _refresh(client, path, batch_size)
+
+
+def _refresh(client, path, batch_size):
+    manifest = json.loads((path / MANIFEST).read_text())
+    collection_name, dtype = manifest["collection"], manifest["dtype"]
+    payloads = json.loads((path / PAYLOADS).read_text())
+
+    local = {}
+    for name in manifest["vectors"]:
+        local[name] = json.loads((path / f"{name}_ids.json").read_text())
+    local_ids = {str(point_id) for ids in local.values() for point_id in ids}
+
+    remote_ids = {}
+    for record in _scroll(client, collection_name, batch_size * 4, with_vectors=False):
+        remote_ids[str(record.id)] = record.id
+    added = [remote_ids[key] for key in remote_ids.keys() - local_ids]
+    removed = local_ids - remote_ids.keys()
+    if not added and not removed:
+        return 0, 0
+
+    new_records = []
+    for start in range(0, len(added), batch_size):
+        new_records.extend(client.retrieve(
+            collection_name=collection_name,
+            ids=added[start:start + batch_size],
+            with_payload=True,
+            with_vectors=True,
+        ))
+    new_spaces, new_payloads = _collect(new_records, dtype, list(manifest["vectors"]))
+
+    spaces = {}
+    for name, ids in local.items():
+        matrix = np.load(path / f"{name}.npy")
+        keep = [i for i, point_id in enumerate(ids) if str(point_id) not in removed]
+        extra_ids, extra_matrix = new_spaces[name]
+        if not len(extra_ids):
+            matrix = matrix[keep]
+        elif not keep:
+            # Includes spaces that were empty at export time, whose stored matrix has dim 0
+            matrix = extra_matrix
+        else:
+            matrix = np.concatenate([matrix[keep], extra_matrix])
+        spaces[name] = ([ids[i] for i in keep] + list(extra_ids), matrix)
+
+    for key in removed:
+        payloads.pop(key, None)
+    payloads.update(new_payloads)
+
+    _write(path, dtype, collection_name, spaces, payloads)
+    return len(added), len(removed)
+
+
+class SnapshotRetriever:
+    """
+    Searches a snapshot in-process: the matrices are memory-mapped and scored with NumPy
+    (exact top-k), or with an hnswlib index when use_ann is set and hnswlib is installed.
+    Results are Qdrant ScoredPoint objects so callers can treat both backends alike.
+    """
+
+    def __init__(self, path, use_ann=False):
+        self.path = Path(path)
+        self.use_ann = use_ann
+        self._lock = threading.Lock()
+        self._state = None
+        self._loaded_mtime = None
+
+    @property
+    def available(self):
+        return (self.path / MANIFEST).exists()
+
+    def load(self):
+        manifest_path = self.path / MANIFEST
+        mtime = manifest_path.stat().st_mtime
+        manifest = json.loads(manifest_path.read_text())
+        spaces = {}
+        for name in manifest["vectors"]:
+            # Empty files cannot be memory-mapped
+            mmap_mode = "r" if manifest["vectors"][name]["count"] else None
+            matrix = np.load(self.path / f"{name}.npy", mmap_mode=mmap_mode)
+            ids = json.loads((self.path / f"{name}_ids.json").read_text())
+            spaces[name] = {"ids": ids, "matrix": matrix, "ann": self._build_ann(matrix, manifest["dtype"])}
+        payloads = json.loads((self.path / PAYLOADS).read_text())
+        with self._lock:
+            self._state = {"manifest": manifest, "spaces": spaces, "payloads": payloads}
+            self._loaded_mtime = mtime
+        logger.info(
+            f"Loaded snapshot of {manifest['collection']} ({manifest['dtype']}): "
+            + ", ".join(f"{n}={v['count']}" for n, v in manifest["vectors"].items())
+        )
+
+    def maybe_reload(self):
+        """
+        Reloads when the snapshot on disk changed (e.g. after refresh_snapshot).
+        """
+        if self.available and (self.path / MANIFEST).stat().st_mtime != self._loaded_mtime:
+            self.load()
+            return True
+        return False
+
+    def _build_ann(self, matrix, dtype):
+        if not self.use_ann or hnswlib is None or len(matrix) == 0:
+            return None
+        index = hnswlib.Index(space="ip", dim=matrix.shape[1])
+        index.init_index(max_elements=len(matrix), ef_construction=200, M=16)
+        for start in range(0, len(matrix), SCORE_CHUNK_ROWS):
+            rows = _decode(matrix[start:start + SCORE_CHUNK_ROWS], dtype)
+            index.add_items(rows, np.arange(start, start + len(rows)))
+        index.set_ef(64)
+        return index
+
+    def _top_k(self, space, dtype, query, limit):
+        matrix = space["matrix"]
+        if space["ann"] is not None:
+            labels, distances = space["ann"].knn_query(query, k=min(limit, len(matrix)))
+            return labels[0], 1.0 - distances[0]
+        scores = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), SCORE_CHUNK_ROWS):
+            rows = _decode(matrix[start:start + SCORE_CHUNK_ROWS], dtype)
+            scores[start:start + len(rows)] = rows @ query
+        if limit < len(scores):
+            top = np.argpartition(-scores, limit)[:limit]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+    def query(self, vector, using, limit=5, score_threshold=None):
+        if self._state is None:
+            self.load()
+        with self._lock:
+            state = self._state
+        space = state["spaces"].get(using)
+        if space is None or len(space["ids"]) == 0:
+            return []
+        query = _normalize(vector).reshape(-1)
+        rows, scores = self._top_k(space, state["manifest"]["dtype"], query, limit)
+        points = []
+        for row, score in zip(rows, scores):
+            if score_threshold is not None and score < score_threshold:
+                continue
+            point_id = space["ids"][int(row)]
+            points.append(models.ScoredPoint(
+                id=point_id,
+                version=0,
+                score=float(score),
+                payload=state["payloads"].get(str(point_id), {}),
+            ))
+        return points
+
+    def stats(self):
+        if self._state is None:
+            return {"loaded": False, "path": str(self.path)}
+        manifest = self._state["manifest"]
+        return {
+            "loaded": True,
+            "path": str(self.path),
+            "collection": manifest["collection"],
+            "dtype": manifest["dtype"],
+            "exported_at": manifest["exported_at"],
+            "vectors": manifest["vectors"],
+            "ann": any(space["ann"] is not None for space in self._state["spaces"].values()),
+        }
+
+
+_retrievers = {}
+
+
+def get_snapshot_retriever(path, use_ann=False):
+    """
+    One shared retriever per snapshot path, so the matrices are mapped once per process.
+    """
+    key = (str(path), use_ann)
+    if key not in _retrievers:
+        _retrievers[key] = SnapshotRetriever(path, use_ann=use_ann)
+    return _retrievers[key]
+
+
+@app.command()
+def main(
+    collection_name: str = SCAM_GENOME_COLLECTION,
+    path: Path = None,
+    dtype: str = None,
+    refresh: bool = False,
+    watch: bool = False,
+    batch_size: int = 256,
+):
+    """
+    Export Scam Genome into a memory-mappable snapshot for RETRIEVAL_BACKEND=snapshot,
+    or bring an existing snapshot up to date with --refresh. With --watch, keeps refreshing
+    every SNAPSHOT_REFRESH_SECONDS.
+
+    This is the snapshot's only writer: API workers just reload it when it changes.
+    """
+    from risk_agent.config import settings
+
+    path = path or settings.SNAPSHOT_PATH
+    client = settings.get_qdrant_client()
+    while True:
+        try:
+            if (refresh or watch) and (Path(path) / MANIFEST).exists():
+                added, removed = refresh_snapshot(client, path, batch_size)
+                logger.success(f"Snapshot refreshed: {added} added, {removed} removed.")
+            else:
+                manifest = export_snapshot(
+                    client, collection_name, path, dtype or settings.SNAPSHOT_DTYPE, batch_size
+                )
+                logger.success(f"Snapshot written to {path}: {manifest['vectors']}")
+        except SnapshotBusyError as e:
+            logger.error(str(e))
+            raise typer.Exit(code=1)
+        except Exception as e:
+            if not watch:
+                raise
+            # Keep the snapshot we have; Qdrant may just be slow right now
+            logger.error(f"Snapshot refresh failed: {e}")
+        if not watch or settings.SNAPSHOT_REFRESH_SECONDS <= 0:
+            return
+        time.sleep(settings.SNAPSHOT_REFRESH_SECONDS)
+
+
+if __name__ == "__main__":
+    app()
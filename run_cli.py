@@ -1,4 +1,5 @@
 import requests
+import json
 import os
 import sys
 from rich.console import Console
@@ -13,6 +14,7 @@ import pyfiglet
 
 console = Console()
 API_URL = "http://localhost:8000/analyze_risk/"
+STREAM_URL = "http://localhost:8000/analyze_risk/stream"
 
 def display_header():
     console.clear()
@@ -56,7 +58,7 @@ def get_file_paths():
         else:
             console.print("[bold red] No valid files found from provided paths.[/bold red]")
 
-def analyze_files(file_paths):
+def build_upload_list(file_paths):
     upload_list = []
     for path in file_paths:
         filename = os.path.basename(path)
@@ -72,6 +74,85 @@ def analyze_files(file_paths):
         
         f = open(path, 'rb')
         upload_list.append(('files', (filename, f, mime_type)))
+    return upload_list
+
+def iter_sse(response):
+    """
+    Yields (event, data) pairs from a text/event-stream response.
+    """
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
+def render_event(event, data):
+    """
+    Prints one streamed phase result as soon as it arrives.
+    """
+    if event == "visual_risk":
+        risk = data["visual_risk"]
+        color = {"High": "red", "Medium": "yellow"}.get(risk["risk_level"], "green")
+        console.print(f" [cyan]Visual[/cyan] {escape(data['filename'])}: [{color}]{risk['risk_level']} Risk[/{color}] - {escape(risk['analysis'])}")
+    elif event == "extracted_text":
+        preview = " ".join(data["text"].split())
+        preview = preview[:100] + ("..." if len(preview) > 100 else "")
+        console.print(f" [blue]{escape(data['source'])}[/blue] {escape(data['filename'])}: [dim]{escape(preview)}[/dim]")
+    elif event == "genome_matches":
+        scams = sum(1 for c in data if c.get("risk_label") == "scam")
+        top = max((c["score"] for c in data), default=0.0)
+        console.print(f" [magenta]Scam Genome[/magenta] {len(data)} similar case(s), {scams} labelled scam (best match {top * 100:.1f}%)")
+    elif event == "memory_context" and data.get("memory_context"):
+        console.print(" [magenta]Long-term Memory[/magenta] this evidence was reported before")
+    elif event == "timeout":
+        target = data.get("filename") or "request"
+        console.print(f" [yellow]Timed out[/yellow] {data['phase']} ({escape(target)})")
+
+def analyze_files_streaming(file_paths):
+    """
+    Uses the SSE endpoint so phase results show up while the analysis is still running.
+    Falls back to the regular endpoint if the server does not offer streaming.
+    """
+    upload_list = build_upload_list(file_paths)
+    try:
+        with requests.post(STREAM_URL, files=upload_list, stream=True) as response:
+            if response.status_code == 404:
+                for _, file_data in upload_list: file_data[1].close()
+                return analyze_files(file_paths)
+            if response.status_code != 200:
+                console.print(f"[bold red] API Error {response.status_code}:[/bold red] {escape(response.text)}")
+                return None
+
+            console.print()
+            token_count = 0
+            with console.status("[bold green] Analyzing evidence...[/bold green]", spinner="dots") as status:
+                for event, data in iter_sse(response):
+                    if event == "result":
+                        return data
+                    if event == "error":
+                        console.print(f"[bold red] Error:[/bold red] {escape(data.get('detail', ''))}")
+                        return None
+                    if event == "llm_token":
+                        token_count += 1
+                        status.update(f"[bold green] Agent is reasoning... ({token_count} chunks received)[/bold green]")
+                        continue
+                    render_event(event, data)
+            return None
+    except Exception as e:
+        console.print(f"[bold red] Error:[/bold red] {e}")
+        return None
+    finally:
+        for _, file_data in upload_list: file_data[1].close()
+
+def analyze_files(file_paths):
+    upload_list = build_upload_list(file_paths)
 
     with console.status(f"[bold green] Uploading & Analyzing {len(file_paths)} file(s)...[/bold green]", spinner="dots"):
         try:
@@ -170,7 +251,7 @@ def main():
     display_header()
     while True:
         paths = get_file_paths()
-        result = analyze_files(paths)
+        result = analyze_files_streaming(paths)
         display_results(result)
         if Prompt.ask("Analyze another set? (y/n)", choices=["y", "n"], default="y") == "n": break
     console.print("[bold cyan] Stay Safe![/bold cyan]")
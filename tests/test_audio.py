@@ -0,0 +1,108 @@
+import asyncio
+import io
+import wave
+
+import numpy as np
+
+from risk_agent.audio import (
+    SAMPLE_RATE,
+    ChunkedTranscriber,
+    PartialTranscriptError,
+    decode_audio,
+    split_chunks,
+    stitch,
+    stub_transcribe,
+    trim_silence,
+)
+
+
+def _wav(samples, rate, channels=1):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes((np.asarray(samples) * 32767).astype(np.int16).tobytes())
+    return buffer.getvalue()
+
+
+def _tone(seconds, rate=SAMPLE_RATE):
+    return 0.5 * np.sin(2 * np.pi * 440 * np.arange(int(seconds * rate)) / rate)
+
+
+def test_stereo_wav_is_downmixed_and_resampled():
+    stereo = np.repeat(_tone(2.0, 44100)[:, None], 2, axis=1).flatten()
+
+    samples = decode_audio(_wav(stereo, 44100, channels=2))
+
+    assert samples.dtype == np.float32
+    assert len(samples) == 2 * SAMPLE_RATE
+    assert 0.45 < np.abs(samples).max() <= 0.5
+
+
+def test_long_silences_are_trimmed_short_pauses_kept():
+    audio = np.concatenate([np.zeros(SAMPLE_RATE), _tone(1.0), np.zeros(3 * SAMPLE_RATE), _tone(1.0),
+                            np.zeros(SAMPLE_RATE // 5), _tone(1.0), np.zeros(SAMPLE_RATE)])
+
+    speech = trim_silence(audio, min_silence_ms=600, keep_ms=200)
+
+    # 3 s of tone, the 0.2 s pause, and ~0.2 s of padding on each side of the long gap and
+    # of the speech as a whole (frame-rounded)
+    assert 3.8 < len(speech) / SAMPLE_RATE < 4.0
+    assert len(trim_silence(np.zeros(SAMPLE_RATE))) == 0
+
+
+def test_chunks_overlap_and_stitching_drops_repeated_words():
+    chunks = split_chunks(np.zeros(70 * SAMPLE_RATE), chunk_seconds=30, overlap_seconds=2)
+    assert [len(chunk) / SAMPLE_RATE for chunk in chunks] == [30, 30, 14]
+
+    # A 2 s remainder is folded into the previous chunk instead of sent alone
+    assert [len(chunk) / SAMPLE_RATE for chunk in split_chunks(np.zeros(60 * SAMPLE_RATE))] == [30, 32]
+
+    assert stitch(["Please send the OTP to", "send the OTP to my number.", "Thanks."]) == (
+        "Please send the OTP to my number. Thanks."
+    )
+
+
+def test_chunks_are_transcribed_concurrently_and_kept_in_order():
+    active, peak, started = 0, 0, 0
+
+    async def transcribe(chunk, mime_type):
+        nonlocal active, peak, started
+        index, started = started, started + 1
+        active += 1
+        peak = max(peak, active)
+        seconds = len(decode_audio(chunk)) / SAMPLE_RATE
+        # Later chunks finish first
+        await asyncio.sleep(0.05 / seconds)
+        active -= 1
+        return f"chunk{index} ({round(seconds)}s)"
+
+    audio = _wav(np.concatenate([_tone(10), _tone(8), _tone(4)]), SAMPLE_RATE)
+    transcriber = ChunkedTranscriber(transcribe, chunk_seconds=10, overlap_seconds=1, concurrency=2)
+
+    text = asyncio.run(transcriber.transcribe(audio))
+
+    assert text == "chunk0 (10s) chunk1 (10s) chunk2 (4s)"
+    assert peak == 2
+    stats = transcriber.stats.snapshot()
+    assert stats["chunks"] == 3 and stats["audio_seconds"] == 22.0
+    assert stats["audio_seconds_per_second"] > 22
+
+
+def test_stub_transcriber_and_partial_failures():
+    audio = _wav(_tone(25), SAMPLE_RATE)
+    assert asyncio.run(ChunkedTranscriber(stub_transcribe).transcribe(audio)) == "[speech 25.0s]"
+
+    async def flaky(chunk, mime_type):
+        if len(decode_audio(chunk)) < 10 * SAMPLE_RATE:
+            raise TimeoutError("provider timed out")
+        return "first part"
+
+    transcriber = ChunkedTranscriber(flaky, chunk_seconds=20, overlap_seconds=2)
+    try:
+        asyncio.run(transcriber.transcribe(audio))
+    except PartialTranscriptError as e:
+        assert (e.text, e.failed, e.total) == ("first part", 1, 2)
+    else:
+        raise AssertionError("expected a partial transcript")
@@ -0,0 +1,58 @@
+import asyncio
+
+from risk_agent.batching import MicroBatcher
+
+
+def test_concurrent_submits_share_one_batch():
+    calls = []
+
+    def encode(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    async def run():
+        batcher = MicroBatcher("double", encode, max_batch_size=8, max_wait_ms=20)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+        await batcher.close()
+        return results, batcher.stats()
+
+    results, stats = asyncio.run(run())
+
+    assert results == [0, 2, 4, 6, 8]
+    assert calls == [[0, 1, 2, 3, 4]]
+    assert stats["batches"] == 1
+    assert stats["batch_size_histogram"] == {5: 1}
+
+
+def test_batches_are_capped_at_max_size():
+    def encode(items):
+        return list(items)
+
+    async def run():
+        batcher = MicroBatcher("identity", encode, max_batch_size=3, max_wait_ms=20)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(7)))
+        await batcher.close()
+        return results, batcher.stats()
+
+    results, stats = asyncio.run(run())
+
+    assert results == list(range(7))
+    assert stats["items"] == 7
+    assert max(stats["batch_size_histogram"]) <= 3
+
+
+def test_encode_errors_reach_every_caller():
+    def encode(items):
+        raise RuntimeError("model crashed")
+
+    async def run():
+        batcher = MicroBatcher("broken", encode, max_batch_size=4, max_wait_ms=5)
+        outcomes = await asyncio.gather(
+            batcher.submit("a"), batcher.submit("b"), return_exceptions=True
+        )
+        await batcher.close()
+        return outcomes
+
+    outcomes = asyncio.run(run())
+
+    assert all(isinstance(o, RuntimeError) for o in outcomes)
@@ -0,0 +1,123 @@
+import numpy as np
+
+from risk_agent.cache import ArtifactCache, VerdictCache, content_digest
+
+
+def test_memory_tier_is_bounded_lru():
+    cache = ArtifactCache(max_entries=2)
+    cache.put("ocr", "a", "v1", "text a")
+    cache.put("ocr", "b", "v1", "text b")
+    assert cache.get("ocr", "a", "v1") == "text a"  # refreshes "a"
+
+    cache.put("ocr", "c", "v1", "text c")  # evicts "b", the least recently used
+
+    assert cache.get("ocr", "b", "v1") is None
+    assert cache.get("ocr", "a", "v1") == "text a"
+    assert cache.get("ocr", "c", "v1") == "text c"
+
+
+def test_model_version_is_part_of_the_key():
+    cache = ArtifactCache()
+    cache.put("transcript", "abc", "whisper-large-v3", "hello")
+
+    assert cache.get("transcript", "abc", "whisper-large-v3") == "hello"
+    assert cache.get("transcript", "abc", "whisper-small") is None
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = tmp_path / "artifacts.sqlite3"
+    vector = np.arange(4, dtype=np.float32)
+    digest = content_digest(b"screenshot bytes")
+
+    first = ArtifactCache(path=path)
+    first.put("clip", digest, "clip-ViT-B-32", vector)
+    first.put("ocr", digest, "easyocr-en", "send USDT now")
+
+    second = ArtifactCache(path=path)
+    restored = second.get("clip", digest, "clip-ViT-B-32")
+
+    assert restored.dtype == np.float32
+    assert np.array_equal(restored, vector)
+    assert second.get("ocr", digest, "easyocr-en") == "send USDT now"
+    assert second.stats()["kinds"]["clip"]["disk_hits"] == 1
+
+
+def test_disk_tier_is_pruned_by_size_and_age(tmp_path, monkeypatch):
+    path = tmp_path / "artifacts.sqlite3"
+    now = [1000.0]
+    monkeypatch.setattr("risk_agent.cache.time.time", lambda: now[0])
+
+    cache = ArtifactCache(max_entries=1, path=path, max_disk_bytes=100, prune_every=1)
+    for i in range(5):
+        now[0] += 1
+        cache.put("clip", str(i), "v1", np.zeros(10, dtype=np.float32))  # 40 bytes each
+
+    # Only the two newest fit in 100 bytes
+    reopened = ArtifactCache(path=path)
+    assert [reopened.get("clip", str(i), "v1") is not None for i in range(5)] == [False, False, False, True, True]
+    assert cache.stats()["disk_pruned"] == 3
+
+    aging = ArtifactCache(max_entries=1, path=path, max_age_seconds=10)
+    now[0] += 20
+    assert aging.get("clip", "4", "v1") is None  # expired, even before the next prune
+    assert ArtifactCache(path=path, max_age_seconds=10).stats()["disk_pruned"] == 2
+
+
+def test_hit_and_miss_counters():
+    cache = ArtifactCache()
+    cache.get("ocr", "x", "v1")
+    cache.put("ocr", "x", "v1", "text")
+    cache.get("ocr", "x", "v1")
+
+    stats = cache.stats()["kinds"]["ocr"]
+    assert stats["misses"] == 1
+    assert stats["memory_hits"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_verdict_cache_exact_hit_ignores_whitespace_and_case():
+    cache = VerdictCache()
+    cache.put("Send  USDT to the SAFE account", ["1", "2"], None, {"risk_level": "High"})
+
+    verdict, level = cache.get("send usdt to the safe account", ["2", "1"])
+
+    assert verdict == {"risk_level": "High"}
+    assert level == "exact"
+
+
+def test_verdict_cache_semantic_hit_above_threshold():
+    cache = VerdictCache(similarity_threshold=0.95)
+    cache.put("first report", ["1"], np.array([1.0, 0.0, 0.0]), {"risk_level": "High"})
+
+    near, near_level = cache.get("second report", ["9"], np.array([0.99, 0.05, 0.0]))
+    far, far_level = cache.get("third report", ["9"], np.array([0.0, 1.0, 0.0]))
+
+    assert near_level == "semantic" and near["risk_level"] == "High"
+    assert far is None and far_level is None
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_verdict_cache_semantic_hit_needs_the_same_images():
+    cache = VerdictCache(similarity_threshold=0.95)
+    text = np.array([1.0, 0.0, 0.0])
+    cache.put("chat + screenshot", ["1"], text, {"risk_level": "Low"}, image_digests=["legit-screen"])
+
+    other, other_level = cache.get("chat + other screenshot", ["1"], text, image_digests=["scam-screen"])
+    none, none_level = cache.get("chat only", ["1"], text)
+    same, same_level = cache.get("chat + same screenshot", ["1"], text, image_digests=["legit-screen"])
+
+    assert other is None and other_level is None
+    assert none is None and none_level is None
+    assert same_level == "semantic" and same["risk_level"] == "Low"
+
+
+def test_verdict_cache_expires_and_evicts():
+    expired = VerdictCache(ttl_seconds=-1)
+    expired.put("report", [], None, {"risk_level": "Low"})
+    assert expired.get("report", []) == (None, None)
+
+    bounded = VerdictCache(max_entries=1)
+    bounded.put("old", [], None, {"risk_level": "Low"})
+    bounded.put("new", [], None, {"risk_level": "High"})
+    assert bounded.get("old", []) == (None, None)
+    assert bounded.get("new", [])[1] == "exact"
@@ -0,0 +1,45 @@
+import asyncio
+import threading
+import time
+
+from risk_agent.executors import run_cpu, run_io
+
+
+def _blocking(seconds, label=None):
+    time.sleep(seconds)
+    return threading.current_thread().name, label
+
+
+async def _ticks_while(coro, interval=0.01):
+    """
+    Awaits coro while counting how often the event loop gets to run a ticker.
+    """
+    ticks = 0
+    task = asyncio.ensure_future(coro)
+    while not task.done():
+        await asyncio.sleep(interval)
+        ticks += 1
+    return task.result(), ticks
+
+
+def test_blocking_calls_run_on_the_pools_not_the_loop():
+    async def main():
+        cpu = await _ticks_while(run_cpu(_blocking, 0.2, label="encode"))
+        io = await _ticks_while(run_io(_blocking, 0.2, label="qdrant"))
+        return cpu, io
+
+    (cpu_result, cpu_ticks), (io_result, io_ticks) = asyncio.run(main())
+
+    assert cpu_result[0].startswith("risk-cpu") and cpu_result[1] == "encode"
+    assert io_result[0].startswith("risk-io") and io_result[1] == "qdrant"
+    # A loop blocked by the 0.2 s call could not have ticked in between
+    assert cpu_ticks >= 5 and io_ticks >= 5
+
+
+def test_offloaded_calls_overlap():
+    async def main():
+        started = time.perf_counter()
+        await asyncio.gather(*(run_io(_blocking, 0.2) for _ in range(3)))
+        return time.perf_counter() - started
+
+    assert asyncio.run(main()) < 0.5
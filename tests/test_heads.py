@@ -0,0 +1,90 @@
+import numpy as np
+
+from risk_agent.heads import (
+    ClassifierHead,
+    HeadSet,
+    labelled_arrays,
+    text_training_arrays,
+    train_head,
+)
+
+
+def _clusters(n=1000, dims=32, seed=0):
+    rng = np.random.default_rng(seed)
+    direction = rng.normal(size=dims)
+    direction /= np.linalg.norm(direction)
+    y = rng.integers(0, 2, n)
+    # Overlapping clusters (best possible accuracy ~0.84), offset like real embeddings,
+    # whose cosine similarities are mostly positive
+    X = rng.normal(size=(n, dims)) + np.outer(np.where(y == 1, 1.0, -1.0), direction) + 3.0
+    return X.astype(np.float32), y
+
+
+def test_linear_and_mlp_heads_are_accurate_and_calibrated():
+    X, y = _clusters()
+    for kind in ("linear", "mlp"):
+        head = train_head(X, y, kind=kind, hidden=16, model_version="toy@1")
+
+        test = head.meta["test"]
+        assert test["accuracy"] > 0.75, (kind, test)
+        assert test["ece"] < 0.12, (kind, test)
+        assert abs(head.predict(X).mean() - y.mean()) < 0.05
+
+
+def test_heads_round_trip_through_npz_and_skip_other_models(tmp_path):
+    X, y = _clusters()
+    head = train_head(X, y, model_version="toy@1")
+    head.save(tmp_path / "text.npz")
+
+    loaded = ClassifierHead.load(tmp_path / "text.npz")
+    assert np.allclose(loaded.predict(X[:10]), head.predict(X[:10]))
+    assert loaded.probability(X[0]) == round(float(head.predict(X[0])[0]), 4)
+    assert loaded.stats()["evaluations"] == 1
+
+    assert HeadSet(tmp_path, {"text": "toy@1"}).get("text") is not None
+    assert HeadSet(tmp_path, {"text": "other@1"}).get("text") is None
+    assert HeadSet(tmp_path).get("image") is None
+
+
+def test_export_keeps_only_scam_and_legit_rows():
+    rows = [
+        ([1.0, 0.0], {"risk_label": "scam", "model_version": "m"}),
+        ([0.0, 1.0], {"risk_label": "legit", "model_version": "m"}),
+        ([0.5, 0.5], {"risk_label": "unknown"}),
+        (None, {"risk_label": "scam"}),
+    ]
+
+    vectors, labels, model_version = labelled_arrays(rows)
+
+    assert vectors.shape == (2, 2) and labels.tolist() == [1, 0] and model_version == "m"
+
+
+def test_text_head_learns_the_dialogue_not_the_type_header():
+    rng = np.random.default_rng(0)
+    records = []
+    for i in range(600):
+        label = "scam" if i % 2 else "legit"
+        scam_type = "scam_scripts" if label == "scam" else "legit_banking"
+        # The dialogues themselves carry no label signal
+        records.append({
+            "text": f"Type: {scam_type}\nPersonality: unknown\nDialogue:\nline {i}",
+            "original_text": f"line {i}",
+            "risk_label": label,
+        })
+    records.append({"text": "Type: scam_scripts\nPersonality: unknown\nDialogue:\nno original", "risk_label": "scam"})
+    encoded = []
+
+    def encode(texts):
+        # A strong feature whenever the scam header is in the text, noise otherwise
+        encoded.extend(texts)
+        return np.stack([np.r_[rng.normal(size=8) + 3.0, 4.0 * ("Type: scam" in text)] for text in texts])
+
+    vectors, labels = text_training_arrays(records, encode)
+
+    assert len(labels) == 601 and not any("Type:" in text for text in encoded)
+    assert "no original" in encoded
+    assert train_head(vectors, labels).meta["test"]["accuracy"] < 0.7
+
+    # The stored, header-embedded vectors would have made the head look near perfect
+    leaked = encode([record["text"] for record in records])
+    assert train_head(leaked, labels).meta["test"]["accuracy"] > 0.95
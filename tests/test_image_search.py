@@ -11,11 +11,9 @@ COLLECTION_NAME = "Scam Genome"
 query_text = "Mobile phone showing huge crypto profit green chart"
 print(f"Searching for: '{query_text}'...")
 
-# 3. Create Vector (With Zero Padding)
-# Note: Text search ke liye bhi humein same dimension match karni padegi
+# 3. Create Vector (CLIP text and image vectors share the "image" space)
 vector_512 = model.encode(query_text)
-padding = np.zeros(1024 - len(vector_512))
-query_vector = np.concatenate([vector_512, padding]).tolist()
+query_vector = vector_512.tolist()
 
 # 4. Search in Qdrant
 print(f"Client methods: {[m for m in dir(client) if 'search' in m or 'query' in m]}")
@@ -23,7 +21,7 @@ print(f"Client methods: {[m for m in dir(client) if 'search' in m or 'query' in
 try:
     results = client.search(
         collection_name=COLLECTION_NAME,
-        query_vector=query_vector,
+        query_vector=("image", query_vector),
         limit=3
     )
 except AttributeError:
@@ -32,6 +30,7 @@ except AttributeError:
     results = client.query_points(
         collection_name=COLLECTION_NAME,
         query=query_vector,
+        using="image",
         limit=3
     ).points
 
@@ -0,0 +1,147 @@
+import numpy as np
+from PIL import Image
+import pytest
+from qdrant_client import QdrantClient, models
+
+from risk_agent import features, ingest_images
+from risk_agent.ingestion import (
+    IngestCheckpoint,
+    ParallelUploader,
+    ShardWriter,
+    chunked,
+    content_point_id,
+    iter_shard_rows,
+    pending_items,
+    shard_of,
+)
+
+COLLECTION = "genome"
+
+
+def _client():
+    client = QdrantClient(":memory:")
+    client.create_collection(COLLECTION, vectors_config={
+        "text": models.VectorParams(size=4, distance=models.Distance.COSINE),
+    })
+    return client
+
+
+def test_point_ids_follow_content():
+    assert content_point_id("text", "hello") == content_point_id("text", b"hello")
+    assert content_point_id("text", "hello") != content_point_id("text", "hello!")
+    assert content_point_id("text", "hello") != content_point_id("image", "hello")
+
+
+def test_pending_skips_points_stored_with_same_model_version():
+    client = _client()
+    same, other, new = (content_point_id("text", t) for t in ("a", "b", "c"))
+    client.upsert(COLLECTION, [
+        models.PointStruct(id=same, vector={"text": [1, 0, 0, 0]}, payload={"model_version": "bge@512"}),
+        models.PointStruct(id=other, vector={"text": [0, 1, 0, 0]}, payload={"model_version": "bge@256"}),
+    ])
+
+    pending = pending_items(client, COLLECTION, [(same, "a"), (other, "b"), (new, "c")], "bge@512")
+
+    assert pending == [(other, "b"), (new, "c")]
+
+
+def test_checkpoint_resumes_and_resets(tmp_path):
+    checkpoint = IngestCheckpoint(tmp_path, "Scam Genome", "bge@512")
+    first = content_point_id("text", "a")
+    checkpoint.add([first])
+
+    reopened = IngestCheckpoint(tmp_path, "Scam Genome", "bge@512")
+    assert first in reopened
+    assert pending_items(_client(), COLLECTION, [(first, "a")], "bge@512", reopened) == []
+
+    reopened.reset()
+    assert first not in IngestCheckpoint(tmp_path, "Scam Genome", "bge@512")
+
+
+def test_chunked_streams_bounded_lists():
+    assert list(chunked(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(chunked([], 3)) == []
+
+
+def test_parallel_uploader_upserts_every_batch(tmp_path):
+    client = _client()
+    checkpoint = IngestCheckpoint(tmp_path, COLLECTION, "bge@512")
+    points = [
+        models.PointStruct(id=content_point_id("text", str(i)), vector={"text": [1, i, 0, 0]})
+        for i in range(10)
+    ]
+
+    with ParallelUploader(client, COLLECTION, workers=3, batch_size=3, on_uploaded=checkpoint.add) as uploader:
+        uploader.put(points[:7])
+        uploader.put(points[7:])
+
+    assert uploader.uploaded == 10
+    assert client.count(COLLECTION).count == 10
+    assert all(point.id in checkpoint for point in points)
+
+
+def test_parallel_uploader_reraises_upload_errors():
+    class FailingClient:
+        def upsert(self, **kwargs):
+            raise RuntimeError("qdrant down")
+
+    with pytest.raises(RuntimeError, match="qdrant down"):
+        with ParallelUploader(FailingClient(), COLLECTION, workers=2, batch_size=1) as uploader:
+            uploader.put([models.PointStruct(id=1, vector={"text": [1, 0, 0, 0]})])
+
+
+def test_shards_partition_ids():
+    ids = [content_point_id("text", str(i)) for i in range(200)]
+    shards = [[i for i in ids if shard_of(i, 4) == shard] for shard in range(4)]
+
+    assert sorted(sum(shards, [])) == sorted(ids)
+    assert all(shards)
+
+
+def test_shard_writer_round_trips_and_resumes(tmp_path):
+    ids = [content_point_id("text", t) for t in ("a", "b")]
+    writer = ShardWriter(tmp_path, 1, 2)
+    writer.write(ids, [{"risk_label": "scam"}, {"risk_label": "legit"}], [[1, 0], [0, 1]])
+
+    rows = list(iter_shard_rows(tmp_path))
+    assert [row[0] for row in rows] == ids
+    assert rows[1][1] == {"risk_label": "legit"}
+    assert rows[1][2].tolist() == [0, 1]
+    assert all(i in ShardWriter(tmp_path, 1, 2) for i in ids)
+
+
+def test_recreated_collection_gets_its_images_again(tmp_path, monkeypatch):
+    class FakeClip:
+        def encode(self, images, batch_size=32):
+            return np.ones((len(images), 512), dtype=np.float32)
+
+    client = QdrantClient(":memory:")
+    monkeypatch.setattr(features.settings, "get_qdrant_client", lambda: client)
+    monkeypatch.setattr(features.settings, "GENOME_INDEX", {})
+    monkeypatch.setattr(features, "INTERIM_DATA_DIR", tmp_path)
+    monkeypatch.setattr(ingest_images, "INTERIM_DATA_DIR", tmp_path)
+    monkeypatch.setattr(ingest_images, "get_model", lambda name: FakeClip())
+    (tmp_path / "images" / "scam").mkdir(parents=True)
+    Image.new("RGB", (64, 64), "red").save(tmp_path / "images" / "scam" / "otp.png")
+
+    def build_collection(recreate):
+        # --load from an empty processed store: creates the collection, embeds no text
+        features.main(
+            collection_name=COLLECTION, recreate=recreate, quantization=None, workers=1, shards=1,
+            shard_index=None, shard_dir=None, merge_shards=None, processed_dir=tmp_path / "processed",
+            refresh_records=False, load=True,
+        )
+
+    def ingest():
+        ingest_images.main(
+            images_dir=tmp_path / "images", label_dir=None, collection_name=COLLECTION, batch_size=8,
+            decode_workers=2, phash_index=tmp_path / "phash_index.json",
+        )
+        return client.count(COLLECTION, exact=True).count
+
+    build_collection(recreate=False)
+    assert ingest() == 1
+
+    build_collection(recreate=True)
+    assert client.count(COLLECTION, exact=True).count == 0
+    assert ingest() == 1
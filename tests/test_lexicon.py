@@ -0,0 +1,61 @@
+import json
+
+from risk_agent.lexicon import (
+    AhoCorasick,
+    LexiconMatcher,
+    get_lexicon_matcher,
+    lexicon_verdict,
+    mine_phrases,
+)
+
+
+def test_automaton_finds_overlapping_patterns_in_one_pass():
+    automaton = AhoCorasick()
+    for pattern in ("he", "she", "his", "hers"):
+        automaton.add(pattern, pattern)
+    automaton.build()
+
+    assert sorted(automaton.iter_matches("ushers")) == [(1, "she"), (2, "he"), (2, "hers")]
+
+
+def test_scan_scores_distinct_whole_word_phrases():
+    matcher = LexiconMatcher({"safe account": (3.5, "impersonation"), "usdt": (1.5, "crypto_investment")})
+
+    result = matcher.scan("Move it to a SAFE-account now. Pay in USDT... USDT only! (not usdtx)")
+
+    assert result["score"] == 5.0
+    assert [(hit["phrase"], hit["count"]) for hit in result["hits"]] == [("safe account", 1), ("usdt", 2)]
+    assert matcher.match("nothing suspicious here", threshold=1.0) is None
+    assert matcher.match("send usdt to the safe account", threshold=5.0)["score"] == 5.0
+    assert matcher.stats()["fast_path_rate"] == 0.5
+
+
+def test_verdict_cites_the_matched_phrases():
+    matcher = LexiconMatcher({"withdrawal fee": (3.0, "crypto_investment"), "remote access": (2.5, "tech_support")})
+    verdict = lexicon_verdict(matcher.scan("Pay the withdrawal fee, then give me remote access"), threshold=5.0)
+
+    assert verdict["risk_level"] == "High"
+    assert '"withdrawal fee"' in verdict["analysis"] and '"remote access"' in verdict["analysis"]
+    assert verdict["sources"] == ["lexicon: withdrawal fee", "lexicon: remote access"]
+    assert len(verdict["recommendations"]) == 2
+
+
+def test_mined_phrases_come_from_scam_dialogues_and_curated_weights_win(tmp_path):
+    records = (
+        [{"risk_label": "scam", "original_text": f"Caller: verify the gift card code {i} with our refund team"}
+         for i in range(8)]
+        + [{"risk_label": "legit", "original_text": f"Caller: your refund team appointment {i} is confirmed"}
+           for i in range(8)]
+    )
+
+    mined = {entry["phrase"]: entry for entry in mine_phrases(records, min_scam_docs=5)}
+
+    assert "gift card" in mined and "card code" in mined
+    assert "refund team" not in mined  # as common in legit calls
+    assert all(entry["weight"] <= 1.5 for entry in mined.values())
+
+    path = tmp_path / "lexicon.json"
+    path.write_text(json.dumps({"version": 1, "mined": list(mined.values())}))
+    matcher = get_lexicon_matcher(path)
+    assert matcher.phrases["gift card"] == (2.0, "payment_channel")
+    assert matcher.phrases["card code"][1] == "mined"
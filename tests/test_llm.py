@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+
+from risk_agent import llm
+
+VERDICT = {"probability": 0.8, "risk_level": "High", "analysis": "", "recommendations": [], "sources": []}
+
+
+@pytest.fixture
+def providers(monkeypatch):
+    """
+    Both providers configured, no real backoff or hedging.
+    """
+    monkeypatch.setattr(llm.settings, "GOOGLE_API_KEY", "test")
+    monkeypatch.setattr(llm.settings, "GROQ_API_KEY", "test")
+    monkeypatch.setattr(llm.settings, "LLM_PROVIDER", "gemini")
+    monkeypatch.setattr(llm.settings, "LLM_FAILOVER", True)
+    monkeypatch.setattr(llm.settings, "LLM_MAX_RETRIES", 1)
+    monkeypatch.setattr(llm.settings, "LLM_BACKOFF_SECONDS", 0.0)
+    monkeypatch.setattr(llm.settings, "LLM_HEDGE_PERCENTILE", 0)
+    monkeypatch.setattr(llm, "provider_stats", {name: llm.ProviderStats() for name in llm.provider_stats})
+    return monkeypatch
+
+
+def _stream(chunks, error=None):
+    async def stream(prompt):
+        for chunk in chunks:
+            yield chunk
+        if error is not None:
+            raise error
+    return stream
+
+
+def _run_stream(on_reset=True):
+    events = []
+
+    async def on_token(text):
+        events.append(("token", text))
+
+    async def reset(error):
+        events.append(("reset", error))
+
+    verdict = asyncio.run(llm.stream_risk_evidence_async("evidence", [], on_token, reset if on_reset else None))
+    return verdict, events
+
+
+def test_stream_failure_before_any_token_falls_back_silently(providers):
+    providers.setitem(llm._STREAM_CALLS, "gemini", _stream([], ConnectionError("refused")))
+
+    async def regular(prompt):
+        return dict(VERDICT)
+    providers.setitem(llm._ASYNC_CALLS, "gemini", regular)
+
+    verdict, events = _run_stream()
+
+    assert verdict == VERDICT and events == []
+
+
+def test_stream_failure_after_tokens_resets_before_the_retry(providers):
+    providers.setitem(llm._STREAM_CALLS, "gemini", _stream(['{"probability": 0.', "3"], ConnectionError("reset")))
+
+    async def regular(prompt):
+        return dict(VERDICT)
+    providers.setitem(llm._ASYNC_CALLS, "gemini", regular)
+
+    verdict, events = _run_stream()
+    assert verdict == VERDICT
+    assert events == [("token", '{"probability": 0.'), ("token", "3"), ("reset", "reset")]
+
+    # Without a way to reset the client, the partial answer is not followed by a different one
+    verdict, events = _run_stream(on_reset=False)
+    assert verdict["risk_level"] == "Unknown" and [e for e, _ in events] == ["token", "token"]
+
+
+def _flaky(failures, result=VERDICT, delay=0.0):
+    """
+    Fake provider call failing its first `failures` calls; counts every call.
+    """
+    calls = []
+
+    async def call(prompt):
+        calls.append(prompt)
+        await asyncio.sleep(delay)
+        if len(calls) <= failures:
+            raise TimeoutError(f"attempt {len(calls)} timed out")
+        return dict(result)
+
+    call.calls = calls
+    return call
+
+
+def test_retries_back_off_exponentially_with_jitter(providers):
+    providers.setattr(llm.settings, "LLM_MAX_RETRIES", 2)
+    providers.setattr(llm.settings, "LLM_BACKOFF_SECONDS", 0.01)
+    ranges = []
+    providers.setattr(llm.random, "uniform", lambda low, high: ranges.append((low, high)) or 0.0)
+    gemini = _flaky(2)
+    providers.setitem(llm._ASYNC_CALLS, "gemini", gemini)
+
+    verdict = asyncio.run(llm.analyze_risk_evidence_async("evidence", []))
+
+    assert verdict == VERDICT and len(gemini.calls) == 3
+    assert ranges == [(0, 0.01), (0, 0.02)]
+    stats = llm.provider_stats["gemini"].snapshot()
+    assert (stats["calls"], stats["errors"], stats["retries"]) == (3, 2, 2)
+
+
+def test_exhausted_provider_fails_over_to_the_other(providers):
+    gemini, groq = _flaky(99), _flaky(0, {**VERDICT, "analysis": "from groq"})
+    providers.setitem(llm._ASYNC_CALLS, "gemini", gemini)
+    providers.setitem(llm._ASYNC_CALLS, "groq", groq)
+
+    verdict = asyncio.run(llm.analyze_risk_evidence_async("evidence", []))
+
+    assert verdict["analysis"] == "from groq"
+    assert len(gemini.calls) == 2 and len(groq.calls) == 1
+    assert llm.provider_stats["gemini"].snapshot()["gave_up"] == 1
+
+    # Without failover every provider failing gives the Unknown verdict
+    providers.setattr(llm.settings, "LLM_FAILOVER", False)
+    assert asyncio.run(llm.analyze_risk_evidence_async("evidence", []))["risk_level"] == "Unknown"
+
+
+def test_slow_call_is_hedged_with_a_duplicate(providers):
+    providers.setattr(llm.settings, "LLM_HEDGE_PERCENTILE", 95)
+    for _ in range(20):
+        llm.provider_stats["gemini"].latency.record(0.02)
+    durations = iter([1.0, 0.0])
+
+    async def call(prompt):
+        await asyncio.sleep(next(durations))
+        return dict(VERDICT)
+    providers.setitem(llm._ASYNC_CALLS, "gemini", call)
+
+    async def timed():
+        started = asyncio.get_running_loop().time()
+        verdict = await llm.analyze_risk_evidence_async("evidence", [])
+        return verdict, asyncio.get_running_loop().time() - started
+
+    verdict, seconds = asyncio.run(timed())
+
+    assert verdict == VERDICT and seconds < 0.5
+    stats = llm.provider_stats["gemini"].snapshot()
+    assert (stats["hedged"], stats["hedge_wins"]) == (1, 1)
@@ -0,0 +1,105 @@
+import warnings
+
+from qdrant_client import QdrantClient, models
+
+from risk_agent import migrate
+from risk_agent.schema import IMAGE_VECTOR, TEXT_VECTOR, has_named_vectors
+
+COLLECTION = "genome"
+TUNING = {
+    "hnsw_m": 32,
+    "hnsw_ef_construct": 200,
+    "quantization": "scalar",
+    "on_disk": True,
+    "on_disk_payload": True,
+    "payload_indexes": ["risk_label"],
+}
+
+
+class RecordingClient:
+    """
+    Local Qdrant that records the collection options it is asked for (local mode accepts
+    but does not keep HNSW, quantization or payload index settings).
+    """
+
+    def __init__(self):
+        self.client = QdrantClient(":memory:")
+        self.calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        if name not in ("create_collection", "update_collection", "create_payload_index"):
+            return method
+
+        def record(*args, **kwargs):
+            self.calls.append((name, kwargs))
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")  # "payload indexes have no effect in local mode"
+                return method(*args, **kwargs)
+
+        return record
+
+
+def _old_collection(client):
+    client.create_collection(COLLECTION, vectors_config=models.VectorParams(size=768, distance=models.Distance.COSINE))
+    client.upsert(COLLECTION, [
+        models.PointStruct(id=1, vector=[0.5] * 768, payload={"risk_label": "scam"}),
+        models.PointStruct(id=2, vector=[0.25] * 512 + [0.0] * 256, payload={"type": "screenshot", "risk_label": "legit"}),
+    ])
+
+
+def test_migration_recreates_the_collection_with_the_configured_index(monkeypatch):
+    client = RecordingClient()
+    _old_collection(client.client)
+    monkeypatch.setattr(migrate.settings, "get_qdrant_client", lambda: client)
+    monkeypatch.setattr(migrate.settings, "GENOME_INDEX", TUNING)
+
+    migrate.main(collection_name=COLLECTION, batch_size=1, keep_backup=False)
+
+    created = [kwargs for name, kwargs in client.calls if name == "create_collection"]
+    assert [kwargs["collection_name"] for kwargs in created] == [f"{COLLECTION}__migration", COLLECTION]
+    for kwargs in created:
+        assert kwargs["hnsw_config"].m == 32 and kwargs["hnsw_config"].ef_construct == 200
+        assert kwargs["quantization_config"].scalar.type == models.ScalarType.INT8
+        assert kwargs["on_disk_payload"] is True
+        assert all(params.on_disk for params in kwargs["vectors_config"].values())
+    indexed = {(kwargs["collection_name"], kwargs["field_name"]) for name, kwargs in client.calls if name == "create_payload_index"}
+    assert (COLLECTION, "risk_label") in indexed
+
+    points = {p.id: p for p in client.scroll(COLLECTION, with_vectors=True)[0]}
+    assert list(points[1].vector) == [TEXT_VECTOR] and len(points[1].vector[TEXT_VECTOR]) == 768
+    assert list(points[2].vector) == [IMAGE_VECTOR] and len(points[2].vector[IMAGE_VECTOR]) == 512
+    assert not client.collection_exists(f"{COLLECTION}__migration")
+
+
+def test_single_vector_points_are_split_into_named_spaces():
+    image = models.Record(id=1, vector=[0.5] * 512 + [0.0] * 256, payload={"category": "image_evidence"})
+    text = models.Record(id=2, vector=[0.25] * 1024, payload={"risk_label": "scam"})
+    short = models.Record(id=3, vector=[0.25] * 512, payload={"risk_label": "legit"})
+
+    assert migrate.to_named_point(image).vector == {IMAGE_VECTOR: [0.5] * 512}
+    assert migrate.to_named_point(text).vector == {TEXT_VECTOR: [0.25] * 768}
+    assert migrate.to_named_point(text).payload == {"risk_label": "scam"}
+    # A text point too short to hold a BGE vector cannot be converted
+    assert migrate.to_named_point(short) is None
+
+
+def test_old_collection_is_migrated_once(monkeypatch):
+    client = RecordingClient()
+    _old_collection(client.client)
+    monkeypatch.setattr(migrate.settings, "get_qdrant_client", lambda: client)
+    monkeypatch.setattr(migrate.settings, "GENOME_INDEX", {})
+    assert not has_named_vectors(client, COLLECTION)
+
+    migrate.main(collection_name=COLLECTION, batch_size=1, keep_backup=True)
+
+    assert has_named_vectors(client, COLLECTION)
+    assert client.count(COLLECTION, exact=True).count == 2
+    hits = client.query_points(COLLECTION, query=[0.25] * 512, using=IMAGE_VECTOR, limit=1).points
+    assert hits[0].id == 2
+    assert client.collection_exists(f"{COLLECTION}__migration")
+
+    # Already on named vectors: nothing is recreated
+    created = len(client.calls)
+    migrate.main(collection_name=COLLECTION, batch_size=1, keep_backup=False)
+    assert len(client.calls) == created
@@ -0,0 +1,32 @@
+from risk_agent import model_registry
+
+
+def test_memory_is_reported_as_none_without_proc_or_resource(monkeypatch):
+    def no_proc(*args, **kwargs):
+        raise OSError("no /proc here")
+
+    monkeypatch.setattr(model_registry, "resource", None)  # Windows has no resource module
+    monkeypatch.setattr(model_registry, "open", no_proc, raising=False)
+
+    assert model_registry._current_rss_bytes() is None
+    assert model_registry.get_model_stats()["process_rss_mb"] is None
+    assert model_registry.get_model_stats()["process_peak_rss_mb"] is None
+
+
+def test_peak_rss_is_not_reported_as_current_usage(monkeypatch):
+    class PeakOnly:
+        RUSAGE_SELF = 0
+
+        @staticmethod
+        def getrusage(who):
+            return type("Usage", (), {"ru_maxrss": 2048})()
+
+    def no_proc(*args, **kwargs):
+        raise OSError("no /proc here")
+
+    monkeypatch.setattr(model_registry, "resource", PeakOnly)  # macOS: getrusage but no /proc
+    monkeypatch.setattr(model_registry, "open", no_proc, raising=False)
+
+    stats = model_registry.get_model_stats()
+    assert stats["process_rss_mb"] is None
+    assert stats["process_peak_rss_mb"] > 0
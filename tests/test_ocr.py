@@ -0,0 +1,93 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import numpy as np
+
+from risk_agent.ocr import OcrEngine, edge_density, tile_image
+
+
+class FakeReader:
+    """
+    Stands in for easyocr.Reader: reports one line per dark row band (boxes in the coordinates
+    of the image it was given), named after how far right the band reaches.
+    """
+
+    active = 0
+    lock = threading.Lock()
+
+    def __init__(self):
+        self.batches = []
+
+    def _lines(self, image):
+        rows = np.where((np.asarray(image) < 100).any(axis=1))[0]
+        lines = [y for previous, y in zip([-2, *rows], rows) if y > previous + 1]
+        right = lambda y: np.where(np.asarray(image)[y] < 100)[0].max()
+        return [([[0, y], [10, y], [10, y + 4], [0, y + 4]], f"line{right(y)}", 0.9) for y in lines]
+
+    def readtext(self, image, **kwargs):
+        with FakeReader.lock:
+            FakeReader.active += 1
+            assert FakeReader.active <= 2
+        time.sleep(0.01)
+        with FakeReader.lock:
+            FakeReader.active -= 1
+        self.batches.append(1)
+        return self._lines(image)
+
+    def readtext_batched(self, images, **kwargs):
+        self.batches.append(len(images))
+        return [self._lines(image) for image in images]
+
+
+def _text_rows(height, width, rows):
+    # Row i's dashes end at x = 10 + 30 * (i + 1), so each line has a distinct name
+    image = np.full((height, width), 255, dtype=np.uint8)
+    for i, y in enumerate(rows):
+        image[y:y + 4, 10:10 + 30 * (i + 1) + 1:2] = 0
+    return image
+
+
+def test_blank_images_skip_recognition():
+    readers = []
+    engine = OcrEngine(pool_size=1, reader_factory=lambda: readers.append(FakeReader()) or readers[-1])
+
+    assert edge_density(np.full((400, 300), 240, dtype=np.uint8)) == 0.0
+    assert engine.read(np.full((400, 300), 240, dtype=np.uint8)) == ""
+    assert readers == []
+    assert engine.stats()["skipped_no_text"] == 1
+
+
+def test_tall_screenshots_are_tiled_batched_and_stitched_once():
+    image = _text_rows(1000, 200, [20, 190, 500, 980])
+    tiles = tile_image(image, tile_aspect=1.0, overlap=40)
+    assert [top for _, top in tiles] == [0, 160, 320, 480, 640, 800]
+    assert {tile.shape for tile, _ in tiles} == {(200, 200)}
+
+    reader = FakeReader()
+    engine = OcrEngine(pool_size=1, tile_aspect=1.0, tile_overlap=40, reader_factory=lambda: reader)
+    text = engine.read(image)
+
+    # The line at y=190 sits in the overlap of two tiles and is reported once
+    assert text == "line40 line70 line100 line130"
+    stats = engine.stats()
+    assert reader.batches == [stats["tiles"]]
+    assert stats["tiles_skipped"] == 6 - stats["tiles"]
+    assert stats["tile_count_histogram"] == {stats["tiles"]: 1}
+
+
+def test_pool_never_exceeds_its_size_under_concurrency():
+    created = []
+
+    def factory():
+        created.append(FakeReader())
+        return created[-1]
+
+    engine = OcrEngine(pool_size=2, reader_factory=factory)
+    image = _text_rows(200, 200, [50])
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(engine.read, [image] * 16))
+
+    assert results == ["line40"] * 16
+    assert len(created) == 2
+    assert engine.stats()["count"] == 16
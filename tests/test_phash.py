@@ -0,0 +1,64 @@
+import io
+import random
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from risk_agent.phash import BKTree, PerceptualIndex, hamming, phash
+
+
+def _screenshot(seed, size=(360, 720)):
+    rng = random.Random(seed)
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.randrange(size[0] - 60), rng.randrange(size[1] - 40)
+        draw.rectangle([x, y, x + rng.randrange(20, 60), y + rng.randrange(10, 40)], fill=tuple(rng.randrange(256) for _ in range(3)))
+    return image
+
+
+def _recompressed(image, quality=40, scale=0.5):
+    small = image.resize((int(image.width * scale), int(image.height * scale)))
+    buffer = io.BytesIO()
+    small.save(buffer, format="JPEG", quality=quality)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+
+def test_recompressed_copies_stay_close_and_other_images_do_not():
+    original = _screenshot(1)
+
+    assert hamming(phash(original), phash(_recompressed(original))) <= 6
+    assert hamming(phash(original), phash(_screenshot(2))) > 6
+
+
+def test_bk_tree_matches_brute_force():
+    rng = np.random.default_rng(0)
+    values = [int(v) for v in rng.integers(0, 2**63, size=500)]
+    tree = BKTree()
+    for i, value in enumerate(values):
+        tree.add(value, i)
+    query = values[7] ^ 0b1011  # 3 bits away from entry 7
+
+    found = tree.search(query, 10)
+
+    expected = sorted((hamming(query, v), i) for i, v in enumerate(values) if hamming(query, v) <= 10)
+    assert sorted(found) == expected
+    assert found[0] == (3, 7)
+
+
+def test_index_persists_and_counts_fast_path_hits(tmp_path):
+    path = tmp_path / "phash.json"
+    index = PerceptualIndex(path)
+    original = _screenshot(3)
+    index.add("id-1", phash(original), {"risk_label": "scam", "filename": "tether_usdt_fake_receipt_1.png"})
+    index.add("id-1", phash(original), {"risk_label": "scam"})
+    index.save()
+
+    reloaded = PerceptualIndex(path)
+    distance, point_id, payload = reloaded.lookup(_recompressed(original), max_distance=6)
+    assert reloaded.lookup(_screenshot(4), max_distance=6) is None
+
+    assert len(reloaded) == 1
+    assert point_id == "id-1" and payload["risk_label"] == "scam" and distance <= 6
+    assert reloaded.stats()["fast_path_hits"] == 1
+    assert reloaded.stats()["fast_path_rate"] == 0.5
@@ -0,0 +1,130 @@
+import asyncio
+import io
+
+import numpy as np
+from PIL import Image
+
+from risk_agent import pipeline
+from risk_agent.cache import ArtifactCache
+
+SCAM_SCREEN = {"risk_level": "High", "probability": 0.9, "analysis": "known scam screen", "source": None}
+VERDICT = {"probability": 0.5, "risk_level": "Medium", "analysis": "", "recommendations": [], "sources": []}
+
+
+def _png(color="white"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _run(monkeypatch, uploads, lexicon_threshold=0, ocr=lambda image: "Please verify your account", cache=None):
+    events = []
+
+    async def slow_embed_text(text):
+        events.append(("embed_text", text))
+        await asyncio.sleep(0.2)
+        return np.ones(4, dtype=np.float32)
+
+    async def embed_image(image):
+        return np.ones(4, dtype=np.float32)
+
+    async def retrieve(text_vector=None, image_vectors=()):
+        events.append(("retrieve", text_vector is not None, len(image_vectors)))
+        return [], "", [dict(SCAM_SCREEN) for _ in image_vectors]
+
+    async def analyze(content, cases):
+        return dict(VERDICT)
+
+    async def persist(query_vector, aggregated_text, verdict):
+        events.append(("persist", verdict))
+
+    async def emit(event, data):
+        events.append((event, data))
+
+    monkeypatch.setattr(pipeline, "artifact_cache", cache or ArtifactCache())
+    monkeypatch.setattr(pipeline, "phash_image_risk", lambda image: None)
+    monkeypatch.setattr(pipeline, "read_image_text", ocr)
+    monkeypatch.setattr(pipeline, "embed_text", slow_embed_text)
+    monkeypatch.setattr(pipeline, "embed_image", embed_image)
+    monkeypatch.setattr(pipeline, "retrieve", retrieve)
+    monkeypatch.setattr(pipeline, "analyze_risk_evidence_async", analyze)
+    monkeypatch.setattr(pipeline, "_persist_to_memory", persist)
+    monkeypatch.setattr(pipeline.settings, "LEXICON_THRESHOLD", lexicon_threshold)
+    monkeypatch.setattr(pipeline.settings, "LEXICON_PATH", pipeline.settings.LEXICON_PATH.with_name("missing.json"))
+
+    async def main():
+        result = await pipeline.run_analysis(uploads, emit=emit)
+        await asyncio.sleep(0)  # let the background memory write run
+        return result
+
+    return asyncio.run(main()), events
+
+
+def test_image_verdict_is_emitted_before_the_text_search(monkeypatch):
+    result, events = _run(monkeypatch, [("chat.txt", b"hello, is this your bank?"), ("screen.png", _png())])
+
+    names = [event[0] for event in events]
+    image_search, text_search = events.index(("retrieve", False, 1)), events.index(("retrieve", True, 0))
+    assert image_search < names.index("visual_risk") < text_search < names.index("genome_matches")
+    assert result["detailed_evidence"]["visual_analysis"] == [{"filename": "screen.png", "visual_risk": SCAM_SCREEN}]
+
+
+def test_all_images_of_a_request_are_searched_in_one_batch(monkeypatch):
+    uploads = [(f"screen{i}.png", _png(color)) for i, color in enumerate(["white", "red", "blue"])]
+
+    result, events = _run(monkeypatch, uploads)
+
+    # The OCR'd text is searched separately, after the images
+    assert [event for event in events if event[0] == "retrieve"] == [("retrieve", False, 3), ("retrieve", True, 0)]
+    assert [item["filename"] for item in result["detailed_evidence"]["visual_analysis"]] == [
+        "screen0.png", "screen1.png", "screen2.png"
+    ]
+
+
+def test_text_is_embedded_without_source_headers(monkeypatch):
+    uploads = [("chat.txt", b"hello, is this your bank?"), ("notes.txt", b"They asked for the code.")]
+
+    result, events = _run(monkeypatch, uploads)
+
+    # Same header-free text the text head is trained on
+    assert [event for event in events if event[0] == "embed_text"] == [
+        ("embed_text", "hello, is this your bank?\n\nThey asked for the code.")
+    ]
+    assert "--- Source: chat.txt" in result["detailed_evidence"]["aggregated_text"]
+
+
+def test_lexicon_verdicts_still_reach_long_term_memory(monkeypatch):
+    chat = b"Move your savings to a safe account and do not tell the bank. Pay the withdrawal fee in gift cards."
+
+    result, events = _run(monkeypatch, [("chat.txt", chat)], lexicon_threshold=6.0)
+
+    assert result["verdict_source"] == "lexicon"
+    assert not [event for event in events if event[0] == "retrieve"]
+    assert ("persist", result["final_verdict"]) in events
+
+
+def test_filenames_do_not_count_as_red_flags(monkeypatch):
+    upload = ("safe_account_withdrawal_fee_gift_cards.txt", b"hello, is this your bank?")
+
+    result, events = _run(monkeypatch, [upload], lexicon_threshold=6.0)
+
+    assert result["verdict_source"] != "lexicon"
+    assert result["detailed_evidence"]["lexicon_match"] is None
+    assert ("retrieve", True, 0) in events
+
+
+def test_screenshots_without_text_are_ocrd_once(monkeypatch):
+    calls = []
+
+    def ocr(image):
+        calls.append(image)
+        if len(calls) == 1:
+            raise RuntimeError("reader not loaded")
+        return ""
+
+    cache = ArtifactCache()
+    for _ in range(3):
+        _run(monkeypatch, [("screen.png", _png())], ocr=ocr, cache=cache)
+
+    # The failure is retried, the empty result is then reused
+    assert len(calls) == 2
@@ -0,0 +1,49 @@
+import io
+
+from PIL import Image
+
+from risk_agent.preprocess import CLIP_IMAGE_SIZE, decode_image, prepare_image
+
+
+def _encode(image, format, **kwargs):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **kwargs)
+    return buffer.getvalue()
+
+
+def test_views_share_one_decode_and_are_sized_per_consumer():
+    screenshot = _encode(Image.new("RGB", (1170, 2532), (200, 30, 30)), "PNG")
+
+    prepared = prepare_image(screenshot, ocr_max_side=1024, ocr_grayscale=True)
+
+    assert prepared.original_size == (1170, 2532)
+    assert min(prepared.clip.size) == CLIP_IMAGE_SIZE and prepared.clip.mode == "RGB"
+    assert prepared.ocr.shape == (1024, 473)
+    assert prepared.ocr.dtype.name == "uint8"
+
+
+def test_small_images_are_not_upscaled_and_rgb_ocr_keeps_channels():
+    prepared = prepare_image(_encode(Image.new("RGB", (120, 80)), "PNG"), ocr_grayscale=False)
+
+    assert prepared.clip.size == (120, 80)
+    assert prepared.ocr.shape == (80, 120, 3)
+
+
+def test_exif_orientation_is_applied():
+    image = Image.new("RGB", (300, 100))
+    exif = image.getexif()
+    exif[0x0112] = 6  # rotated 90 degrees
+    decoded, _ = decode_image(_encode(image, "JPEG", exif=exif.tobytes()))
+
+    assert decoded.size == (100, 300)
+
+
+def test_animated_gif_uses_first_frame_and_transparency_becomes_white():
+    frames = [Image.new("RGB", (40, 40), color) for color in ("red", "blue")]
+    gif = _encode(frames[0], "GIF", save_all=True, append_images=frames[1:])
+    decoded, count = decode_image(gif)
+    assert count == 2
+    assert decoded.getpixel((0, 0)) == (255, 0, 0)
+
+    transparent = _encode(Image.new("RGBA", (10, 10), (0, 0, 0, 0)), "PNG")
+    assert decode_image(transparent)[0].getpixel((5, 5)) == (255, 255, 255)
@@ -0,0 +1,68 @@
+import os
+
+from risk_agent.ingestion import content_point_id
+from risk_agent.processed import ProcessedStore
+
+
+def _records(n):
+    return [
+        {"text": f"Type: scam\nDialogue:\n{i}", "original_text": str(i), "risk_label": "scam"}
+        for i in range(n)
+    ]
+
+
+def test_records_are_stored_once_the_source_is_exhausted(tmp_path):
+    store = ProcessedStore(tmp_path)
+
+    passed = list(store.caching_records(iter(_records(5)), batch_size=2))
+
+    assert passed == _records(5)
+    stored = list(store.iter_records())
+    assert [r["original_text"] for r in stored] == ["0", "1", "2", "3", "4"]
+    assert stored[0]["category"] is None
+
+
+def test_interrupted_or_rejected_parse_keeps_no_records(tmp_path):
+    store = ProcessedStore(tmp_path)
+
+    records = store.caching_records(iter(_records(5)), batch_size=2)
+    next(records)
+    records.close()
+    assert not store.has_records()
+
+    list(store.caching_records(iter(_records(3)), keep=lambda: False))
+    assert not store.has_records()
+
+
+def test_embeddings_are_kept_per_model_version(tmp_path):
+    store = ProcessedStore(tmp_path)
+    ids = [content_point_id("text", r["text"]) for r in _records(2)]
+    store.embeddings("bge@512").write(ids, [{}, {}], [[1, 0], [0, 1]])
+
+    vectors = store.embeddings("bge@512").vectors(ids + [content_point_id("text", "new")])
+
+    assert sorted(vectors) == sorted(ids)
+    assert vectors[ids[1]].tolist() == [0, 1]
+    assert store.embeddings("bge@256").vectors(ids) == {}
+
+
+def test_records_go_stale_when_a_source_changes(tmp_path):
+    raw = tmp_path / "English_Scam.txt"
+    raw.write_text("1. send the fee\n")
+    store = ProcessedStore(tmp_path / "store")
+    sources = store.fingerprint_sources([raw], {"hf/dataset": "rev1"})
+    list(store.caching_records(iter(_records(2)), sources=sources))
+
+    assert store.records_current(store.fingerprint_sources([raw], {"hf/dataset": "rev1"}))
+    # Offline (revision unknown) does not force a re-parse
+    assert store.records_current(store.fingerprint_sources([raw], {"hf/dataset": None}))
+    assert not store.records_current(store.fingerprint_sources([raw], {"hf/dataset": "rev2"}))
+
+    # Touched but identical content is still current
+    os.utime(raw, ns=(0, 0))
+    assert store.records_current(store.fingerprint_sources([raw], {"hf/dataset": "rev1"}))
+
+    raw.write_text("1. send the fee\n\n2. buy gift cards\n")
+    assert not store.records_current(store.fingerprint_sources([raw], {"hf/dataset": "rev1"}))
+    raw.unlink()
+    assert not store.records_current(store.fingerprint_sources([raw], {"hf/dataset": "rev1"}))
@@ -0,0 +1,75 @@
+import os
+from pathlib import Path
+import subprocess
+import sys
+import threading
+import time
+
+from risk_agent.resources import FAILED, NOT_LOADED, READY, LazyResource, readiness, register, warmup
+
+HEAVY_MODULES = ("torch", "sentence_transformers", "easyocr", "datasets", "google.generativeai")
+
+
+def test_resource_loads_once_on_first_get():
+    calls = []
+    resource = LazyResource("model", lambda: calls.append(1) or object())
+    assert resource.status()["state"] == NOT_LOADED
+
+    threads = [threading.Thread(target=resource.get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert resource.status()["state"] == READY
+    assert resource.status()["load_seconds"] is not None
+
+
+def test_failed_load_is_reported_and_retried():
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("no weights")
+        return "reader"
+
+    resource = LazyResource("ocr", factory)
+    try:
+        resource.get()
+    except RuntimeError:
+        pass
+    assert resource.status() == {"state": FAILED, "load_seconds": resource.load_seconds, "error": "no weights"}
+
+    assert resource.get() == "reader"
+    assert resource.status()["state"] == READY
+
+
+def test_warmup_loads_resources_in_parallel():
+    def slow():
+        time.sleep(0.2)
+        return object()
+
+    names = [f"slow-{i}" for i in range(4)]
+    for name in names:
+        register(name, slow)
+
+    started = time.perf_counter()
+    status = warmup(names)
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.6
+    assert all(status["resources"][name]["state"] == READY for name in names)
+    assert readiness()["resources"]["slow-0"]["state"] == READY
+
+
+def test_importing_the_api_loads_no_models(tmp_path):
+    # Runs in a fresh interpreter so models loaded by other tests do not count
+    code = f"import sys, risk_agent.main; print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    env = {**os.environ, "USE_CLOUD": "False", "WARMUP_ON_STARTUP": "False",
+           "PYTHONPATH": str(Path(__file__).resolve().parents[1])}
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "[]"
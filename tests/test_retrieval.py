@@ -0,0 +1,70 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+
+from risk_agent import retrieval
+from risk_agent.schema import IMAGE_VECTOR, SCAM_GENOME_COLLECTION, TEXT_VECTOR
+
+
+def _hit(id, label, score=0.9, **payload):
+    return SimpleNamespace(id=id, score=score, payload={"risk_label": label, **payload})
+
+
+class FakeClient:
+    """
+    Answers each genome request with its own hit, so the fan-out order can be checked.
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.history = []
+
+    def query_batch_points(self, collection_name, requests):
+        self.batches.append((collection_name, requests))
+        responses = [SimpleNamespace(points=[_hit("text", "scam", text="Verify your account now")])]
+        responses += [
+            SimpleNamespace(points=[_hit(f"image-{i}", label, filename=f"{label}.png")])
+            for i, label in enumerate(["legit", "scam"])
+        ]
+        return responses[-len(requests):]
+
+    def query_points(self, collection_name, **kwargs):
+        self.history.append(collection_name)
+        return SimpleNamespace(points=[])
+
+
+def test_retrieve_sends_every_genome_search_in_one_batch(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(retrieval.settings, "get_qdrant_client", lambda: client)
+    monkeypatch.setattr(retrieval.settings, "RETRIEVAL_BACKEND", "qdrant")
+
+    cases, memory, image_risks = asyncio.run(
+        retrieval.retrieve(np.zeros(768), [np.zeros(512), np.ones(512)])
+    )
+
+    [(collection, requests)] = client.batches
+    assert collection == SCAM_GENOME_COLLECTION
+    assert [request.using for request in requests] == [TEXT_VECTOR, IMAGE_VECTOR, IMAGE_VECTOR]
+    assert [request.limit for request in requests] == [retrieval.GENOME_TEXT_LIMIT] + [retrieval.GENOME_IMAGE_LIMIT] * 2
+    assert requests[2].query == [1.0] * 512
+    assert client.history == [retrieval.HISTORY_COLLECTION]
+
+    assert [(case["id"], case["text_snippet"]) for case in cases] == [("text", "Verify your account now")]
+    assert memory == ""
+    assert [risk["risk_level"] for risk in image_risks] == ["Low", "High"]
+    assert image_risks[1]["source"]["filename"] == "scam.png"
+
+
+def test_retrieve_images_only_skips_text_and_history(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(retrieval.settings, "get_qdrant_client", lambda: client)
+    monkeypatch.setattr(retrieval.settings, "RETRIEVAL_BACKEND", "qdrant")
+
+    cases, memory, image_risks = asyncio.run(retrieval.retrieve(image_vectors=[np.zeros(512), np.ones(512)]))
+
+    [(_, requests)] = client.batches
+    assert [request.using for request in requests] == [IMAGE_VECTOR, IMAGE_VECTOR]
+    assert not client.history
+    assert cases == [] and memory == ""
+    assert [risk["risk_level"] for risk in image_risks] == ["Low", "High"]
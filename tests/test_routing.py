@@ -0,0 +1,59 @@
+from risk_agent.routing import TieredRouter, retrieval_verdict, route_score
+
+
+def _cases(*pairs):
+    return [{"id": f"case-{i}", "risk_label": label, "score": score} for i, (label, score) in enumerate(pairs)]
+
+
+def _image(risk_level, probability, filename="shot.png"):
+    return {"filename": filename, "visual_risk": {"risk_level": risk_level, "probability": probability}}
+
+
+def test_unanimous_close_neighbours_and_a_flagged_screenshot_are_decisive():
+    router = TieredRouter(mode="on")
+    cases = _cases(*[("scam", 0.93)] * 5)
+
+    route = router.route(cases, [_image("High", 0.97)])
+
+    assert route["decision"] == "High" and route["use"]
+    verdict = retrieval_verdict(route, cases, [_image("High", 0.97)])
+    assert verdict["risk_level"] == "High" and verdict["probability"] >= 0.9
+    assert "5 of 5" in verdict["analysis"] and "shot.png" in verdict["analysis"]
+    assert len(verdict["sources"]) == 5
+
+
+def test_split_votes_weak_matches_and_conflicts_go_to_the_llm():
+    router = TieredRouter(mode="on")
+
+    assert router.route(_cases(("scam", 0.9), ("legit", 0.88), ("scam", 0.85)), [])["decision"] is None
+    assert router.route(_cases(*[("scam", 0.55)] * 5), [])["decision"] is None
+    assert router.route(_cases(*[("scam", 0.95)] * 5), [_image("Low", 0.95)])["decision"] is None
+    assert route_score([], [_image("Medium", 0.4)])["score"] is None
+    assert router.route(_cases(*[("legit", 0.95)] * 5), [])["decision"] == "Low"
+
+
+def test_trained_heads_count_as_one_more_signal():
+    weak_vote = _cases(("scam", 0.8), ("scam", 0.8), ("legit", 0.6))
+    assert TieredRouter(mode="on").route(weak_vote, [])["decision"] is None
+
+    route = TieredRouter(mode="on").route(weak_vote, [], {"text": 0.99, "images": [{"probability": 0.98}]})
+    assert route["classifier"] == 0.985 and route["decision"] is None
+    assert route_score([], [], classifier={"text": 0.97})["score"] == 0.97
+
+
+def test_shadow_mode_never_replaces_the_llm_and_tracks_agreement():
+    router = TieredRouter(mode="shadow")
+    decisive = router.route(_cases(*[("scam", 0.95)] * 5), [])
+    assert decisive["decision"] == "High" and not decisive["use"]
+
+    router.compare(decisive, {"risk_level": "High"})
+    router.compare(decisive, {"risk_level": "Medium"})
+    router.compare(router.route(_cases(("scam", 0.7), ("legit", 0.7)), []), {"risk_level": "Low"})
+    router.record("llm", 2.0)
+    router.record("llm", 3.0)
+    router.record("cache", 0.1)
+
+    stats = router.stats()
+    assert stats["shadow"] == {"decisive": 2, "ambiguous": 1, "agreed": 1, "agreement_rate": 0.5}
+    assert stats["tiers"]["llm"]["share"] == round(2 / 3, 4)
+    assert stats["tiers"]["cache"]["count"] == 1
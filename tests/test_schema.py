@@ -0,0 +1,103 @@
+from types import SimpleNamespace
+
+from qdrant_client import models
+
+from risk_agent.schema import (
+    IMAGE_VECTOR,
+    TEXT_VECTOR,
+    apply_tuning,
+    create_collection,
+    genome_vectors_config,
+    search_params,
+)
+
+TUNING = {
+    "hnsw_m": 32,
+    "hnsw_ef_construct": 200,
+    "hnsw_ef": 128,
+    "quantization": "scalar",
+    "on_disk": True,
+    "on_disk_payload": True,
+    "payload_indexes": ["risk_label", "category"],
+}
+
+
+class FakeClient:
+    """
+    Records the collection calls; the collection has named vectors and a risk_label index.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def get_collection(self, collection_name):
+        return SimpleNamespace(
+            config=SimpleNamespace(params=SimpleNamespace(vectors=genome_vectors_config())),
+            payload_schema={"risk_label": models.PayloadSchemaType.KEYWORD},
+        )
+
+    def __getattr__(self, name):
+        return lambda **kwargs: self.calls.append((name, kwargs))
+
+    def called(self, name):
+        return [kwargs for call, kwargs in self.calls if call == name]
+
+
+def test_create_collection_passes_the_configured_index():
+    client = FakeClient()
+
+    create_collection(client, "genome", genome_vectors_config(), TUNING)
+
+    [kwargs] = client.called("create_collection")
+    assert kwargs["collection_name"] == "genome"
+    assert kwargs["hnsw_config"].m == 32 and kwargs["hnsw_config"].ef_construct == 200
+    assert kwargs["quantization_config"].scalar.type == models.ScalarType.INT8
+    assert kwargs["on_disk_payload"] is True
+    assert set(kwargs["vectors_config"]) == {TEXT_VECTOR, IMAGE_VECTOR}
+    assert all(params.on_disk for params in kwargs["vectors_config"].values())
+    # risk_label already exists, only category is added
+    assert [kwargs["field_name"] for kwargs in client.called("create_payload_index")] == ["category"]
+
+
+def test_create_collection_defaults_leave_qdrant_settings_alone():
+    client = FakeClient()
+
+    create_collection(client, "genome", genome_vectors_config(), {})
+
+    [kwargs] = client.called("create_collection")
+    assert kwargs["hnsw_config"] is None and kwargs["quantization_config"] is None
+    assert kwargs["on_disk_payload"] is False
+    assert not any(params.on_disk for params in kwargs["vectors_config"].values())
+    assert not client.called("create_payload_index")
+
+
+def test_apply_tuning_updates_every_vector_space():
+    client = FakeClient()
+
+    apply_tuning(client, "genome", TUNING)
+
+    [kwargs] = client.called("update_collection")
+    assert kwargs["vectors_config"] == {
+        TEXT_VECTOR: models.VectorParamsDiff(on_disk=True),
+        IMAGE_VECTOR: models.VectorParamsDiff(on_disk=True),
+    }
+    assert kwargs["hnsw_config"] == models.HnswConfigDiff(m=32, ef_construct=200)
+    assert kwargs["quantization_config"].scalar.type == models.ScalarType.INT8
+    assert kwargs["collection_params"].on_disk_payload is True
+    assert [kwargs["field_name"] for kwargs in client.called("create_payload_index")] == ["category"]
+
+
+def test_apply_tuning_disables_quantization():
+    client = FakeClient()
+
+    apply_tuning(client, "genome", {**TUNING, "quantization": "none"})
+
+    [kwargs] = client.called("update_collection")
+    assert kwargs["quantization_config"] == models.Disabled.DISABLED
+
+
+def test_search_params_rescore_quantized_vectors():
+    params = search_params(TUNING)
+
+    assert params.hnsw_ef == 128 and params.quantization.rescore is True
+    assert search_params({}) is None
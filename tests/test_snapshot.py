@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient, models
+
+from risk_agent.snapshot import (
+    SnapshotBusyError,
+    SnapshotRetriever,
+    export_snapshot,
+    refresh_snapshot,
+    writer_lock,
+)
+
+COLLECTION = "genome"
+
+
+def _client(n_text=50, n_image=10, seed=0):
+    rng = np.random.default_rng(seed)
+    client = QdrantClient(":memory:")
+    client.create_collection(COLLECTION, vectors_config={
+        "text": models.VectorParams(size=16, distance=models.Distance.COSINE),
+        "image": models.VectorParams(size=8, distance=models.Distance.COSINE),
+    })
+    points = [
+        models.PointStruct(id=i, vector={"text": rng.standard_normal(16).tolist()}, payload={"n": i})
+        for i in range(n_text)
+    ]
+    points += [
+        models.PointStruct(id=1000 + i, vector={"image": rng.standard_normal(8).tolist()}, payload={"n": 1000 + i})
+        for i in range(n_image)
+    ]
+    client.upsert(COLLECTION, points)
+    return client
+
+
+def test_snapshot_top_k_matches_qdrant(tmp_path):
+    client = _client()
+    export_snapshot(client, COLLECTION, tmp_path / "snap", dtype="float16")
+    retriever = SnapshotRetriever(tmp_path / "snap")
+
+    query = np.random.default_rng(1).standard_normal(16)
+    expected = client.query_points(COLLECTION, query=query.tolist(), using="text", limit=5).points
+    got = retriever.query(query, using="text", limit=5)
+
+    assert [p.id for p in got] == [p.id for p in expected]
+    assert np.allclose([p.score for p in got], [p.score for p in expected], atol=1e-2)
+    assert got[0].payload == expected[0].payload
+
+
+def test_int8_snapshot_and_score_threshold(tmp_path):
+    client = _client()
+    export_snapshot(client, COLLECTION, tmp_path / "snap", dtype="int8")
+    retriever = SnapshotRetriever(tmp_path / "snap")
+
+    stored = client.retrieve(COLLECTION, ids=[1003], with_vectors=True)[0].vector["image"]
+    hits = retriever.query(stored, using="image", limit=3, score_threshold=0.99)
+
+    assert [p.id for p in hits] == [1003]
+
+
+def test_refresh_adds_and_removes_points(tmp_path):
+    client = _client()
+    path = tmp_path / "snap"
+    export_snapshot(client, COLLECTION, path)
+    retriever = SnapshotRetriever(path)
+    retriever.load()
+
+    client.delete(COLLECTION, points_selector=models.PointIdsList(points=[0, 1]))
+    client.upsert(COLLECTION, [models.PointStruct(id=500, vector={"text": [1.0] * 16}, payload={"n": 500})])
+
+    assert refresh_snapshot(client, path) == (1, 2)
+    assert refresh_snapshot(client, path) == (0, 0)
+    assert retriever.maybe_reload()
+
+    hits = retriever.query([1.0] * 16, using="text", limit=60)
+    ids = {p.id for p in hits}
+    assert 500 in ids and 0 not in ids and 1 not in ids
+    assert hits[0].id == 500
+
+
+def test_refresh_fills_a_space_that_was_empty_at_export(tmp_path):
+    client = _client(n_image=0)
+    path = tmp_path / "snap"
+    export_snapshot(client, COLLECTION, path)
+
+    client.upsert(COLLECTION, [models.PointStruct(id=2000, vector={"image": [1.0] * 8}, payload={"n": 2000})])
+
+    assert refresh_snapshot(client, path) == (1, 0)
+    hits = SnapshotRetriever(path).query([1.0] * 8, using="image", limit=1)
+    assert [p.id for p in hits] == [2000]
+
+
+def test_only_one_writer_at_a_time(tmp_path):
+    client = _client()
+    path = tmp_path / "snap"
+    export_snapshot(client, COLLECTION, path)
+
+    with writer_lock(path):
+        with pytest.raises(SnapshotBusyError):
+            refresh_snapshot(client, path)
+        with pytest.raises(SnapshotBusyError):
+            export_snapshot(client, COLLECTION, path)
+
+    # Released afterwards
+    assert refresh_snapshot(client, path) == (0, 0)
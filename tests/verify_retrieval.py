@@ -13,13 +13,13 @@ def main():
     
     # Generate vector
     vector_512 = model.encode(query)
-    padding = np.zeros(1024 - len(vector_512))
-    query_vector = np.concatenate([vector_512, padding]).tolist()
+    query_vector = vector_512.tolist()
     
     try:
         results = client.query_points(
             collection_name="Scam Genome",
             query=query_vector,
+            using="image",
             limit=3
         ).points
         